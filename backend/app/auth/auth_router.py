@@ -1,28 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Annotated
-from sqlmodel import Session, select
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.database import get_session
+from app.database import get_async_session
 from app.models.usuario import Usuario
 from app.schemas.user_schema import UsuarioCreate, UsuarioLogin, TokenResponse, UsuarioRead
-from app.utils.security import hash_password, verify_password
-from app.auth.jwt_handler import create_access_token, get_current_user
+from app.utils.security import hash_password_async, verify_and_update_password_async
+from app.auth.jwt_handler import cache_usuarios, create_access_token, get_current_user
 
 auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
 # Registro de nuevo usuario
 @auth_router.post("/register", response_model=UsuarioRead, status_code=status.HTTP_201_CREATED)
-def register(user: UsuarioCreate, session: Session = Depends(get_session)):
-    existing_user = session.exec(
+async def register(user: UsuarioCreate, session: AsyncSession = Depends(get_async_session)):
+    existing_user = (await session.exec(
         select(Usuario).where(Usuario.correo == user.correo)
-    ).first()
+    )).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El correo ya está registrado"
         )
+    # Se devuelve la conexion al pool mientras se calcula el hash
+    await session.rollback()
 
-    hashed_password = hash_password(user.contrasena)
+    # bcrypt es costoso en CPU: se calcula en el pool de procesos de hashing
+    hashed_password = await hash_password_async(user.contrasena)
     new_user = Usuario(
         nombres=user.nombres,
         apellidos=user.apellidos,
@@ -32,35 +37,55 @@ def register(user: UsuarioCreate, session: Session = Depends(get_session)):
     )
 
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user)
 
     return new_user
 
 # Inicio de sesión
 @auth_router.post("/login", response_model=TokenResponse)
-def login(data: UsuarioLogin, session: Session = Depends(get_session)):
-    user = session.exec(
+async def login(data: UsuarioLogin, session: AsyncSession = Depends(get_async_session)):
+    user = (await session.exec(
         select(Usuario).where(Usuario.correo == data.correo)
-    ).first()
-    if not user or not verify_password(data.contrasena, user.contrasena):
+    )).first()
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales inválidas",
             headers={"WWW-Authenticate": "Bearer"}
         )
+    # Se devuelve la conexion al pool mientras bcrypt verifica: una rafaga de
+    # logins no debe acaparar las conexiones que usa el resto de rutas
+    session.expunge(user)
+    await session.rollback()
+
+    valido, nuevo_hash = await verify_and_update_password_async(data.contrasena, user.contrasena)
+    if not valido:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciales inválidas",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    # El coste de bcrypt cambio desde que se guardo el hash: se regenera
+    if nuevo_hash:
+        await session.exec(
+            update(Usuario).where(Usuario.id == user.id).values(contrasena=nuevo_hash)
+        )
+        await session.commit()
+        cache_usuarios.invalidar(f"usuario:{user.id}")
 
     token = create_access_token({"sub": user.correo})
     return {"access_token": token, "token_type": "bearer"}
 
 # Verificar token
 @auth_router.get("/verify-token")
-def verify_token(user: Annotated[Usuario, Depends(get_current_user)]):
+async def verify_token(user: Annotated[Usuario, Depends(get_current_user)]):
     return {"message": "Token válido", "user": user}
 
 # Obtener información del usuario actual
 @auth_router.get("/me", response_model=UsuarioRead)
-def get_current_user_info(user: Annotated[Usuario, Depends(get_current_user)]):
+async def get_current_user_info(user: Annotated[Usuario, Depends(get_current_user)]):
     """
     Obtiene la información del usuario autenticado actual.
     Requiere un token de autenticación válido.
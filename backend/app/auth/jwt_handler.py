@@ -1,11 +1,14 @@
+import os
+import time
 from datetime import datetime, timedelta 
 from jose import jwt, JWTError 
 from fastapi import Depends, HTTPException 
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
+from sqlmodel import select
 
 from app.models.usuario import Usuario
-from app.database import get_session
+from app.database import abrir_sesion, get_async_engine
+from app.utils.cache import FALTA, CacheLRU
 
 # Configuración del token
 SECRET_KEY = "secret"
@@ -16,6 +19,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Asegúrate de que esta ruta coincida con la definida en tu endpoint /auth/login
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Tokens ya decodificados y usuarios ya resueltos, para no repetir la firma
+# ni la consulta en cada peticion autenticada. TTL corto: un cambio hecho
+# fuera de update_usuario tarda como mucho AUTH_CACHE_TTL en verse.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+cache_tokens = CacheLRU(max_peso=int(os.getenv("AUTH_CACHE_TOKENS", "10000")), ttl=AUTH_CACHE_TTL)
+cache_usuarios = CacheLRU(max_peso=int(os.getenv("AUTH_CACHE_USUARIOS", "10000")), ttl=AUTH_CACHE_TTL)
+
 # Crear un token JWT con expiración
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -24,8 +34,18 @@ def create_access_token(data: dict):
     # Asegúrate de que 'sub' esté incluido en el token si luego lo vas a extraer
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def decode_token(token: str) -> dict:
+    """Decodifica el token, reutilizando el resultado si se vio hace poco"""
+    payload = cache_tokens.obtener(token)
+    if payload is FALTA:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        cache_tokens.guardar(token, payload, (), cache_tokens.version)
+    elif payload.get("exp", 0) <= time.time():
+        raise JWTError("Token expirado")
+    return payload
+
 # Obtener el usuario actual a partir del token JWT
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> Usuario:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Usuario:
     credentials_exception = HTTPException(
         status_code=401,
         detail="No se pudo validar las credenciales",
@@ -33,15 +53,26 @@ def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Dep
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         email: str = payload.get("sub")  # sub es donde se suele guardar el email o username
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = session.exec(select(Usuario).where(Usuario.correo == email)).first()
+    datos = cache_usuarios.obtener(email)
+    if datos is not FALTA:
+        return Usuario(**datos)
+
+    # Solo se abre sesion (y se toma una conexion) si el usuario no esta en cache.
+    # Se lee del primario: una replica atrasada podria volver a guardar en
+    # cache al usuario de antes de un update_usuario
+    version = cache_usuarios.version
+    async with abrir_sesion(get_async_engine()) as session:
+        user = (await session.exec(select(Usuario).where(Usuario.correo == email))).first()
     if user is None:
         raise credentials_exception
 
-    return user
+    datos = user.model_dump()
+    cache_usuarios.guardar(email, datos, {f"usuario:{user.id}"}, version)
+    return Usuario(**datos)
@@ -1,12 +1,276 @@
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import delete, func, insert, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateColumn
 from sqlmodel import create_engine, SQLModel
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.esquema import EsquemaVersion
+from app.utils.busqueda import crear_indice_busqueda
+from app.utils.metricas_sql import instrumentar
+
+logger = logging.getLogger("app.database")
+
+url_conection = os.getenv("DATABASE_URL", 'mysql+pymysql://root@localhost:3306/proy_lenguaje')
+# Replica de solo lectura opcional; si no se define, las lecturas van al primario
+url_lectura = os.getenv("DATABASE_READ_URL")
+
+# Driver asincrono equivalente a cada driver sincrono
+DRIVERS_ASYNC = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+METODOS_LECTURA = {"GET", "HEAD"}
+
+# Subir este numero con cada cambio de modelos: al arrancar solo se ejecuta
+# create_all si la BD tiene una version distinta
+ESQUEMA_VERSION = 5
+# auto: DDL solo si cambia la version | omitir: nunca (migraciones externas)
+# forzar: siempre create_all, como antes
+DB_INIT = os.getenv("DB_INIT", "auto").lower()
+
+def url_async(url: str) -> str:
+    """Traduce la URL de conexion al driver asincrono del mismo motor"""
+    url = make_url(url)
+    return url.set(drivername=DRIVERS_ASYNC[url.get_backend_name()]).render_as_string(hide_password=False)
+
+def opciones_pool(url: str) -> dict:
+    """Parametros del pool leidos del entorno (DB_POOL_*)"""
+    opciones = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    # SQLite en memoria usa un pool de una sola conexion sin tamaño
+    if make_url(url).database not in (None, "", ":memory:"):
+        opciones.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+    return opciones
+
+# Vida media (s) de la espera reciente: sin peticiones nuevas, el valor cae a
+# la mitad cada ESPERA_VIDA_MEDIA_S y el control de admision vuelve a dejar pasar
+ESPERA_VIDA_MEDIA_S = 2.0
+
+class EstadisticasPool:
+    """Tiempos de espera para obtener una conexion de un engine"""
+
+    def __init__(self):
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        # Peticiones esperando ahora mismo una conexion
+        self.esperando = 0
+        self._reciente = 0.0
+        self._reciente_t = time.monotonic()
+
+    def registrar(self, segundos: float):
+        self.esperas += 1
+        self.espera_total += segundos
+        self.espera_max = max(self.espera_max, segundos)
+        self._reciente = 0.8 * self.espera_reciente() + 0.2 * segundos
+        self._reciente_t = time.monotonic()
+
+    def espera_reciente(self) -> float:
+        """Media movil de la espera, atenuada con el tiempo transcurrido"""
+        return self._reciente * 0.5 ** ((time.monotonic() - self._reciente_t) / ESPERA_VIDA_MEDIA_S)
+
+    def resumen(self, pool) -> dict:
+        datos = {
+            "pool": type(pool).__name__,
+            "esperas": self.esperas,
+            "espera_media_ms": round(1000 * self.espera_total / self.esperas, 3) if self.esperas else 0.0,
+            "espera_max_ms": round(1000 * self.espera_max, 3),
+            "espera_reciente_ms": round(1000 * self.espera_reciente(), 3),
+            "esperando": self.esperando,
+        }
+        if isinstance(pool, QueuePool):
+            datos.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return datos
+
+# --- Engines ---
+# Se crean al primer uso: importar la app (tests, herramientas) no necesita
+# la BD ni sus drivers
+
+estadisticas_pool: dict = {}
+
+@lru_cache
+def get_engine():
+    engine = create_engine(url_conection, **opciones_pool(url_conection))
+    instrumentar(engine)
+    return engine
 
-url_conection = 'mysql+pymysql://root@localhost:3306/proy_lenguaje'
-engine = create_engine(url_conection)
+def _crear_async_engine(url: str):
+    engine = create_async_engine(url_async(url), **opciones_pool(url))
+    instrumentar(engine)
+    estadisticas_pool[engine] = EstadisticasPool()
+    return engine
 
-def init_db():
+@lru_cache
+def get_async_engine():
+    return _crear_async_engine(url_conection)
+
+@lru_cache
+def get_async_engine_lectura():
+    # Replica de solo lectura si existe; si no, el mismo engine del primario
+    return _crear_async_engine(url_lectura) if url_lectura else get_async_engine()
+
+async def cerrar_engines():
+    for engine in estadisticas_pool:
+        await engine.dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+
+# --- Esquema ---
+
+def version_esquema(conn) -> Optional[int]:
+    """Version registrada en la BD, o None si aun no hay esquema"""
+    try:
+        return conn.execute(select(EsquemaVersion.version)).scalar()
+    except DBAPIError:
+        conn.rollback()
+        return None
+
+def agregar_columnas_nuevas(conn):
+    """ALTER TABLE ADD COLUMN de las columnas de los modelos que faltan en tablas existentes.
+
+    create_all no modifica tablas ya creadas; las columnas nuevas deben ser
+    nullable o tener server_default para rellenar las filas existentes.
+    """
+    inspector = inspect(conn)
+    for tabla in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name not in existentes:
+                ddl = CreateColumn(columna).compile(dialect=conn.dialect)
+                nombre = conn.dialect.identifier_preparer.format_table(tabla)
+                conn.exec_driver_sql(f"ALTER TABLE {nombre} ADD COLUMN {ddl}")
+
+def _duplicados(conn, indice) -> list:
+    """Valores repetidos en las columnas de un indice unico (impiden crearlo)"""
+    columnas = list(indice.columns)
+    consulta = select(*columnas).group_by(*columnas).having(func.count() > 1).limit(10)
+    return [tuple(fila) for fila in conn.execute(consulta)]
+
+def crear_indices_nuevos(conn):
+    """Crea los indices de los modelos que faltan en tablas existentes.
+
+    create_all no toca tablas ya creadas: sin esto, indices agregados despues
+    (usuario.correo, compra.fecha, ...) nunca llegan a una BD en uso. Un
+    indice existente sobre las mismas columnas se da por bueno. Si un indice
+    unico no se puede crear por valores repetidos, se crea sin UNIQUE (la
+    busqueda igual usa el indice) y se avisa para corregir los datos; se
+    vuelve a intentar en el siguiente cambio de esquema.
+    """
+    inspector = inspect(conn)
+    for tabla in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {i["name"]: i for i in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            columnas = [c.name for c in indice.columns]
+            actual = existentes.get(indice.name)
+            if actual is not None and bool(actual["unique"]) == bool(indice.unique):
+                continue
+            if actual is None and any(
+                i["column_names"] == columnas and (i["unique"] or not indice.unique) for i in existentes.values()
+            ):
+                continue
+            unico = indice.unique
+            if unico and (repetidos := _duplicados(conn, indice)):
+                logger.warning(json.dumps({
+                    "evento": "indice_unico_con_duplicados", "indice": indice.name,
+                    "valores": [list(map(str, r)) for r in repetidos],
+                }, ensure_ascii=False))
+                if actual is not None:
+                    continue
+                unico = False
+            if actual is not None:
+                indice.drop(conn)
+            if unico == bool(indice.unique):
+                indice.create(conn)
+            else:
+                preparador = conn.dialect.identifier_preparer
+                conn.exec_driver_sql(
+                    f"CREATE INDEX {preparador.quote(indice.name)} ON {preparador.format_table(tabla)} "
+                    f"({', '.join(preparador.quote(c) for c in columnas)})"
+                )
+
+def init_db(forzar: bool = False) -> bool:
+    """Crea tablas e indices si faltan; devuelve True si se ejecuto DDL.
+
+    Con la version al dia solo cuesta una consulta, en vez de reflejar
+    todas las tablas en cada arranque de cada worker.
+    """
+    engine = get_engine()
+    if not forzar:
+        with engine.connect() as conn:
+            if version_esquema(conn) == ESQUEMA_VERSION:
+                return False
     SQLModel.metadata.create_all(bind=engine)
-    
+    with engine.begin() as conn:
+        agregar_columnas_nuevas(conn)
+        crear_indices_nuevos(conn)
+        crear_indice_busqueda(conn)
+        conn.execute(delete(EsquemaVersion))
+        conn.execute(insert(EsquemaVersion).values(id=1, version=ESQUEMA_VERSION))
+    return True
+
+# --- Sesiones ---
+
 def get_session():
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    with Session(get_engine()) as session:
+        yield session
+
+def engine_para(metodo: str):
+    # Las lecturas van a la replica (si existe) y las escrituras al primario
+    return get_async_engine_lectura() if metodo in METODOS_LECTURA else get_async_engine()
+
+@asynccontextmanager
+async def abrir_sesion(destino):
+    """Sesion con la conexion ya tomada, registrando la espera en estadisticas_pool"""
+    # Sin expirar al hacer commit: en async no se puede recargar un atributo
+    # de forma perezosa al serializar la respuesta
+    async with AsyncSession(destino, expire_on_commit=False) as session:
+        estadisticas = estadisticas_pool[destino]
+        estadisticas.esperando += 1
+        inicio = time.perf_counter()
+        try:
+            await session.connection()
+        finally:
+            estadisticas.esperando -= 1
+        estadisticas.registrar(time.perf_counter() - inicio)
+        yield session
+
+async def get_async_session(request: Request):
+    async with abrir_sesion(engine_para(request.method)) as session:
+        yield session
+
+def estado_pools() -> dict:
+    """Estado de los pools de escritura y lectura para /internal/pool"""
+    escritura, lectura = get_async_engine(), get_async_engine_lectura()
+    estado = {"escritura": estadisticas_pool[escritura].resumen(escritura.pool)}
+    if lectura is not escritura:
+        estado["lectura"] = estadisticas_pool[lectura].resumen(lectura.pool)
+    return estado
@@ -1,4 +1,12 @@
 # Punto de entrada de la app (ejecuta el servidor)
+import time
+
+# Inicio de la importacion: el tiempo de arranque incluye cargar los modulos
+_inicio = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.producto_routes import router as producto_router
@@ -7,10 +15,63 @@ from app.routes.variante_routes import router as variante_router
 from app.routes.compra_routes import router as compra_router
 from app.routes.detalle_compra_routes import router as detalle_compra_router
 from app.routes.usuario_routes import router as usuario_router
+from app.routes.internal_routes import router as internal_router
+from app.routes.reporte_routes import router as reporte_router
+from app.routes.inventario_routes import router as inventario_router
+from app.routes.imagen_routes import router as imagen_router
 from app.auth.auth_router import auth_router
-from app.database import init_db
+from app.database import DB_INIT, cerrar_engines, get_async_engine, get_async_engine_lectura, init_db
+from app.utils.arranque import ARRANQUE_CALENTAR, RUTAS_CALENTAR, Cronometro, calentar_pool, calentar_rutas
+from app.utils.imagenes import LimiteSubidaMiddleware
+from app.utils.limites import LimitesMiddleware
+from app.utils.metricas_sql import MetricasSQLMiddleware
+from app.utils.perfilador import PerfiladorMiddleware
+from app.utils.respuestas import GZIP_MINIMO, GZIP_NIVEL, GZipListados
+from app.utils.security import cerrar_pool_hash
+from app.utils.tareas import cola_tareas
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El worker no acepta peticiones hasta terminar este bloque
+    cronometro = Cronometro(_inicio)
+    cronometro.fase("importacion")
+
+    ddl = False
+    if DB_INIT != "omitir":
+        ddl = await asyncio.to_thread(init_db, DB_INIT == "forzar")
+    cronometro.fase("esquema")
+
+    conexiones = 0
+    rutas = {}
+    if ARRANQUE_CALENTAR:
+        for engine in {get_async_engine(), get_async_engine_lectura()}:
+            conexiones += await calentar_pool(engine)
+        cronometro.fase("pool")
+        rutas = await calentar_rutas(app, RUTAS_CALENTAR)
+        cronometro.fase("cache")
+    cronometro.terminar(ddl=ddl, conexiones=conexiones, rutas=rutas)
+
+    # Workers de la cola de tareas; recogen tambien lo pendiente de antes del reinicio
+    cola_tareas.iniciar(get_async_engine())
+    await cola_tareas.recoger_pendientes()
 
-app = FastAPI()
+    yield
+
+    await cola_tareas.detener()
+    cerrar_pool_hash()
+    await cerrar_engines()
+
+app = FastAPI(lifespan=lifespan)
+
+# gzip para las respuestas grandes si el cliente lo acepta (SSE e imagenes quedan excluidos)
+app.add_middleware(GZipListados, minimum_size=GZIP_MINIMO, compresslevel=GZIP_NIVEL)
+
+# Subidas de imagen demasiado grandes se rechazan antes de recibir el cuerpo
+app.add_middleware(LimiteSubidaMiddleware)
+
+# Limite de tasa por cliente y 503 temprano si el pool esta saturado (va
+# dentro de CORS para que las respuestas 429/503 lleven sus cabeceras)
+app.add_middleware(LimitesMiddleware)
 
 #
 app.add_middleware(
@@ -19,12 +80,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "Retry-After", "X-Perfil-Id"],
 )
+# Numero de consultas y tiempo de BD por peticion (cabecera Server-Timing)
+app.add_middleware(MetricasSQLMiddleware)
+# Perfilador bajo demanda (solo con PERFILADOR_TOKEN); el mas externo, para
+# que el perfil incluya tambien gzip, limites y demas middlewares
+app.add_middleware(PerfiladorMiddleware)
 
-routes = [producto_router,categoria_router,variante_router,compra_router,detalle_compra_router, usuario_router,auth_router]
+routes = [producto_router,categoria_router,variante_router,compra_router,detalle_compra_router, usuario_router,auth_router,reporte_router,inventario_router,imagen_router,internal_router]
 
 for i in routes:
     app.include_router(i)
-
-#Inicializaion de la base de datos
-init_db()
\ No newline at end of file
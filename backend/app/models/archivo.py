@@ -0,0 +1,27 @@
+import datetime
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+# Compras antiguas y sus detalles, movidas fuera de las tablas calientes por
+# el archivado (ver app/utils/archivo.py). Mismas columnas y mismos ids que
+# compra y detalle_compra; son de solo lectura.
+
+class CompraArchivada(SQLModel, table=True):
+    __tablename__ = "compra_archivo"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    fecha: datetime.date = Field(index=True)
+    total: float
+    version: int = 1
+
+    id_usuario: Optional[int] = Field(default=None, foreign_key="usuario.id", index=True)
+
+class DetalleCompraArchivado(SQLModel, table=True):
+    __tablename__ = "detalle_compra_archivo"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cantidad: int
+    subtotal: float
+
+    id_compra: Optional[int] = Field(default=None, foreign_key="compra_archivo.id", index=True)
+    id_variante: Optional[int] = Field(default=None, foreign_key="variante.id", index=True)
@@ -9,10 +9,12 @@ if TYPE_CHECKING:
 
 class Compra(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    fecha: datetime.date
+    fecha: datetime.date = Field(index=True)
     total: float
+    # Concurrencia optimista: sube en cada escritura (ETag / If-Match)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     
-    id_usuario: Optional[int] = Field(default=None, foreign_key="usuario.id")
+    id_usuario: Optional[int] = Field(default=None, foreign_key="usuario.id", index=True)
     variantes: list["Variante"] = Relationship(back_populates="compras", link_model=DetalleCompra)
     
     detalles: list["DetalleCompra"] = Relationship(back_populates="compra")
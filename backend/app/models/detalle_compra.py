@@ -10,8 +10,8 @@ class DetalleCompra(SQLModel, table=True):
     cantidad: int
     subtotal: float
     
-    id_compra: Optional[int] = Field(default=None, foreign_key="compra.id")
-    id_variante: Optional[int] = Field(default=None, foreign_key="variante.id")
+    id_compra: Optional[int] = Field(default=None, foreign_key="compra.id", index=True)
+    id_variante: Optional[int] = Field(default=None, foreign_key="variante.id", index=True)
     
     compra: Optional["Compra"] = Relationship(back_populates="detalles")
     variante: Optional["Variante"] = Relationship(back_populates="detalles")
\ No newline at end of file
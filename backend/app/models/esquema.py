@@ -0,0 +1,8 @@
+from sqlmodel import SQLModel, Field
+
+class EsquemaVersion(SQLModel, table=True):
+    """Version del esquema creado en la BD (una sola fila)"""
+    __tablename__ = "esquema_version"
+
+    id: int = Field(default=1, primary_key=True)
+    version: int
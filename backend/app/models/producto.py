@@ -9,8 +9,10 @@ class Producto(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     nombre: str
     descripcion: str
+    # Concurrencia optimista: sube en cada escritura (ETag / If-Match)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     
-    id_categoria: Optional[int] = Field(default=None, foreign_key="categoria.id")
+    id_categoria: Optional[int] = Field(default=None, foreign_key="categoria.id", index=True)
     
     categoria: Optional["Categoria"] = Relationship(back_populates="productos")
     
@@ -0,0 +1,20 @@
+import datetime
+from sqlmodel import SQLModel, Field
+
+# Tablas de resumen mantenidas de forma incremental por las rutas que
+# escriben compras y detalles (ver app/utils/resumenes.py)
+
+class ResumenCompraDiaria(SQLModel, table=True):
+    __tablename__ = "resumen_compra_diaria"
+
+    fecha: datetime.date = Field(primary_key=True)
+    compras: int = 0
+    total: float = 0
+
+class ResumenVentaDiaria(SQLModel, table=True):
+    __tablename__ = "resumen_venta_diaria"
+
+    fecha: datetime.date = Field(primary_key=True)
+    id_variante: int = Field(primary_key=True, index=True)
+    unidades: int = 0
+    ingresos: float = 0
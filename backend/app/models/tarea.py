@@ -0,0 +1,21 @@
+import datetime
+from typing import Optional
+from sqlalchemy import Text
+from sqlmodel import SQLModel, Field
+
+# Cola persistente de efectos secundarios (ver app/utils/tareas.py). La fila
+# se inserta en la misma transaccion que la escritura que la origina.
+
+class Tarea(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tipo: str = Field(max_length=50)
+    # Argumentos de la tarea en JSON
+    datos: str = Field(sa_type=Text)
+    # pendiente | en_curso | fallida (las terminadas se borran)
+    estado: str = Field(default="pendiente", max_length=20)
+    intentos: int = 0
+    # Cuando puede ejecutarse: ahora, tras el backoff de un reintento o al
+    # vencer el plazo de un worker que la tomo y no termino
+    proximo_intento: datetime.datetime = Field(default_factory=datetime.datetime.now, index=True)
+    creada: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    error: Optional[str] = Field(default=None, sa_type=Text)
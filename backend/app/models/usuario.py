@@ -9,7 +9,7 @@ class Usuario(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     nombres: str
     apellidos: str
-    correo: str
+    correo: str = Field(index=True, unique=True, max_length=255)
     contrasena: str
     fecha_registro: datetime.date = Field(default_factory=datetime.date.today)
     dni: str
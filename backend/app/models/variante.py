@@ -14,8 +14,10 @@ class Variante(SQLModel, table=True):
     stock: int
     cantidad: int 
     activo: bool = Field(default=True)
+    # Concurrencia optimista: sube en cada escritura (ETag / If-Match)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     
-    id_producto: Optional[int] = Field(default=None, foreign_key="producto.id")
+    id_producto: Optional[int] = Field(default=None, foreign_key="producto.id", index=True)
     
     producto: Optional["Producto"] = Relationship(back_populates="variantes")
     
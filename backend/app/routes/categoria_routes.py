@@ -1,37 +1,53 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.categoria import Categoria
-from app.database import get_session
+from app.database import get_async_session
+from app.utils.cache import FALTA, cache_catalogo
+from app.utils.paginacion import CABECERA_CURSOR, Pagina
 
 router = APIRouter()
 
 @router.get("/categorias")
-def get_categoria(session: Session = Depends(get_session)):
-    categorias = session.query(Categoria).all()
-    return categorias
+async def get_categoria(pagina: Pagina = Depends(), session: AsyncSession = Depends(get_async_session)):
+    clave = ("categorias", pagina.limit, pagina.cursor)
+    cacheado = cache_catalogo.obtener(clave)
+    if cacheado is not FALTA:
+        datos, siguiente = cacheado
+        pagina.response.headers[CABECERA_CURSOR] = siguiente
+        return datos
+
+    version = cache_catalogo.version
+    categorias = await pagina.aplicar(session, select(Categoria), Categoria.id)
+    datos = [c.model_dump() for c in categorias]
+    cache_catalogo.guardar(clave, (datos, pagina.response.headers.get(CABECERA_CURSOR)), {"categorias"}, version)
+    return datos
 
 @router.post("/categorias")
-def add_categoria(categoria: Categoria, session: Session = Depends(get_session)):
+async def add_categoria(categoria: Categoria, session: AsyncSession = Depends(get_async_session)):
     session.add(categoria)
-    session.commit()
-    session.refresh(categoria)
+    await session.commit()
+    cache_catalogo.invalidar("categorias")
+    await session.refresh(categoria)
     return categoria
 
 @router.put("/categorias/{categoria_id}")
-def update_categoria(categoria_id: int, categoria: Categoria, session: Session = Depends(get_session)):
-    existing_categoria = session.get(Categoria, categoria_id)
+async def update_categoria(categoria_id: int, categoria: Categoria, session: AsyncSession = Depends(get_async_session)):
+    existing_categoria = await session.get(Categoria, categoria_id)
     if not existing_categoria:
         return {"error": "Categoría no encontrada"}
     existing_categoria.nombre = categoria.nombre
-    session.commit()
-    session.refresh(existing_categoria)
+    await session.commit()
+    cache_catalogo.invalidar("categorias", f"categoria:{categoria_id}")
+    await session.refresh(existing_categoria)
     return existing_categoria
 
 @router.delete("/categorias/{categoria_id}")
-def delete_categoria(categoria_id: int, session: Session = Depends(get_session)):
-    existing_categoria = session.get(Categoria, categoria_id)
+async def delete_categoria(categoria_id: int, session: AsyncSession = Depends(get_async_session)):
+    existing_categoria = await session.get(Categoria, categoria_id)
     if not existing_categoria:
         return {"error": "Categoría no encontrada"}
-    session.delete(existing_categoria)
-    session.commit()
+    await session.delete(existing_categoria)
+    await session.commit()
+    cache_catalogo.invalidar("categorias", f"categoria:{categoria_id}")
     return {"message": "Categoría eliminada correctamente"}
@@ -1,10 +1,26 @@
-from typing import List
+import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy import delete, insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.models.archivo import CompraArchivada
 from app.models.compra import Compra
-from app.database import get_session
+from app.models.detalle_compra import DetalleCompra
+from app.models.variante import Variante
+from app.schemas.negocio_schema import CheckoutCreate
+from app.database import get_async_session
+from app.utils.archivo import con_archivo, frontera_archivo, necesita_archivo
+from app.utils.cache import cache_catalogo
+from app.utils.concurrencia import (
+    actualizar_con_version, conflicto, poner_etag, sin_no_editables, version_de_if_match,
+)
+from app.utils.eventos import encolar_revision_stock, publicar_variantes
+from app.utils.paginacion import Pagina
+from app.utils.respuestas import respuesta_json, serializar
+from app.utils.resumenes import a_fecha, detalles_de_compra, encolar_resumen_compra
 
 router = APIRouter(
     prefix="/compras",
@@ -12,41 +28,185 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Compra])
-def get_compras(session: Session = Depends(get_session)):
-    """Devuelve todas las compras registradas en la base de datos"""
-    compras = session.exec(select(Compra)).all()
-    return compras
+async def get_compras(
+    pagina: Pagina = Depends(),
+    fecha_desde: Optional[datetime.date] = None,
+    fecha_hasta: Optional[datetime.date] = None,
+    id_usuario: Optional[int] = None,
+    incluir_archivo: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Devuelve las compras registradas, ordenadas por fecha y paginadas por cursor.
+
+    Las compras archivadas se incluyen si `fecha_desde` llega hasta ellas o
+    con `incluir_archivo`.
+    """
+    def filtros(modelo) -> list:
+        condiciones = []
+        if fecha_desde is not None:
+            condiciones.append(modelo.fecha >= fecha_desde)
+        if fecha_hasta is not None:
+            condiciones.append(modelo.fecha <= fecha_hasta)
+        if id_usuario is not None:
+            condiciones.append(modelo.id_usuario == id_usuario)
+        return condiciones
+
+    # Solo se lee el archivo si el rango pedido empieza antes de su frontera
+    frontera = await frontera_archivo(session)
+    if necesita_archivo(frontera, fecha_desde) or (incluir_archivo and frontera is not None):
+        tabla = con_archivo(
+            Compra, CompraArchivada, filtros, lambda consulta, m: pagina.acotar(consulta, m.fecha, m.id),
+        )
+        consulta = select(tabla)
+    else:
+        tabla = Compra
+        consulta = select(Compra).where(*filtros(Compra))
+    compras = await pagina.aplicar(session, consulta, tabla.fecha, tabla.id)
+    return respuesta_json(serializar(Compra, compras), pagina.response)
 
 @router.post("/", response_model=Compra, status_code=status.HTTP_201_CREATED)
-def add_compra(compra: Compra, session: Session = Depends(get_session)):
+async def add_compra(compra: Compra, session: AsyncSession = Depends(get_async_session)):
     """Crea una nueva compra con fecha y total"""
+    # El modelo de tabla no valida el cuerpo: la fecha puede llegar como texto
+    try:
+        compra.fecha = a_fecha(compra.fecha)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Fecha invalida")
     session.add(compra)
-    session.commit()
-    session.refresh(compra)
+    # El resumen diario lo suma la cola de tareas despues del commit
+    encolar_resumen_compra(session, compra.fecha, compra.total)
+    await session.commit()
+    await session.refresh(compra)
+    return compra
+
+@router.post("/checkout", response_model=Compra, status_code=status.HTTP_201_CREATED)
+async def checkout(carrito: CheckoutCreate, session: AsyncSession = Depends(get_async_session)):
+    """Registra una compra completa (compra, detalles y stock) en una sola transaccion"""
+    cantidades: dict[int, int] = {}
+    for item in carrito.items:
+        cantidades[item.id_variante] = cantidades.get(item.id_variante, 0) + item.cantidad
+
+    variantes = (await session.exec(
+        select(Variante).where(Variante.id.in_(cantidades), Variante.activo == True)
+    )).all()
+    precios = {v.id: v.precio for v in variantes}
+    faltantes = [id_variante for id_variante in cantidades if id_variante not in precios]
+    if faltantes:
+        raise HTTPException(status_code=404, detail=f"Variantes no disponibles: {faltantes}")
+
+    # Descuento condicional: si otra compra se llevo el stock, no se actualiza
+    # ninguna fila y se revierte todo. Se recorre en orden de id para que dos
+    # compras simultaneas bloqueen las filas en el mismo orden.
+    for id_variante in sorted(cantidades):
+        cantidad = cantidades[id_variante]
+        resultado = await session.exec(
+            update(Variante)
+            .where(Variante.id == id_variante, Variante.stock >= cantidad)
+            .values(stock=Variante.stock - cantidad, version=Variante.version + 1)
+        )
+        if resultado.rowcount != 1:
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Stock insuficiente para la variante {id_variante}",
+            )
+
+    compra = Compra(
+        fecha=datetime.date.today(),
+        total=round(sum(precios[i] * c for i, c in cantidades.items()), 2),
+        id_usuario=carrito.id_usuario,
+    )
+    session.add(compra)
+    await session.flush()
+
+    await session.exec(
+        insert(DetalleCompra),
+        params=[
+            {
+                "id_compra": compra.id,
+                "id_variante": id_variante,
+                "cantidad": cantidad,
+                "subtotal": round(precios[id_variante] * cantidad, 2),
+            }
+            for id_variante, cantidad in cantidades.items()
+        ],
+    )
+    # Efectos secundarios fuera de la peticion: se confirman con la compra y
+    # los ejecuta la cola de tareas
+    encolar_resumen_compra(
+        session, compra.fecha, compra.total,
+        [(i, c, round(precios[i] * c, 2)) for i, c in cantidades.items()],
+    )
+    encolar_revision_stock(session, sorted(cantidades))
+    await session.commit()
+    cache_catalogo.invalidar("variantes", *(f"variante:{i}" for i in cantidades))
+    await publicar_variantes(session, cantidades)
+    await session.refresh(compra)
+    return compra
+
+@router.get("/{compra_id}", response_model=Compra)
+async def get_compra(compra_id: int, response: Response, session: AsyncSession = Depends(get_async_session)):
+    """Devuelve una compra (tambien si esta archivada) con su version en la cabecera ETag"""
+    compra = await session.get(Compra, compra_id) or await session.get(CompraArchivada, compra_id)
+    if not compra:
+        raise HTTPException(status_code=404, detail="Compra no encontrada")
+    poner_etag(response, compra.version)
     return compra
 
 @router.put("/{compra_id}", response_model=Compra)
-def update_compra(compra_id: int, compra: Compra, session: Session = Depends(get_session)):
+async def update_compra(
+    compra_id: int,
+    compra: Compra,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+):
     """Actualiza los datos de una compra existente"""
-    existing = session.get(Compra, compra_id)
+    existing = await session.get(Compra, compra_id)
     if not existing:
         raise HTTPException(status_code=404, detail="Compra no encontrada")
-    
-    compra_data = compra.dict(exclude_unset=True)
-    for key, value in compra_data.items():
-        setattr(existing, key, value)
-    
-    session.add(existing)
-    session.commit()
-    session.refresh(existing)
+    fecha_anterior, total_anterior = a_fecha(existing.fecha), existing.total
+
+    version = version_de_if_match(if_match)
+    if version is not None and version != existing.version:
+        raise conflicto(existing.version)
+
+    # El UPDATE exige la version leida aunque no venga If-Match: los
+    # resumenes se ajustan con los valores anteriores y no deben haber cambiado
+    compra_data = sin_no_editables(compra.dict(exclude_unset=True))
+    if "fecha" in compra_data:
+        try:
+            compra_data["fecha"] = a_fecha(compra_data["fecha"])
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Fecha invalida")
+    nueva_version = await actualizar_con_version(
+        session, Compra, compra_id, compra_data, existing.version, "Compra no encontrada",
+    )
+
+    # Resumenes (en la cola, con el commit): se quita la compra de su dia
+    # anterior y se suma con los datos nuevos; si cambio la fecha, sus lineas
+    # tambien se mueven de dia
+    fecha_nueva = compra_data.get("fecha", fecha_anterior)
+    detalles = await detalles_de_compra(session, compra_id) if fecha_nueva != fecha_anterior else ()
+    encolar_resumen_compra(session, fecha_anterior, total_anterior, detalles, signo=-1)
+    encolar_resumen_compra(session, fecha_nueva, compra_data.get("total", total_anterior), detalles)
+
+    await session.commit()
+    await session.refresh(existing)
+    poner_etag(response, nueva_version)
     return existing
 
 @router.delete("/{compra_id}")
-def delete_compra(compra_id: int, session: Session = Depends(get_session)):
-    """Elimina una compra por su ID"""
-    existing = session.get(Compra, compra_id)
+async def delete_compra(compra_id: int, session: AsyncSession = Depends(get_async_session)):
+    """Elimina una compra por su ID junto con sus detalles"""
+    existing = await session.get(Compra, compra_id)
     if not existing:
         raise HTTPException(status_code=404, detail="Compra no encontrada")
-    session.delete(existing)
-    session.commit()
+    # Las lineas se leen ahora, antes de borrarlas; la resta la hace la cola
+    encolar_resumen_compra(
+        session, existing.fecha, existing.total, await detalles_de_compra(session, compra_id), signo=-1,
+    )
+    await session.exec(delete(DetalleCompra).where(DetalleCompra.id_compra == compra_id))
+    await session.delete(existing)
+    await session.commit()
     return {"message": "Compra eliminada correctamente"}
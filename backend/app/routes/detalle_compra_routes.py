@@ -1,42 +1,93 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.archivo import CompraArchivada, DetalleCompraArchivado
+from app.models.compra import Compra
 from app.models.detalle_compra import DetalleCompra
-from app.database import get_session
+from app.database import get_async_session
+from app.utils.archivo import con_archivo, frontera_archivo
+from app.utils.paginacion import Pagina
+from app.utils.respuestas import respuesta_json, serializar
+from app.utils.resumenes import encolar_resumen_detalles
 
 router = APIRouter()
 
+async def _encolar_detalle(session: AsyncSession, detalle: DetalleCompra, signo: int = 1):
+    # La fecha de la linea es la de su compra; el resumen lo ajusta la cola
+    if detalle.id_compra is None:
+        return
+    compra = await session.get(Compra, detalle.id_compra)
+    if compra is not None:
+        encolar_resumen_detalles(
+            session, compra.fecha, [(detalle.id_variante, detalle.cantidad, detalle.subtotal)], signo
+        )
+
 @router.get("/detalle_compras")
-def get_detalle_compras(session: Session = Depends(get_session)):
-    detalleCompra = session.query(DetalleCompra).all()
-    return detalleCompra
-        
+async def get_detalle_compras(
+    pagina: Pagina = Depends(),
+    id_compra: Optional[int] = None,
+    id_variante: Optional[int] = None,
+    incluir_archivo: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Lineas de compra paginadas por id; las archivadas con `id_compra` o `incluir_archivo`"""
+    def filtros(modelo) -> list:
+        condiciones = []
+        if id_compra is not None:
+            condiciones.append(modelo.id_compra == id_compra)
+        if id_variante is not None:
+            condiciones.append(modelo.id_variante == id_variante)
+        return condiciones
+
+    # Las lineas de una compra se archivan junto con ella: basta una tabla
+    if id_compra is not None:
+        archivada = await session.get(CompraArchivada, id_compra) is not None
+        tabla = DetalleCompraArchivado if archivada else DetalleCompra
+        consulta = select(tabla).where(*filtros(tabla))
+    elif incluir_archivo and await frontera_archivo(session) is not None:
+        tabla = con_archivo(
+            DetalleCompra, DetalleCompraArchivado, filtros, lambda consulta, m: pagina.acotar(consulta, m.id),
+        )
+        consulta = select(tabla)
+    else:
+        tabla = DetalleCompra
+        consulta = select(DetalleCompra).where(*filtros(DetalleCompra))
+    detalles = await pagina.aplicar(session, consulta, tabla.id)
+    return respuesta_json(serializar(DetalleCompra, detalles), pagina.response)
+
 
 @router.post("/detalle_compras")
-def add_detalle_compras(detalleCompra: DetalleCompra, session: Session = Depends(get_session)):
+async def add_detalle_compras(detalleCompra: DetalleCompra, session: AsyncSession = Depends(get_async_session)):
     session.add(detalleCompra)
-    session.commit()
-    session.refresh()
+    await _encolar_detalle(session, detalleCompra)
+    await session.commit()
+    await session.refresh(detalleCompra)
     return detalleCompra
 
 @router.put("/detalle_compras/{detalle_id}")
-def update_detalle_compra(detalle_id: int, detalleCompra: DetalleCompra, session: Session = Depends(get_session)):
-    existing_detalle = session.query(DetalleCompra).filter(DetalleCompra.id == detalle_id).first()
+async def update_detalle_compra(detalle_id: int, detalleCompra: DetalleCompra, session: AsyncSession = Depends(get_async_session)):
+    existing_detalle = await session.get(DetalleCompra, detalle_id)
     if not existing_detalle:
         return {"error": "DetalleCompra not found"}
+    await _encolar_detalle(session, existing_detalle, signo=-1)
     
-    for key, value in detalleCompra.dict().items():
+    for key, value in detalleCompra.dict(exclude_unset=True).items():
         setattr(existing_detalle, key, value)
     
-    session.commit()
-    session.refresh(existing_detalle)
+    await _encolar_detalle(session, existing_detalle)
+    await session.commit()
+    await session.refresh(existing_detalle)
     return existing_detalle
 
 @router.delete("/detalle_compras/{detalle_id}")
-def delete_detalle_compra(detalle_id: int, session: Session = Depends(get_session)):
-    detalleCompra = session.query(DetalleCompra).filter(DetalleCompra.id == detalle_id).first()
+async def delete_detalle_compra(detalle_id: int, session: AsyncSession = Depends(get_async_session)):
+    detalleCompra = await session.get(DetalleCompra, detalle_id)
     if not detalleCompra:
         return {"error": "DetalleCompra not found"}
     
-    session.delete(detalleCompra)
-    session.commit()
+    await _encolar_detalle(session, detalleCompra, signo=-1)
+    await session.delete(detalleCompra)
+    await session.commit()
     return {"message": "DetalleCompra deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,41 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import FileResponse
+
+from app.utils.imagenes import TIPOS_IMAGEN, ruta_imagen
+
+router = APIRouter(tags=["imagenes"])
+
+# El contenido de una clave nunca cambia: el navegador puede guardarla un año
+# sin volver a preguntar
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+@router.get("/imagenes/{clave}")
+async def get_imagen(clave: str, if_none_match: Optional[str] = Header(None)):
+    """Sirve una imagen del almacen con ETag fuerte (su hash) y soporte de Range.
+
+    FileResponse envia el archivo por bloques desde disco (o con
+    http.response.pathsend si el servidor lo soporta), sin leerlo entero
+    en memoria.
+    """
+    ruta = ruta_imagen(clave)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    etag = f'"{clave.split(".")[0]}"'
+    cabeceras = {"ETag": etag, "Cache-Control": CACHE_INMUTABLE}
+
+    # Mismo hash = mismos bytes: basta comparar el ETag, sin tocar el disco
+    if if_none_match is not None and (if_none_match.strip() == "*" or etag in if_none_match):
+        return Response(status_code=304, headers=cabeceras)
+
+    try:
+        estado = ruta.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    return FileResponse(
+        ruta,
+        media_type=TIPOS_IMAGEN[clave.rsplit(".", 1)[1]],
+        headers=cabeceras,
+        stat_result=estado,
+    )
@@ -0,0 +1,131 @@
+import hmac
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import estado_pools, get_async_session
+from app.utils.archivo import (
+    ARCHIVO_HORIZONTE_DIAS, ARCHIVO_HORIZONTE_MIN_DIAS, ARCHIVO_TOKEN, encolar_archivado, estado_archivo,
+)
+from app.utils.arranque import tiempos_arranque
+from app.utils.cache import cache_catalogo, cache_reportes
+from app.utils.eventos import hub_inventario
+from app.utils.limites import estadisticas_limites
+from app.utils.perfilador import PERFIL_MAX_PETICIONES, PERFIL_MAX_S, PERFILADOR_TOKEN, perfilador, token_valido
+from app.utils.tareas import cola_tareas
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["internal"]
+)
+
+@router.get("/pool")
+async def get_estado_pool():
+    """Conexiones en uso, overflow y tiempos de espera de cada pool"""
+    return estado_pools()
+
+@router.get("/cache")
+async def get_estado_cache(nombre: Literal["catalogo", "reportes"] = "catalogo"):
+    """Hits, misses y evictions del cache de catalogo (o del de reportes)"""
+    return (cache_reportes if nombre == "reportes" else cache_catalogo).estadisticas()
+
+@router.get("/arranque")
+async def get_tiempos_arranque():
+    """Duracion de cada fase del arranque de este worker"""
+    return tiempos_arranque
+
+@router.get("/inventario")
+async def get_estado_inventario():
+    """Suscriptores del flujo de inventario y eventos publicados/coalescidos"""
+    return hub_inventario.estadisticas()
+
+@router.get("/tareas")
+async def get_estado_tareas():
+    """Tareas en cola, completadas, reintentadas y fallidas de este worker"""
+    return cola_tareas.estadisticas()
+
+@router.get("/limites")
+async def get_estado_limites():
+    """Presupuestos por clase de ruta y peticiones rechazadas (429 y 503)"""
+    return estadisticas_limites()
+
+@router.get("/archivo")
+async def get_estado_archivo(session: AsyncSession = Depends(get_async_session)):
+    """Fecha de la compra archivada mas reciente y lotes de archivado pendientes"""
+    return await estado_archivo(session)
+
+# --- Archivado manual (requiere X-Archivo-Token) ---
+def verificar_archivo(x_archivo_token: Optional[str] = Header(None)):
+    # /internal no pasa por el limite de tasa: sin token nadie puede encolar archivados
+    if not ARCHIVO_TOKEN:
+        raise HTTPException(status_code=404, detail="Archivado manual deshabilitado")
+    if x_archivo_token is None or not hmac.compare_digest(x_archivo_token.encode(), ARCHIVO_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de archivado invalido")
+
+@router.post("/archivo", dependencies=[Depends(verificar_archivo)])
+async def archivar_compras(
+    horizonte_dias: int = Query(ARCHIVO_HORIZONTE_DIAS, ge=ARCHIVO_HORIZONTE_MIN_DIAS),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Encola el archivado de las compras mas antiguas que el horizonte (por lotes)"""
+    corte = encolar_archivado(session, horizonte_dias)
+    await session.commit()
+    return {"corte": corte}
+
+# --- Perfilador bajo demanda (requiere X-Perfil-Token) ---
+def verificar_perfilador(x_perfil_token: Optional[str] = Header(None)):
+    if not PERFILADOR_TOKEN:
+        raise HTTPException(status_code=404, detail="Perfilador deshabilitado")
+    if not token_valido(x_perfil_token):
+        raise HTTPException(status_code=403, detail="Token de perfilador invalido")
+
+def _sesion_perfil(id_sesion: int):
+    sesion = perfilador.sesiones.get(id_sesion)
+    if sesion is None:
+        raise HTTPException(status_code=404, detail="Sesion de perfil no encontrada")
+    return sesion
+
+@router.get("/perfil", dependencies=[Depends(verificar_perfilador)])
+async def get_sesiones_perfil():
+    """Sesiones de perfil activas y terminadas recientes"""
+    return perfilador.estadisticas()
+
+@router.post("/perfil", dependencies=[Depends(verificar_perfilador)])
+async def crear_sesion_perfil(
+    ruta: str = Query(..., description="Ruta a perfilar, p.ej. /variantes o /variantes/{variante_id}"),
+    modo: Literal["muestreo", "cprofile"] = "muestreo",
+    peticiones: int = Query(20, ge=1, le=PERFIL_MAX_PETICIONES),
+    porcentaje: float = Query(100, gt=0, le=100),
+    max_segundos: float = Query(60, gt=0, le=PERFIL_MAX_S),
+):
+    """Perfila las proximas `peticiones` a `ruta` (o ese porcentaje de ellas)"""
+    return perfilador.crear(modo, ruta, peticiones, porcentaje, max_segundos).resumen()
+
+@router.get("/perfil/{id_sesion}", dependencies=[Depends(verificar_perfilador)])
+async def get_resultado_perfil(id_sesion: int, formato: Literal["colapsado", "texto", "pstats"] = "colapsado"):
+    """Pilas colapsadas (muestreo) o salida de pstats en texto o binaria (cprofile)"""
+    sesion = _sesion_perfil(id_sesion)
+    if sesion.modo == "muestreo":
+        if formato != "colapsado":
+            raise HTTPException(status_code=400, detail="El muestreo solo tiene formato colapsado")
+        return PlainTextResponse(sesion.colapsado())
+    if formato == "colapsado":
+        raise HTTPException(status_code=400, detail="cProfile no guarda pilas: use texto o pstats")
+    if sesion.en_curso:
+        raise HTTPException(status_code=409, detail="Hay peticiones perfilandose; intente al terminar")
+    if formato == "texto":
+        return PlainTextResponse(sesion.pstats_texto())
+    return Response(
+        sesion.pstats_binario(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="perfil_{id_sesion}.pstats"'},
+    )
+
+@router.delete("/perfil/{id_sesion}", dependencies=[Depends(verificar_perfilador)])
+async def detener_sesion_perfil(id_sesion: int):
+    """Detiene la sesion; su resultado sigue disponible"""
+    sesion = _sesion_perfil(id_sesion)
+    sesion.detenida = True
+    return sesion.resumen()
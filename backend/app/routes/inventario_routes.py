@@ -0,0 +1,103 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.utils.eventos import hub_inventario
+
+router = APIRouter(tags=["inventario"])
+
+# Flujo de cambios de stock, precio y estado de variantes. El cliente carga
+# /variantes una vez y despues aplica los eventos; `version` permite descartar
+# un evento mas viejo que lo que ya tiene.
+#
+#   ids=1,2,3   solo esas variantes
+#   umbral=10   solo variantes con stock <= 10 (alerta=true) y su reposicion (alerta=false)
+
+
+def _ids_de(ids: Optional[str]) -> Optional[set[int]]:
+    if not ids:
+        return None
+    try:
+        return {int(i) for i in ids.split(",") if i.strip()}
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids debe ser una lista de enteros separados por comas")
+
+
+def _mensaje(cambios: list[dict]) -> dict:
+    return {"tipo": "variantes", "cambios": cambios} if cambios else {"tipo": "latido"}
+
+
+# --- WebSocket ---
+@router.websocket("/ws/inventario")
+async def ws_inventario(
+    websocket: WebSocket,
+    ids: Optional[str] = None,
+    umbral: Optional[int] = Query(None, ge=0),
+):
+    suscripcion = hub_inventario.suscribir(_ids_de(ids), umbral)
+    if suscripcion is None:
+        # 1013: intentar mas tarde
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+
+    async def enviar():
+        while True:
+            await websocket.send_json(_mensaje(await suscripcion.siguiente()))
+
+    async def esperar_cierre():
+        # El cliente no manda nada; se lee solo para enterarse del cierre
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tareas = [asyncio.create_task(enviar()), asyncio.create_task(esperar_cierre())]
+    try:
+        await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        hub_inventario.cancelar(suscripcion)
+
+
+# --- Server-Sent Events ---
+@router.get("/inventario/eventos")
+async def sse_inventario(
+    request: Request,
+    ids: Optional[str] = None,
+    umbral: Optional[int] = Query(None, ge=0),
+):
+    filtro = _ids_de(ids)
+    # El 503 tiene que decidirse antes de empezar a responder
+    if hub_inventario.lleno:
+        raise HTTPException(status_code=503, detail="Demasiados suscriptores", headers={"Retry-After": "5"})
+
+    async def eventos():
+        # La suscripcion se registra dentro del generador: si el cliente se va
+        # antes de que empiece la transmision, el generador nunca arranca y
+        # no queda una cola suscrita que nadie cancela
+        suscripcion = hub_inventario.suscribir(filtro, umbral)
+        if suscripcion is None:
+            # Se lleno entre la comprobacion y el inicio: que reintente luego
+            yield "retry: 5000\n\n"
+            return
+        try:
+            while not await request.is_disconnected():
+                cambios = await suscripcion.siguiente()
+                if cambios:
+                    yield f"event: variantes\ndata: {json.dumps(cambios)}\n\n"
+                else:
+                    yield ": latido\n\n"
+        finally:
+            hub_inventario.cancelar(suscripcion)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
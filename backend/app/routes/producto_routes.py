@@ -1,50 +1,267 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.categoria import Categoria
 from app.models.producto import Producto
 from app.schemas.negocio_schema import ProductoRead
-from app.database import get_session
+from app.database import get_async_engine_lectura, get_async_session
+from app.utils.busqueda import filtro_busqueda, indice_productos, palabras
+from app.utils.cache import FALTA, cache_catalogo
+from app.utils.carga import opciones_carga
+from app.utils.concurrencia import actualizar_con_version, poner_etag, sin_no_editables, version_de_if_match
+from app.utils.importacion import (
+    TAMANO_LOTE, TIPOS_MIME, ResultadoImportacion, convertir, exportar_filas, formato_archivo,
+    lotes_del_archivo,
+)
+from app.utils.paginacion import Pagina
+from app.utils.respuestas import respuesta_json, serializar
 
 router = APIRouter()
 
 @router.get("/productos", response_model=list[ProductoRead])
-def get_productos(session: Session = Depends(get_session)):
-    productos = session.exec(select(Producto)).all()
-    return productos
+async def get_productos(
+    pagina: Pagina = Depends(),
+    id_categoria: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    consulta = select(Producto).options(*opciones_carga(Producto, ProductoRead))
+    if id_categoria is not None:
+        consulta = consulta.where(Producto.id_categoria == id_categoria)
+    productos = await pagina.aplicar(session, consulta, Producto.id)
+    return respuesta_json(serializar(ProductoRead, productos), pagina.response)
 
 @router.post("/productos")
-def add_producto(producto: Producto, session: Session = Depends(get_session)):
+async def add_producto(producto: Producto, session: AsyncSession = Depends(get_async_session)):
     session.add(producto)
-    session.commit()
-    session.refresh(producto)
+    await session.commit()
+    await session.refresh(producto)
+    indice_productos.guardar(producto.id, producto.nombre)
     return producto
 
+TIPOS_PRODUCTO = {"id": int, "nombre": str, "descripcion": str, "id_categoria": int, "categoria": str}
+REQUERIDOS_PRODUCTO = ("nombre", "descripcion")
+COLUMNAS_EXPORT_PRODUCTO = ["id", "nombre", "descripcion", "id_categoria", "categoria"]
+
+async def _importar_lote_productos(
+    session: AsyncSession,
+    lote: list,
+    categorias: dict[str, int],
+    resultado: ResultadoImportacion,
+):
+    filas = []
+    for linea, fila in lote:
+        try:
+            if not isinstance(fila, dict):
+                raise ValueError(f"linea no valida: {fila}")
+            filas.append((linea, convertir(fila, TIPOS_PRODUCTO)))
+        except ValueError as error:
+            resultado.error(linea, str(error))
+
+    # Categorias por nombre: una consulta por lote y alta de las que falten
+    nombres = {d["categoria"] for _, d in filas if "categoria" in d and "id_categoria" not in d}
+    nuevas = nombres - categorias.keys()
+    if nuevas:
+        encontradas = await session.exec(select(Categoria.nombre, Categoria.id).where(Categoria.nombre.in_(nuevas)))
+        categorias.update(encontradas.all())
+        faltantes = [Categoria(nombre=nombre) for nombre in nuevas - categorias.keys()]
+        if faltantes:
+            session.add_all(faltantes)
+            await session.flush()
+            categorias.update((c.nombre, c.id) for c in faltantes)
+            cache_catalogo.invalidar("categorias")
+
+    # Un producto existente se reconoce por id o, si no trae id, por nombre
+    ids = {d["id"] for _, d in filas if "id" in d}
+    por_nombre = {d["nombre"] for _, d in filas if "id" not in d and "nombre" in d}
+    existentes = set()
+    ids_por_nombre = {}
+    if ids:
+        existentes.update((await session.exec(select(Producto.id).where(Producto.id.in_(ids)))).all())
+    if por_nombre:
+        ids_por_nombre = dict(
+            (await session.exec(select(Producto.nombre, Producto.id).where(Producto.nombre.in_(por_nombre)))).all()
+        )
+        existentes.update(ids_por_nombre.values())
+
+    inserciones, actualizaciones, lineas = [], [], []
+    ids_nuevos = set()
+    for linea, datos in filas:
+        nombre_categoria = datos.pop("categoria", None)
+        if nombre_categoria is not None and "id_categoria" not in datos:
+            datos["id_categoria"] = categorias[nombre_categoria]
+        if "id" not in datos and datos.get("nombre") in ids_por_nombre:
+            datos["id"] = ids_por_nombre[datos["nombre"]]
+        if datos.get("id") in existentes:
+            actualizaciones.append(datos)
+            lineas.append(linea)
+            continue
+        faltantes = [campo for campo in REQUERIDOS_PRODUCTO if campo not in datos]
+        if faltantes:
+            resultado.error(linea, f"faltan campos: {', '.join(faltantes)}")
+            continue
+        if "id" in datos:
+            if datos["id"] in ids_nuevos:
+                resultado.error(linea, f"id repetido en el archivo: {datos['id']}")
+                continue
+            ids_nuevos.add(datos["id"])
+        inserciones.append(datos)
+        lineas.append(linea)
+
+    try:
+        if inserciones:
+            await session.exec(insert(Producto), params=inserciones)
+        if actualizaciones:
+            await session.exec(update(Producto), params=actualizaciones)
+            await session.exec(
+                update(Producto)
+                .where(Producto.id.in_([d["id"] for d in actualizaciones]))
+                .values(version=Producto.version + 1)
+            )
+        await session.commit()
+    except (IntegrityError, DataError) as error:
+        # Los lotes anteriores ya quedaron guardados: se reporta este y se sigue.
+        # Las categorias creadas en este lote tambien se deshicieron
+        await session.rollback()
+        categorias.clear()
+        resultado.lote_fallido(lineas, error)
+        return
+    resultado.insertados += len(inserciones)
+    resultado.actualizados += len(actualizaciones)
+    etiquetas = [f"producto:{d['id']}" for d in actualizaciones]
+    if any("id_categoria" in d for d in actualizaciones):
+        # Cambios de categoria: ver update_producto
+        etiquetas.append("variantes")
+    cache_catalogo.invalidar(*etiquetas)
+
+@router.post("/productos/import")
+async def importar_productos(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Alta o actualizacion masiva de productos desde un archivo CSV o NDJSON.
+
+    Un producto se actualiza si coincide su `id` o, sin id, su `nombre`. La
+    categoria se indica con `id_categoria` o por nombre en `categoria` (se
+    crea si no existe).
+    """
+    formato = formato_archivo(archivo, formato)
+    resultado = ResultadoImportacion()
+    categorias: dict[str, int] = {}
+    try:
+        async for lote in lotes_del_archivo(archivo, formato):
+            await _importar_lote_productos(session, lote, categorias, resultado)
+    finally:
+        indice_productos.invalidar()
+    return resultado.resumen()
+
+@router.get("/productos/export")
+async def exportar_productos(formato: str = "csv"):
+    if formato not in TIPOS_MIME:
+        raise HTTPException(status_code=400, detail="Formato no soportado, use csv o ndjson")
+    consulta = (
+        select(Producto.id, Producto.nombre, Producto.descripcion, Producto.id_categoria, Categoria.nombre)
+        .outerjoin(Categoria)
+        .order_by(Producto.id)
+        .execution_options(yield_per=TAMANO_LOTE)
+    )
+
+    async def particiones():
+        # Sesion propia: la del Depends se cierra antes de terminar el streaming
+        async with AsyncSession(get_async_engine_lectura()) as session:
+            resultado = await session.stream(consulta)
+            async for particion in resultado.partitions():
+                yield particion
+
+    return StreamingResponse(
+        exportar_filas(particiones(), COLUMNAS_EXPORT_PRODUCTO, formato),
+        media_type=TIPOS_MIME[formato],
+        headers={"Content-Disposition": f'attachment; filename="productos.{formato}"'},
+    )
+
+@router.get("/productos/search", response_model=list[ProductoRead])
+async def buscar_productos(
+    q: str = Query(..., min_length=1),
+    limite: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Busqueda por nombre, descripcion y categoria ordenada por relevancia.
+
+    Usa el indice de texto completo (FULLTEXT en MySQL, FTS5 en SQLite).
+    """
+    if not palabras(q):
+        return []
+    consulta = select(Producto).options(*opciones_carga(Producto, ProductoRead))
+    consulta = filtro_busqueda(consulta, session.bind.dialect.name, q).limit(limite)
+    return (await session.exec(consulta)).all()
+
+@router.get("/productos/autocomplete")
+async def autocompletar_productos(
+    prefix: str = Query(..., min_length=1),
+    limite: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Sugerencias por prefijo de cualquier palabra del nombre, desde memoria"""
+    while (sugerencias := indice_productos.buscar(prefix, limite)) is None:
+        version = indice_productos.version
+        filas = (await session.exec(select(Producto.id, Producto.nombre))).all()
+        indice_productos.cargar(filas, version)
+    return sugerencias
+
 @router.get("/productos/{producto_id}")
-def get_producto(producto_id: int, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
+async def get_producto(producto_id: int, response: Response, session: AsyncSession = Depends(get_async_session)):
+    clave = ("producto", producto_id)
+    datos = cache_catalogo.obtener(clave)
+    if datos is not FALTA:
+        poner_etag(response, datos["version"])
+        return datos
+
+    version = cache_catalogo.version
+    producto = await session.get(Producto, producto_id)
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return producto
+    datos = producto.model_dump()
+    cache_catalogo.guardar(clave, datos, {f"producto:{producto_id}"}, version)
+    poner_etag(response, datos["version"])
+    return datos
 
 @router.put("/productos/{producto_id}")
-def update_producto(producto_id: int, producto: Producto, session: Session = Depends(get_session)):
-    existing_producto = session.get(Producto, producto_id)
-    if not existing_producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-
-    producto_data = producto.dict(exclude_unset=True)
-    for key, value in producto_data.items():
-        setattr(existing_producto, key, value)
-
-    session.commit()
-    session.refresh(existing_producto)
+async def update_producto(
+    producto_id: int,
+    producto: Producto,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    producto_data = sin_no_editables(producto.dict(exclude_unset=True))
+    nueva_version = await actualizar_con_version(
+        session, Producto, producto_id, producto_data, version_de_if_match(if_match), "Producto no encontrado",
+    )
+    await session.commit()
+    # Al cambiar de categoria el producto entra en listados por id_categoria
+    # que no estaban etiquetados con el
+    if "id_categoria" in producto_data:
+        cache_catalogo.invalidar(f"producto:{producto_id}", "variantes")
+    else:
+        cache_catalogo.invalidar(f"producto:{producto_id}")
+    existing_producto = await session.get(Producto, producto_id, populate_existing=True)
+    indice_productos.guardar(existing_producto.id, existing_producto.nombre)
+    poner_etag(response, nueva_version)
     return existing_producto
 
 @router.delete("/productos/{producto_id}")
-def delete_producto(producto_id: int, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
+async def delete_producto(producto_id: int, session: AsyncSession = Depends(get_async_session)):
+    producto = await session.get(Producto, producto_id)
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
-    session.delete(producto)
-    session.commit()
+    await session.delete(producto)
+    await session.commit()
+    cache_catalogo.invalidar(f"producto:{producto_id}")
+    indice_productos.quitar(producto_id)
     return {"message": "Producto eliminado correctamente"}
\ No newline at end of file
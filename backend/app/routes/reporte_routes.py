@@ -0,0 +1,118 @@
+import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from pydantic_core import to_json
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_session
+from app.models.categoria import Categoria
+from app.models.producto import Producto
+from app.models.resumen_venta import ResumenCompraDiaria, ResumenVentaDiaria
+from app.models.variante import Variante
+from app.utils.reposicion import calcular_reposicion
+from app.utils.respuestas import respuesta_json
+from app.utils.resumenes import reconstruir_resumenes
+
+router = APIRouter(
+    prefix="/reportes",
+    tags=["reportes"]
+)
+
+Nivel = Literal["variante", "producto", "categoria"]
+
+# Columnas (id, nombre) por las que se agrupa cada nivel
+AGRUPACION = {
+    "variante": (ResumenVentaDiaria.id_variante, Producto.nombre),
+    "producto": (Producto.id, Producto.nombre),
+    "categoria": (Categoria.id, Categoria.nombre),
+}
+
+def _en_rango(consulta, columna, desde: Optional[datetime.date], hasta: Optional[datetime.date]):
+    if desde is not None:
+        consulta = consulta.where(columna >= desde)
+    if hasta is not None:
+        consulta = consulta.where(columna <= hasta)
+    return consulta
+
+def _ventas_por(nivel: str, desde: Optional[datetime.date], hasta: Optional[datetime.date]):
+    id_grupo, nombre = AGRUPACION[nivel]
+    unidades = func.sum(ResumenVentaDiaria.unidades).label("unidades")
+    ingresos = func.sum(ResumenVentaDiaria.ingresos).label("ingresos")
+    consulta = (
+        select(id_grupo.label("id"), nombre.label("nombre"), unidades, ingresos)
+        .select_from(ResumenVentaDiaria)
+        .outerjoin(Variante, Variante.id == ResumenVentaDiaria.id_variante)
+        .outerjoin(Producto, Producto.id == Variante.id_producto)
+        .outerjoin(Categoria, Categoria.id == Producto.id_categoria)
+        .group_by(id_grupo, nombre)
+        # Filas que quedaron a cero tras anular compras
+        .having(unidades != 0)
+    )
+    return _en_rango(consulta, ResumenVentaDiaria.fecha, desde, hasta), unidades, ingresos
+
+@router.get("/ventas-diarias")
+async def get_ventas_diarias(
+    desde: Optional[datetime.date] = None,
+    hasta: Optional[datetime.date] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Numero de compras e ingresos por dia"""
+    consulta = _en_rango(
+        select(ResumenCompraDiaria).order_by(ResumenCompraDiaria.fecha),
+        ResumenCompraDiaria.fecha, desde, hasta,
+    )
+    return (await session.exec(consulta)).all()
+
+@router.get("/ventas")
+async def get_ventas(
+    nivel: Nivel = "producto",
+    desde: Optional[datetime.date] = None,
+    hasta: Optional[datetime.date] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Unidades vendidas e ingresos por variante, producto o categoria"""
+    consulta, _, _ = _ventas_por(nivel, desde, hasta)
+    filas = await session.exec(consulta.order_by("id"))
+    return [fila._asdict() for fila in filas.all()]
+
+@router.get("/top")
+async def get_mas_vendidos(
+    nivel: Nivel = "producto",
+    orden: Literal["unidades", "ingresos"] = "unidades",
+    limite: int = Query(10, ge=1, le=100),
+    desde: Optional[datetime.date] = None,
+    hasta: Optional[datetime.date] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Los mas vendidos del periodo por unidades o por ingresos"""
+    consulta, unidades, ingresos = _ventas_por(nivel, desde, hasta)
+    criterio = unidades if orden == "unidades" else ingresos
+    filas = await session.exec(consulta.order_by(criterio.desc()).limit(limite))
+    return [fila._asdict() for fila in filas.all()]
+
+@router.get("/reposicion")
+async def get_reposicion(
+    dias: int = Query(365, ge=7, le=3650),
+    plazo: int = Query(7, ge=0, le=365),
+    revision: int = Query(7, ge=0, le=365),
+    nivel_servicio: float = Query(0.95, gt=0.5, lt=1),
+    solo_reponer: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Demanda diaria, dias de cobertura, punto de reorden y cantidad sugerida por variante activa.
+
+    `dias` es la ventana de historia, `plazo` los dias que tarda en llegar un
+    pedido y `revision` cada cuantos dias se vuelve a pedir.
+    """
+    filas = await calcular_reposicion(session, dias, plazo, revision, nivel_servicio, solo_reponer)
+    return respuesta_json(to_json(filas))
+
+@router.post("/reconstruir")
+async def reconstruir(session: AsyncSession = Depends(get_async_session)):
+    """Recalcula los resumenes desde compras y detalles (carga inicial o reparacion)"""
+    await reconstruir_resumenes(session)
+    await session.commit()
+    return {"message": "Resúmenes reconstruidos correctamente"}
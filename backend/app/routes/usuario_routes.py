@@ -1,25 +1,27 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.usuario import Usuario
-from app.database import get_session
+from app.auth.jwt_handler import cache_usuarios
+from app.database import get_async_session
+from app.utils.paginacion import Pagina
 
 router = APIRouter()
 
 @router.get("/usuarios")
-def get_usuario(session: Session = Depends(get_session)):
-    usuario = session.query(Usuario).all()
-    return usuario
+async def get_usuario(pagina: Pagina = Depends(), session: AsyncSession = Depends(get_async_session)):
+    return await pagina.aplicar(session, select(Usuario), Usuario.id)
 
 @router.post("/usuarios")
-def add_usuario(usuario: Usuario, session: Session = Depends(get_session)):
+async def add_usuario(usuario: Usuario, session: AsyncSession = Depends(get_async_session)):
     session.add(usuario)
-    session.commit()
-    session.refresh(usuario)
+    await session.commit()
+    await session.refresh(usuario)
     return usuario
 
 @router.put("/usuarios/{usuario_id}")
-def update_usuario(usuario_id: int, usuario: Usuario, session: Session = Depends(get_session)):
-    existing_usuario = session.get(Usuario, usuario_id)
+async def update_usuario(usuario_id: int, usuario: Usuario, session: AsyncSession = Depends(get_async_session)):
+    existing_usuario = await session.get(Usuario, usuario_id)
     if not existing_usuario:
         return {"error": "Usuario no encontrado"}
     existing_usuario.nombres = usuario.nombres
@@ -27,7 +29,8 @@ def update_usuario(usuario_id: int, usuario: Usuario, session: Session = Depends
     existing_usuario.correo = usuario.correo
     existing_usuario.contrasena = usuario.contrasena
     existing_usuario.dni = usuario.dni
-    session.commit()
-    session.refresh(existing_usuario)
+    await session.commit()
+    cache_usuarios.invalidar(f"usuario:{usuario_id}")
+    await session.refresh(existing_usuario)
     return existing_usuario
 
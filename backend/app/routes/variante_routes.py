@@ -1,93 +1,478 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, insert, not_, tuple_, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.producto import Producto
 from app.models.variante import Variante
-from app.schemas.negocio_schema import VarianteRead
-from app.database import get_session
+from app.schemas.negocio_schema import VarianteRead, VariantesBulk
+from app.database import get_async_engine_lectura, get_async_session
+from app.utils.cache import FALTA, cache_catalogo, etiquetas_variante
+from app.utils.carga import opciones_carga
+from app.utils.concurrencia import (
+    actualizar_con_version, conflicto, poner_etag, sin_no_editables, version_de_if_match,
+)
+from app.utils.eventos import encolar_revision_stock, publicar_variantes
+from app.utils.imagenes import guardar_imagen, url_imagen
+from app.utils.importacion import (
+    TAMANO_LOTE, TIPOS_MIME, ResultadoImportacion, convertir, exportar_filas, formato_archivo,
+    lotes_del_archivo,
+)
+from app.utils.paginacion import CABECERA_CURSOR, Pagina
+from app.utils.respuestas import respuesta_json, serializar
 
 router = APIRouter()
 
+def _filtrar_variantes(
+    consulta,
+    id_producto: Optional[int],
+    id_categoria: Optional[int],
+    precio_min: Optional[float],
+    precio_max: Optional[float],
+):
+    if id_producto is not None:
+        consulta = consulta.where(Variante.id_producto == id_producto)
+    if id_categoria is not None:
+        consulta = consulta.join(Producto).where(Producto.id_categoria == id_categoria)
+    if precio_min is not None:
+        consulta = consulta.where(Variante.precio >= precio_min)
+    if precio_max is not None:
+        consulta = consulta.where(Variante.precio <= precio_max)
+    return consulta
+
+async def _leer_variante(session: AsyncSession, variante_id: int):
+    # Recarga la variante con producto y categoria ya cargados: en async no
+    # hay carga perezosa al serializar VarianteRead
+    return await session.get(
+        Variante, variante_id,
+        options=opciones_carga(Variante, VarianteRead),
+        populate_existing=True,
+    )
+
 # --- GET todas las variantes---
 @router.get("/variantes/all", response_model=list[VarianteRead])
-def get_todas_variantes(session: Session = Depends(get_session)):
-    variantes = session.exec(select(Variante)).all()
-    return variantes
+async def get_todas_variantes(
+    pagina: Pagina = Depends(),
+    id_producto: Optional[int] = None,
+    id_categoria: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    activo: Optional[bool] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Variantes activas e inactivas, paginadas como los demas listados.
+
+    La pagina siguiente se pide con el cursor de la cabecera X-Next-Cursor;
+    el volcado completo esta en /variantes/export.
+    """
+    consulta = _filtrar_variantes(
+        select(Variante).options(*opciones_carga(Variante, VarianteRead)),
+        id_producto, id_categoria, precio_min, precio_max,
+    )
+    if activo is not None:
+        consulta = consulta.where(Variante.activo == activo)
+    variantes = await pagina.aplicar(session, consulta, Variante.id)
+    return respuesta_json(serializar(VarianteRead, variantes), pagina.response)
 
 # --- GET todas las variantes activas---
 @router.get("/variantes", response_model=list[VarianteRead])
-def get_variantes_activas(session: Session = Depends(get_session)):
-    variantes = session.exec(
-        select(Variante).where(Variante.activo == True)
-        ).all()
-    return variantes
+async def get_variantes_activas(
+    pagina: Pagina = Depends(),
+    id_producto: Optional[int] = None,
+    id_categoria: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    clave = ("variantes_activas", pagina.limit, pagina.cursor, id_producto, id_categoria, precio_min, precio_max)
+    cacheado = cache_catalogo.obtener(clave)
+    if cacheado is not FALTA:
+        # Se guarda el JSON ya serializado: un hit no vuelve a serializar
+        cuerpo, siguiente = cacheado
+        pagina.response.headers[CABECERA_CURSOR] = siguiente
+        return respuesta_json(cuerpo, pagina.response)
+
+    version = cache_catalogo.version
+    consulta = _filtrar_variantes(
+        select(Variante)
+        .options(*opciones_carga(Variante, VarianteRead))
+        .where(Variante.activo == True),
+        id_producto, id_categoria, precio_min, precio_max,
+    )
+    variantes = await pagina.aplicar(session, consulta, Variante.id)
+    cuerpo = serializar(VarianteRead, variantes)
+    # Cualquier alta o cambio de variante puede alterar el listado ("variantes");
+    # los cambios de producto o categoria solo si aparecen en el
+    etiquetas = {"variantes"}
+    for v in variantes:
+        etiquetas |= etiquetas_variante(v)
+    etiquetas = {e for e in etiquetas if not e.startswith("variante:")}
+    cache_catalogo.guardar(
+        clave, (cuerpo, pagina.response.headers.get(CABECERA_CURSOR)), etiquetas, version, peso=len(variantes),
+    )
+    return respuesta_json(cuerpo, pagina.response)
 
 # --- GET todas las variantes inactivas---
 @router.get("/variantes/inactivas", response_model=list[VarianteRead])
-def get_variantes_inactivas(session: Session = Depends(get_session)):
-    variantes = session.exec(
-        select(Variante).where(Variante.activo == False)
-        ).all()
-    return variantes
+async def get_variantes_inactivas(
+    pagina: Pagina = Depends(),
+    id_producto: Optional[int] = None,
+    id_categoria: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    consulta = _filtrar_variantes(
+        select(Variante)
+        .options(*opciones_carga(Variante, VarianteRead))
+        .where(Variante.activo == False),
+        id_producto, id_categoria, precio_min, precio_max,
+    )
+    variantes = await pagina.aplicar(session, consulta, Variante.id)
+    return respuesta_json(serializar(VarianteRead, variantes), pagina.response)
+
+
+TIPOS_VARIANTE = {
+    "id": int, "precio": float, "imagen": str, "stock": int, "cantidad": int,
+    "activo": bool, "id_producto": int, "producto": str,
+}
+REQUERIDOS_VARIANTE = ("precio", "imagen", "stock", "cantidad", "id_producto")
+COLUMNAS_EXPORT_VARIANTE = ["id", "id_producto", "producto", "precio", "imagen", "stock", "cantidad", "activo"]
+
+async def _importar_lote_variantes(
+    session: AsyncSession,
+    lote: list,
+    productos: dict[str, int],
+    resultado: ResultadoImportacion,
+):
+    filas = []
+    for linea, fila in lote:
+        try:
+            if not isinstance(fila, dict):
+                raise ValueError(f"linea no valida: {fila}")
+            datos = convertir(fila, TIPOS_VARIANTE)
+            if datos.get("stock", 0) < 0:
+                raise ValueError("el stock no puede ser negativo")
+            filas.append((linea, datos))
+        except ValueError as error:
+            resultado.error(linea, str(error))
+
+    # Productos por nombre: una sola consulta por lote para los no vistos aun
+    nombres = {d["producto"] for _, d in filas if "producto" in d and "id_producto" not in d}
+    nuevos = nombres - productos.keys()
+    if nuevos:
+        encontrados = await session.exec(select(Producto.nombre, Producto.id).where(Producto.nombre.in_(nuevos)))
+        productos.update(encontrados.all())
+
+    ids = {d["id"] for _, d in filas if "id" in d}
+    existentes = set()
+    if ids:
+        existentes = set((await session.exec(select(Variante.id).where(Variante.id.in_(ids)))).all())
 
+    inserciones, actualizaciones, lineas = [], [], []
+    ids_nuevos = set()
+    for linea, datos in filas:
+        nombre = datos.pop("producto", None)
+        if nombre is not None and "id_producto" not in datos:
+            if nombre not in productos:
+                resultado.error(linea, f"producto desconocido: {nombre!r}")
+                continue
+            datos["id_producto"] = productos[nombre]
+        if datos.get("id") in existentes:
+            actualizaciones.append(datos)
+            lineas.append(linea)
+            continue
+        faltantes = [campo for campo in REQUERIDOS_VARIANTE if campo not in datos]
+        if faltantes:
+            resultado.error(linea, f"faltan campos: {', '.join(faltantes)}")
+            continue
+        if "id" in datos:
+            if datos["id"] in ids_nuevos:
+                resultado.error(linea, f"id repetido en el archivo: {datos['id']}")
+                continue
+            ids_nuevos.add(datos["id"])
+        inserciones.append(datos)
+        lineas.append(linea)
+
+    try:
+        if inserciones:
+            await session.exec(insert(Variante), params=inserciones)
+        if actualizaciones:
+            # UPDATE por clave primaria en modo executemany
+            await session.exec(update(Variante), params=actualizaciones)
+            await session.exec(
+                update(Variante)
+                .where(Variante.id.in_([d["id"] for d in actualizaciones]))
+                .values(version=Variante.version + 1)
+            )
+        await session.commit()
+    except (IntegrityError, DataError) as error:
+        # Los lotes anteriores ya quedaron guardados: se reporta este y se sigue
+        await session.rollback()
+        resultado.lote_fallido(lineas, error)
+        return
+    resultado.insertados += len(inserciones)
+    resultado.actualizados += len(actualizaciones)
+    cache_catalogo.invalidar("variantes", *(f"variante:{d['id']}" for d in actualizaciones))
+    await publicar_variantes(session, [d["id"] for d in actualizaciones])
+
+# --- POST importar variantes (CSV / NDJSON) ---
+@router.post("/variantes/import")
+async def importar_variantes(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Alta o actualizacion masiva de variantes desde un archivo.
+
+    Las filas con `id` existente se actualizan y el resto se insertan. El
+    producto se indica con `id_producto` o por su nombre en `producto`.
+    """
+    formato = formato_archivo(archivo, formato)
+    resultado = ResultadoImportacion()
+    productos: dict[str, int] = {}
+    async for lote in lotes_del_archivo(archivo, formato):
+        await _importar_lote_variantes(session, lote, productos, resultado)
+    return resultado.resumen()
+
+# --- GET exportar variantes (CSV / NDJSON) ---
+@router.get("/variantes/export")
+async def exportar_variantes(formato: str = "csv"):
+    if formato not in TIPOS_MIME:
+        raise HTTPException(status_code=400, detail="Formato no soportado, use csv o ndjson")
+    consulta = (
+        select(
+            Variante.id, Variante.id_producto, Producto.nombre, Variante.precio,
+            Variante.imagen, Variante.stock, Variante.cantidad, Variante.activo,
+        )
+        .outerjoin(Producto)
+        .order_by(Variante.id)
+        .execution_options(yield_per=TAMANO_LOTE)
+    )
+
+    async def particiones():
+        # Sesion propia: la del Depends se cierra antes de terminar el streaming
+        async with AsyncSession(get_async_engine_lectura()) as session:
+            resultado = await session.stream(consulta)
+            async for particion in resultado.partitions():
+                yield particion
+
+    return StreamingResponse(
+        exportar_filas(particiones(), COLUMNAS_EXPORT_VARIANTE, formato),
+        media_type=TIPOS_MIME[formato],
+        headers={"Content-Disposition": f'attachment; filename="variantes.{formato}"'},
+    )
 
 # --- GET una variante por su ID ---
 @router.get("/variantes/{variante_id}", response_model=VarianteRead)
-def get_variante_id(variante_id: int, session: Session = Depends(get_session)):
-    variante = session.get(Variante, variante_id)
+async def get_variante_id(variante_id: int, response: Response, session: AsyncSession = Depends(get_async_session)):
+    clave = ("variante", variante_id)
+    datos = cache_catalogo.obtener(clave)
+    if datos is not FALTA:
+        poner_etag(response, datos["version"])
+        return datos
+
+    version = cache_catalogo.version
+    variante = await _leer_variante(session, variante_id)
     if not variante:
         raise HTTPException(status_code=404, detail="Variante no encontrada")
-    return variante
+    datos = VarianteRead.model_validate(variante).model_dump()
+    cache_catalogo.guardar(clave, datos, etiquetas_variante(variante), version)
+    poner_etag(response, datos["version"])
+    return datos
 
 # --- POST crear variante ---
 @router.post("/variantes", response_model=VarianteRead)
-def add_variante(variante: Variante, session: Session = Depends(get_session)):
+async def add_variante(variante: Variante, session: AsyncSession = Depends(get_async_session)):
     session.add(variante)
-    session.commit()
-    session.refresh(variante)
-    return variante
+    await session.commit()
+    cache_catalogo.invalidar("variantes")
+    await publicar_variantes(session, [variante.id])
+    return await _leer_variante(session, variante.id)
 
 # --- PUT actualizar variante (incluye nombre, producto y categoría) ---
 @router.put("/variantes/{variante_id}", response_model=VarianteRead)
-def update_variante(variante_id: int, variante_in: Variante, session: Session = Depends(get_session)):
-    existing = session.get(Variante, variante_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Variante no encontrada")
-
-    # Actualizamos solo los campos que vienen
-    variante_data = variante_in.dict(exclude_unset=True)
-    for key, val in variante_data.items():
-        setattr(existing, key, val)
-    session.commit()
-    session.refresh(existing)
-    return existing
+async def update_variante(
+    variante_id: int,
+    variante_in: Variante,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    # Actualizamos solo los campos que vienen, si la version sigue siendo la de If-Match
+    variante_data = sin_no_editables(variante_in.dict(exclude_unset=True))
+    nueva_version = await actualizar_con_version(
+        session, Variante, variante_id, variante_data, version_de_if_match(if_match), "Variante no encontrada",
+    )
+    await session.commit()
+    cache_catalogo.invalidar(f"variante:{variante_id}", "variantes")
+    await publicar_variantes(session, [variante_id])
+    poner_etag(response, nueva_version)
+    return await _leer_variante(session, variante_id)
 
 # --- Update estado activo de variante ---
 @router.put("/variantes/estado/{variante_id}")
-def cambiar_estado_variante(variante_id: int, session: Session = Depends(get_session)):
-    variante = session.get(Variante, variante_id)
-    if not variante:
-        raise HTTPException(status_code=404, detail="Variante no encontrada")
-    
-    if variante.activo:
-        variante.activo = False
-    else:
-        variante.activo = True
-        
-    session.add(variante)
-    session.commit()
+async def cambiar_estado_variante(
+    variante_id: int,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    # El cambio se hace en la misma sentencia (activo = NOT activo): dos
+    # peticiones simultaneas no pueden leer el mismo valor y dejarlo igual
+    nueva_version = await actualizar_con_version(
+        session, Variante, variante_id, {"activo": not_(Variante.activo)},
+        version_de_if_match(if_match), "Variante no encontrada",
+    )
+    await session.commit()
+    cache_catalogo.invalidar(f"variante:{variante_id}", "variantes")
+    await publicar_variantes(session, [variante_id])
+    poner_etag(response, nueva_version)
     return {"message": "Variante cambiada correctamente"}
 
+# --- Subir imagen de variante ---
+@router.post("/variantes/{variante_id}/imagen", response_model=VarianteRead)
+async def subir_imagen_variante(
+    variante_id: int,
+    response: Response,
+    archivo: UploadFile = File(...),
+    if_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    # Antes de guardar el archivo: una variante inexistente (404) o un
+    # If-Match desactualizado (412) no deben dejar imagenes huerfanas
+    version = version_de_if_match(if_match)
+    actual = (await session.exec(select(Variante.version).where(Variante.id == variante_id))).first()
+    if actual is None:
+        raise HTTPException(status_code=404, detail="Variante no encontrada")
+    if version is not None and version != actual:
+        raise conflicto(actual)
+    # La conexion vuelve al pool mientras el archivo se guarda (en un hilo).
+    # Si la imagen ya existia no se duplica.
+    await session.rollback()
+    clave = await asyncio.to_thread(guardar_imagen, archivo.file)
+    nueva_version = await actualizar_con_version(
+        session, Variante, variante_id, {"imagen": url_imagen(clave)},
+        version, "Variante no encontrada",
+    )
+    await session.commit()
+    cache_catalogo.invalidar(f"variante:{variante_id}", "variantes")
+    poner_etag(response, nueva_version)
+    return await _leer_variante(session, variante_id)
+
 # -- Actualizar stock de variante ---
 @router.patch("/variantes/stock/{variante_id}")
-def update_stock_variante(variante_id: int, stock: int, session: Session = Depends(get_session)):
-    variante = session.get(Variante, variante_id)
-    if not variante:
-        raise HTTPException(status_code=404, detail="Variante no encontrada")
-    
+async def update_stock_variante(
+    variante_id: int,
+    stock: int,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+):
     if stock < 0:
         raise HTTPException(status_code=400, detail="El stock no puede ser negativo")
-    
-    variante.stock = stock
-    session.add(variante)
-    session.commit()
-    session.refresh(variante)
-    return variante
\ No newline at end of file
+
+    nueva_version = await actualizar_con_version(
+        session, Variante, variante_id, {"stock": stock}, version_de_if_match(if_match), "Variante no encontrada",
+    )
+    encolar_revision_stock(session, [variante_id])
+    await session.commit()
+    cache_catalogo.invalidar(f"variante:{variante_id}", "variantes")
+    await publicar_variantes(session, [variante_id])
+    poner_etag(response, nueva_version)
+    return await session.get(Variante, variante_id, populate_existing=True)
+
+# --- PATCH masivo de stock, precio y estado ---
+CAMPOS_BULK = ("stock", "precio", "activo")
+LOTE_BULK = 500
+
+async def _aplicar_lote_bulk(session: AsyncSession, lote: list, resultados: dict) -> list[int]:
+    """Aplica un lote con un solo UPDATE ... CASE; devuelve los ids actualizados"""
+    ids = [item.id for item in lote]
+    # FOR UPDATE: en MySQL las filas del lote quedan bloqueadas hasta el commit
+    actuales = dict((await session.exec(
+        select(Variante.id, Variante.version).where(Variante.id.in_(ids)).with_for_update()
+    )).all())
+
+    aplicables = []
+    for item in lote:
+        if item.id not in actuales:
+            resultados[item.id] = {"id": item.id, "estado": "no_encontrada"}
+        elif item.version is not None and item.version != actuales[item.id]:
+            resultados[item.id] = {"id": item.id, "estado": "conflicto", "version": actuales[item.id]}
+        else:
+            aplicables.append(item)
+    if not aplicables:
+        return []
+
+    valores = {}
+    for campo in CAMPOS_BULK:
+        por_id = {item.id: getattr(item, campo) for item in aplicables if getattr(item, campo) is not None}
+        if por_id:
+            columna = getattr(Variante, campo)
+            valores[campo] = case(por_id, value=Variante.id, else_=columna)
+    resultado = await session.exec(
+        update(Variante)
+        .where(tuple_(Variante.id, Variante.version).in_([(item.id, actuales[item.id]) for item in aplicables]))
+        .values(**valores, version=Variante.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != len(aplicables):
+        # Solo posible si otra escritura se colo entre la lectura y el UPDATE
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Variantes modificadas durante la actualizacion; reintente")
+
+    for item in aplicables:
+        resultados[item.id] = {"id": item.id, "estado": "actualizada", "version": actuales[item.id] + 1}
+    return [item.id for item in aplicables]
+
+@router.patch("/variantes/bulk")
+async def update_variantes_bulk(
+    cambios: VariantesBulk,
+    atomico: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Actualiza stock, precio y/o activo de muchas variantes en una transaccion.
+
+    Cada lote de LOTE_BULK items es un solo UPDATE con CASE por columna. Se
+    devuelve el estado de cada item (actualizada, no_encontrada, conflicto,
+    duplicada); con `atomico=true` cualquier fallo revierte todo con 409.
+    """
+    resultados: dict[int, dict] = {}
+    items, vistos = [], set()
+    for item in cambios.items:
+        if item.id in vistos:
+            continue
+        vistos.add(item.id)
+        if all(getattr(item, campo) is None for campo in CAMPOS_BULK):
+            resultados[item.id] = {"id": item.id, "estado": "sin_cambios"}
+        else:
+            items.append(item)
+
+    actualizadas = []
+    for inicio in range(0, len(items), LOTE_BULK):
+        actualizadas += await _aplicar_lote_bulk(session, items[inicio:inicio + LOTE_BULK], resultados)
+
+    # Resultado en el orden recibido; un id repetido solo se aplica la primera vez
+    salida, vistos = [], set()
+    for item in cambios.items:
+        salida.append({"id": item.id, "estado": "duplicada"} if item.id in vistos else resultados[item.id])
+        vistos.add(item.id)
+    fallidas = sum(r["estado"] not in ("actualizada", "sin_cambios") for r in salida)
+    if atomico and fallidas:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail={"actualizadas": 0, "fallidas": fallidas, "items": salida})
+
+    encolar_revision_stock(session, [
+        item.id for item in items
+        if item.stock is not None and resultados[item.id]["estado"] == "actualizada"
+    ])
+    await session.commit()
+    if actualizadas:
+        cache_catalogo.invalidar("variantes", *(f"variante:{i}" for i in actualizadas))
+        await publicar_variantes(session, actualizadas)
+    return {"actualizadas": len(actualizadas), "fallidas": fallidas, "items": salida}
@@ -1,5 +1,5 @@
 from typing import Optional
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, Field
 
 class CategoriaRead(SQLModel):
     id: int
@@ -9,6 +9,7 @@ class ProductoRead(SQLModel):
     id: int
     nombre: str
     descripcion: str
+    version: int = 1
     categoria: Optional[CategoriaRead] = None
     
 class VarianteRead(SQLModel):
@@ -17,4 +18,24 @@ class VarianteRead(SQLModel):
     precio: float
     stock: int
     cantidad: int
+    version: int = 1
     producto: Optional[ProductoRead] = None
+
+class ItemCarrito(SQLModel):
+    id_variante: int
+    cantidad: int = Field(gt=0)
+
+class CheckoutCreate(SQLModel):
+    id_usuario: Optional[int] = None
+    items: list[ItemCarrito] = Field(min_length=1)
+
+class VarianteCambio(SQLModel):
+    id: int
+    stock: Optional[int] = Field(default=None, ge=0)
+    precio: Optional[float] = Field(default=None, ge=0)
+    activo: Optional[bool] = None
+    # Version esperada (como If-Match); sin ella se aplica sobre la actual
+    version: Optional[int] = None
+
+class VariantesBulk(SQLModel):
+    items: list[VarianteCambio] = Field(min_length=1, max_length=50_000)
@@ -0,0 +1,142 @@
+import datetime
+import os
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.orm import aliased
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.archivo import CompraArchivada, DetalleCompraArchivado
+from app.models.compra import Compra
+from app.models.detalle_compra import DetalleCompra
+from app.models.tarea import Tarea
+from app.utils.tareas import encolar, tarea
+
+# Archivado de compras antiguas: las compras con fecha anterior al horizonte
+# pasan, con sus detalles, de compra/detalle_compra a compra_archivo/
+# detalle_compra_archivo. Asi las consultas del dia a dia (y sus indices)
+# solo recorren datos recientes; los listados leen el archivo solo si el
+# rango de fechas pedido llega hasta el o si se pide con incluir_archivo.
+#
+# Se mueve por lotes, cada uno en su propia transaccion y como una tarea de
+# la cola: si el proceso se corta, lo ya movido queda movido y el resto se
+# retoma desde la tarea pendiente. Los resumenes diarios no cambian.
+
+ARCHIVO_HORIZONTE_DIAS = int(os.getenv("ARCHIVO_HORIZONTE_DIAS", "365"))
+# Un horizonte chico (por error) sacaria de caliente casi todas las compras
+ARCHIVO_HORIZONTE_MIN_DIAS = int(os.getenv("ARCHIVO_HORIZONTE_MIN_DIAS", "90"))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", "1000"))
+# Token para pedir el archivado por POST /internal/archivo (cabecera
+# X-Archivo-Token); sin configurar, esa ruta no existe
+ARCHIVO_TOKEN = os.getenv("ARCHIVO_TOKEN", "")
+
+
+def _columnas(modelo) -> list[str]:
+    return [c.name for c in modelo.__table__.columns]
+
+
+def _mover(origen, destino, condicion):
+    """INSERT INTO destino SELECT ... FROM origen WHERE condicion"""
+    columnas = _columnas(destino)
+    return insert(destino).from_select(
+        columnas, select(*(origen.__table__.c[c] for c in columnas)).where(condicion),
+    )
+
+
+async def archivar_lote(session: AsyncSession, corte: datetime.date, lote: int) -> int:
+    """Mueve hasta `lote` compras anteriores a `corte`, con sus detalles, al archivo"""
+    # En SQLite el siguiente id es max(id)+1: la ultima compra y la compra de
+    # la ultima linea se quedan en caliente, asi un id nuevo nunca repite uno
+    # ya archivado
+    ultima_compra = select(func.max(Compra.id)).scalar_subquery()
+    compra_ultima_linea = (
+        select(DetalleCompra.id_compra)
+        .where(DetalleCompra.id == select(func.max(DetalleCompra.id)).scalar_subquery())
+        .scalar_subquery()
+    )
+    ids = (await session.exec(
+        select(Compra.id)
+        .where(
+            Compra.fecha < corte,
+            Compra.id < ultima_compra,
+            Compra.id != func.coalesce(compra_ultima_linea, 0),
+        )
+        .order_by(Compra.id)
+        .limit(lote)
+    )).scalars().all()
+    if not ids:
+        return 0
+
+    await session.exec(_mover(Compra, CompraArchivada, Compra.id.in_(ids)))
+    await session.exec(_mover(DetalleCompra, DetalleCompraArchivado, DetalleCompra.id_compra.in_(ids)))
+    await session.exec(delete(DetalleCompra).where(DetalleCompra.id_compra.in_(ids)))
+    await session.exec(delete(Compra).where(Compra.id.in_(ids)))
+    return len(ids)
+
+
+def encolar_archivado(session: AsyncSession, horizonte_dias: int = ARCHIVO_HORIZONTE_DIAS) -> datetime.date:
+    """Pide archivar las compras de mas de `horizonte_dias`; devuelve la fecha de corte"""
+    horizonte_dias = max(horizonte_dias, ARCHIVO_HORIZONTE_MIN_DIAS)
+    corte = datetime.date.today() - datetime.timedelta(days=horizonte_dias)
+    encolar(session, "archivar_compras", {"corte": corte.isoformat(), "lote": ARCHIVO_LOTE})
+    return corte
+
+
+@tarea("archivar_compras")
+async def _archivar_compras(session: AsyncSession, datos: dict):
+    movidas = await archivar_lote(session, datetime.date.fromisoformat(datos["corte"]), datos["lote"])
+    if movidas == datos["lote"]:
+        # Puede quedar mas: el siguiente lote es otra tarea, confirmada con este
+        encolar(session, "archivar_compras", datos)
+
+
+async def frontera_archivo(session: AsyncSession) -> Optional[datetime.date]:
+    """Fecha de la compra archivada mas reciente (None si el archivo esta vacio)"""
+    return (await session.exec(select(func.max(CompraArchivada.fecha)))).scalar()
+
+
+def necesita_archivo(frontera: Optional[datetime.date], desde: Optional[datetime.date]) -> bool:
+    """Si un rango que empieza en `desde` llega a las compras archivadas.
+
+    Sin `desde` se leen solo las tablas calientes: el archivo se pide con
+    una fecha anterior a la frontera o explicitamente (incluir_archivo).
+    """
+    return frontera is not None and desde is not None and desde <= frontera
+
+
+def con_archivo(
+    modelo,
+    archivado,
+    filtros: Optional[Callable[[type], list]] = None,
+    rama: Optional[Callable] = None,
+):
+    """`modelo` sobre su tabla UNION ALL la de archivo, con `filtros(tabla)` en cada rama.
+
+    Devuelve una entidad (aliased) que se consulta como el modelo y carga
+    objetos del modelo; los filtros van dentro de cada rama para que cada
+    tabla use sus propios indices. `rama(consulta, tabla)` puede acotar
+    ademas cada rama (cursor, orden y limite de la pagina, ver Pagina.acotar).
+    """
+    columnas = _columnas(modelo)
+    ramas = []
+    for m in (modelo, archivado):
+        consulta = select(*(m.__table__.c[c] for c in columnas)).where(*(filtros(m) if filtros else ()))
+        if rama is not None:
+            # Envuelta en un subselect: ORDER BY/LIMIT no van directo en una rama de UNION
+            subconsulta = rama(consulta, m).subquery()
+            consulta = select(*subconsulta.c)
+        ramas.append(consulta)
+    return aliased(modelo, union_all(*ramas).subquery(f"{modelo.__tablename__}_todas"), adapt_on_names=True)
+
+
+async def estado_archivo(session: AsyncSession) -> dict:
+    pendientes = (await session.exec(
+        select(func.count(Tarea.id)).where(Tarea.tipo == "archivar_compras", Tarea.estado != "fallida")
+    )).scalar()
+    return {
+        "horizonte_dias": ARCHIVO_HORIZONTE_DIAS,
+        "horizonte_min_dias": ARCHIVO_HORIZONTE_MIN_DIAS,
+        "lote": ARCHIVO_LOTE,
+        "frontera": await frontera_archivo(session),
+        "tareas_pendientes": pendientes,
+    }
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import AsyncExitStack
+
+import httpx
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger("app.arranque")
+
+# Rutas que se piden en proceso antes de aceptar trafico: llenan el cache de
+# catalogo y el indice de autocompletado con lo que la tienda pide primero
+RUTAS_CALENTAR = [
+    ruta for ruta in os.getenv(
+        "ARRANQUE_RUTAS", "/categorias,/variantes,/productos/autocomplete?prefix=a"
+    ).split(",") if ruta
+]
+ARRANQUE_CALENTAR = os.getenv("ARRANQUE_CALENTAR", "1").lower() in ("1", "true", "yes")
+
+# Fases del ultimo arranque en ms (expuesto en /internal/arranque)
+tiempos_arranque: dict = {}
+
+
+def conexiones_a_calentar(engine) -> int:
+    """DB_POOL_CALENTAR o, por defecto, el tamaño fijo del pool"""
+    if "DB_POOL_CALENTAR" in os.environ:
+        return int(os.environ["DB_POOL_CALENTAR"])
+    return engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+
+
+async def calentar_pool(engine) -> int:
+    """Abre a la vez las conexiones del pool para que la primera peticion no pague el connect"""
+    n = conexiones_a_calentar(engine)
+    async with AsyncExitStack() as pila:
+        conexiones = await asyncio.gather(*(pila.enter_async_context(engine.connect()) for _ in range(n)))
+        await asyncio.gather(*(conn.exec_driver_sql("SELECT 1") for conn in conexiones))
+    return n
+
+
+async def calentar_rutas(app, rutas: list[str]) -> dict:
+    """Pide las rutas calientes a la propia app; un fallo no impide arrancar"""
+    estados = {}
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://arranque") as cliente:
+        for ruta in rutas:
+            try:
+                estados[ruta] = (await cliente.get(ruta)).status_code
+            except Exception as error:
+                estados[ruta] = type(error).__name__
+    return estados
+
+
+class Cronometro:
+    """Mide fases sucesivas del arranque"""
+
+    def __init__(self, inicio: float):
+        self.inicio = inicio
+        self.ultimo = inicio
+
+    def fase(self, nombre: str):
+        ahora = time.perf_counter()
+        tiempos_arranque[f"{nombre}_ms"] = round(1000 * (ahora - self.ultimo), 2)
+        self.ultimo = ahora
+
+    def terminar(self, **datos):
+        tiempos_arranque["total_ms"] = round(1000 * (time.perf_counter() - self.inicio), 2)
+        tiempos_arranque.update(datos)
+        logger.info(json.dumps({"evento": "arranque", "pid": os.getpid(), **tiempos_arranque}))
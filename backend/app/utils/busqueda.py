@@ -0,0 +1,198 @@
+import bisect
+import re
+import threading
+import unicodedata
+from typing import Iterable, Optional
+
+from sqlalchemy import column, func, inspect, literal_column, select, table, text, union
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import aliased
+
+from app.models.categoria import Categoria
+from app.models.producto import Producto
+
+_PALABRAS = re.compile(r"\w+")
+
+def normalizar(texto: str) -> str:
+    """Minusculas y sin tildes: "Pisco Quebranta" y "pisco quebrantá" coinciden"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def palabras(texto: str) -> list[str]:
+    return _PALABRAS.findall(normalizar(texto))
+
+
+# --- Indice de texto completo en la base de datos ---
+# MySQL: indices FULLTEXT sobre producto(nombre, descripcion) y categoria(nombre)
+# SQLite: tabla virtual FTS5 mantenida por triggers
+
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS producto_fts USING fts5(
+        nombre, descripcion, categoria, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS producto_fts_ai AFTER INSERT ON producto BEGIN
+        INSERT INTO producto_fts(rowid, nombre, descripcion, categoria)
+        VALUES (new.id, new.nombre, new.descripcion,
+                (SELECT nombre FROM categoria WHERE id = new.id_categoria));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS producto_fts_au AFTER UPDATE ON producto BEGIN
+        DELETE FROM producto_fts WHERE rowid = old.id;
+        INSERT INTO producto_fts(rowid, nombre, descripcion, categoria)
+        VALUES (new.id, new.nombre, new.descripcion,
+                (SELECT nombre FROM categoria WHERE id = new.id_categoria));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS producto_fts_ad AFTER DELETE ON producto BEGIN
+        DELETE FROM producto_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS categoria_fts_au AFTER UPDATE OF nombre ON categoria BEGIN
+        UPDATE producto_fts SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM producto WHERE id_categoria = new.id);
+    END""",
+]
+
+SQLITE_FTS_LLENAR = """
+    INSERT INTO producto_fts(rowid, nombre, descripcion, categoria)
+    SELECT producto.id, producto.nombre, producto.descripcion, categoria.nombre
+    FROM producto LEFT JOIN categoria ON categoria.id = producto.id_categoria
+"""
+
+MYSQL_FULLTEXT = {
+    ("producto", "ft_producto"): "CREATE FULLTEXT INDEX ft_producto ON producto (nombre, descripcion)",
+    ("categoria", "ft_categoria"): "CREATE FULLTEXT INDEX ft_categoria ON categoria (nombre)",
+}
+
+def crear_indice_busqueda(conn):
+    """Crea el indice de texto completo si falta (idempotente, tambien en BDs existentes)"""
+    dialecto = conn.dialect.name
+    if dialecto == "sqlite":
+        existia = inspect(conn).has_table("producto_fts")
+        for sentencia in SQLITE_FTS:
+            conn.execute(text(sentencia))
+        if not existia:
+            conn.execute(text(SQLITE_FTS_LLENAR))
+    elif dialecto == "mysql":
+        inspector = inspect(conn)
+        for (tabla, nombre), sentencia in MYSQL_FULLTEXT.items():
+            if nombre not in {i["name"] for i in inspector.get_indexes(tabla)}:
+                conn.execute(text(sentencia))
+
+def filtro_busqueda(consulta, dialecto: str, q: str):
+    """Añade a un select(Producto) la coincidencia con `q` ordenada por relevancia.
+
+    Cada palabra se busca como prefijo y basta con que coincida una; pesan
+    mas las coincidencias en el nombre que en la categoria o la descripcion.
+    """
+    terminos = palabras(q)
+    if dialecto == "mysql":
+        expresion = " ".join(f"{t}*" for t in terminos)
+        en_producto = match(Producto.nombre, Producto.descripcion, against=expresion).in_boolean_mode()
+        en_categoria = match(Categoria.nombre, against=expresion).in_boolean_mode()
+        # Los candidatos salen de un UNION con una rama por indice FULLTEXT:
+        # con un OR entre ambos MATCH (o entre MATCH e IN) MySQL recorre toda
+        # la tabla. La relevancia se calcula despues, solo sobre los candidatos
+        categoria = aliased(Categoria)
+        candidatos = union(
+            select(Producto.id).where(en_producto),
+            select(Producto.id).join(categoria, categoria.id == Producto.id_categoria)
+            .where(match(categoria.nombre, against=expresion).in_boolean_mode()),
+        ).subquery("candidatos")
+        return (
+            consulta.join(candidatos, candidatos.c.id == Producto.id)
+            .outerjoin(Categoria, Categoria.id == Producto.id_categoria)
+            .order_by((2 * en_producto + en_categoria).desc(), Producto.id)
+        )
+    fts = table("producto_fts", column("rowid"))
+    expresion = " OR ".join(f'"{t}"*' for t in terminos)
+    # bm25 devuelve valores negativos: menor es mas relevante
+    relevancia = func.bm25(literal_column("producto_fts"), 10.0, 1.0, 5.0)
+    return (
+        consulta.join(fts, fts.c.rowid == Producto.id)
+        .where(literal_column("producto_fts").op("MATCH")(expresion))
+        .order_by(relevancia, Producto.id)
+    )
+
+
+# --- Autocompletado en memoria ---
+
+class IndicePrefijos:
+    """Indice de prefijos de los nombres de producto para el autocompletado.
+
+    Guarda pares (palabra normalizada, id) ordenados y busca con bisect, asi
+    "neg" encuentra "Johnnie Walker Etiqueta Negra". Se carga perezosamente
+    de la BD y las rutas de productos lo actualizan fila a fila; `version`
+    evita que una carga que empezo antes de una escritura pise el cambio.
+    """
+
+    def __init__(self):
+        self.cargado = False
+        self.version = 0
+        self._claves: list[tuple[str, int]] = []
+        self._nombres: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _claves_de(id_producto: int, nombre: str) -> set[tuple[str, int]]:
+        claves = {(p, id_producto) for p in palabras(nombre)}
+        claves.add((normalizar(nombre).strip(), id_producto))
+        return claves
+
+    def cargar(self, filas: Iterable[tuple[int, str]], version: int):
+        claves, nombres = [], {}
+        for id_producto, nombre in filas:
+            nombres[id_producto] = nombre
+            claves.extend(self._claves_de(id_producto, nombre))
+        claves.sort()
+        with self._lock:
+            if version != self.version:
+                return
+            self._claves, self._nombres = claves, nombres
+            self.cargado = True
+
+    def _quitar(self, id_producto: int):
+        nombre = self._nombres.pop(id_producto, None)
+        if nombre is None:
+            return
+        for clave in self._claves_de(id_producto, nombre):
+            i = bisect.bisect_left(self._claves, clave)
+            if i < len(self._claves) and self._claves[i] == clave:
+                del self._claves[i]
+
+    def guardar(self, id_producto: int, nombre: str):
+        with self._lock:
+            self.version += 1
+            if not self.cargado:
+                return
+            self._quitar(id_producto)
+            self._nombres[id_producto] = nombre
+            for clave in self._claves_de(id_producto, nombre):
+                bisect.insort(self._claves, clave)
+
+    def quitar(self, id_producto: int):
+        with self._lock:
+            self.version += 1
+            self._quitar(id_producto)
+
+    def invalidar(self):
+        """Fuerza una recarga completa (p.ej. tras una importacion masiva)"""
+        with self._lock:
+            self.version += 1
+            self.cargado = False
+            self._claves, self._nombres = [], {}
+
+    def buscar(self, prefijo: str, limite: int = 10) -> Optional[list[dict]]:
+        prefijo = normalizar(prefijo).strip()
+        with self._lock:
+            if not self.cargado:
+                return None
+            encontrados = []
+            i = bisect.bisect_left(self._claves, (prefijo, -1))
+            while i < len(self._claves) and len(encontrados) < limite:
+                clave, id_producto = self._claves[i]
+                if not clave.startswith(prefijo):
+                    break
+                if id_producto not in encontrados:
+                    encontrados.append(id_producto)
+                i += 1
+            return [{"id": id_producto, "nombre": self._nombres[id_producto]} for id_producto in encontrados]
+
+indice_productos = IndicePrefijos()
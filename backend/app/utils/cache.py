@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+FALTA = object()
+
+
+class CacheLRU:
+    """Cache LRU con TTL e invalidacion por etiquetas.
+
+    El tamaño se limita por peso (una entrada pesa lo que filas tenga su
+    valor, o 1 si no es una lista), asi un listado grande cuenta como lo que
+    ocupa. Cada entrada lleva etiquetas como "variante:3" o "variantes" y las
+    escrituras invalidan por etiqueta solo lo que depende de la fila tocada.
+
+    `version` cambia con cada invalidacion: una lectura que empezo antes de
+    una escritura no puede guardar un valor ya obsoleto.
+    """
+
+    def __init__(self, max_peso: int = 50_000, ttl: float = 300.0):
+        self.max_peso = max_peso
+        self.ttl = ttl
+        self.version = 0
+        self._peso = 0
+        self._datos: OrderedDict = OrderedDict()
+        self._por_etiqueta: dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirados = 0
+        self.invalidaciones = 0
+
+    @staticmethod
+    def _pesar(valor) -> int:
+        if isinstance(valor, tuple) and valor and isinstance(valor[0], list):
+            return max(1, len(valor[0]))
+        return max(1, len(valor)) if isinstance(valor, list) else 1
+
+    def _quitar(self, clave):
+        _, _, peso, etiquetas = self._datos.pop(clave)
+        self._peso -= peso
+        for etiqueta in etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def obtener(self, clave: Hashable, defecto: Any = FALTA) -> Any:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return defecto
+            if entrada[0] < time.monotonic():
+                self._quitar(clave)
+                self.expirados += 1
+                self.misses += 1
+                return defecto
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return entrada[1]
+
+    def guardar(self, clave: Hashable, valor: Any, etiquetas: Iterable[str], version: int, peso: Optional[int] = None):
+        # `peso` explicito para valores ya serializados (bytes), que no son listas
+        peso = self._pesar(valor) if peso is None else max(1, peso)
+        with self._lock:
+            if version != self.version or peso > self.max_peso:
+                return
+            if clave in self._datos:
+                self._quitar(clave)
+            etiquetas = frozenset(etiquetas)
+            self._datos[clave] = (time.monotonic() + self.ttl, valor, peso, etiquetas)
+            self._peso += peso
+            for etiqueta in etiquetas:
+                self._por_etiqueta.setdefault(etiqueta, set()).add(clave)
+            while self._peso > self.max_peso:
+                self._quitar(next(iter(self._datos)))
+                self.evictions += 1
+
+    def invalidar(self, *etiquetas: str):
+        with self._lock:
+            self.version += 1
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+                    self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self.version += 1
+            self._datos.clear()
+            self._por_etiqueta.clear()
+            self._peso = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "peso": self._peso,
+                "max_peso": self.max_peso,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirados": self.expirados,
+                "invalidaciones": self.invalidaciones,
+            }
+
+cache_catalogo = CacheLRU(
+    max_peso=int(os.getenv("CACHE_CATALOGO_MAX_FILAS", "50000")),
+    ttl=float(os.getenv("CACHE_CATALOGO_TTL", "300")),
+)
+
+# Calculos de reportes sobre la historia de ventas (etiqueta "ventas"); se
+# invalidan al confirmar cualquier cambio en resumen_venta_diaria
+cache_reportes = CacheLRU(
+    max_peso=int(os.getenv("CACHE_REPORTES_MAX_FILAS", "1000000")),
+    ttl=float(os.getenv("CACHE_REPORTES_TTL", "3600")),
+)
+
+
+def etiquetas_variante(variante) -> set[str]:
+    """Etiquetas de una variante serializada con su producto y categoria"""
+    etiquetas = {f"variante:{variante.id}"}
+    if variante.id_producto is not None:
+        etiquetas.add(f"producto:{variante.id_producto}")
+    producto = variante.producto
+    if producto is not None and producto.id_categoria is not None:
+        etiquetas.add(f"categoria:{producto.id_categoria}")
+    return etiquetas
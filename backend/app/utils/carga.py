@@ -0,0 +1,52 @@
+import typing
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+
+def _esquema_anidado(anotacion) -> Optional[type]:
+    """Devuelve el esquema contenido en la anotacion (X, Optional[X], list[X])"""
+    if isinstance(anotacion, type) and issubclass(anotacion, BaseModel):
+        return anotacion
+    for arg in typing.get_args(anotacion):
+        esquema = _esquema_anidado(arg)
+        if esquema is not None:
+            return esquema
+    return None
+
+
+def _opciones(modelo, esquema, padre=None):
+    relaciones = inspect(modelo).relationships
+    for nombre, campo in esquema.model_fields.items():
+        sub_esquema = _esquema_anidado(campo.annotation)
+        if sub_esquema is None or nombre not in relaciones:
+            continue
+        relacion = relaciones[nombre]
+        atributo = getattr(modelo, nombre)
+        # Colecciones con selectin (no multiplica filas ni rompe el LIMIT),
+        # relaciones a uno con JOIN en la misma consulta
+        if padre is None:
+            opcion = selectinload(atributo) if relacion.uselist else joinedload(atributo)
+        else:
+            opcion = padre.selectinload(atributo) if relacion.uselist else padre.joinedload(atributo)
+
+        hijas = list(_opciones(relacion.mapper.class_, sub_esquema, opcion))
+        if hijas:
+            yield from hijas
+        else:
+            yield opcion
+
+
+@lru_cache(maxsize=None)
+def opciones_carga(modelo, esquema) -> tuple:
+    """Opciones de carga para `modelo` segun las relaciones que serializa `esquema`.
+
+    Recorre los campos del esquema de respuesta y, por cada uno que sea otro
+    esquema y coincida con una relacion del modelo, carga esa relacion por
+    adelantado. Asi un listado hace un numero fijo de consultas en vez de
+    una por fila al serializar.
+    """
+    return tuple(_opciones(modelo, esquema))
@@ -0,0 +1,85 @@
+import re
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# Control de concurrencia optimista: cada fila lleva una columna `version`
+# que sube en cada escritura. El GET la devuelve como ETag y el cliente la
+# reenvia en If-Match; el UPDATE solo aplica si la version sigue igual.
+
+_ETAG = re.compile(r'^\s*(?:W/)?"(\d+)"\s*$')
+
+# Campos que el cliente no puede escribir directamente
+NO_EDITABLES = ("id", "version")
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def poner_etag(response: Response, version: int):
+    response.headers["ETag"] = etag(version)
+
+
+def version_de_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Version pedida en If-Match; None si no se envio o es `*`"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    coincidencia = _ETAG.match(if_match)
+    if not coincidencia:
+        raise HTTPException(status_code=412, detail="If-Match no valido")
+    return int(coincidencia.group(1))
+
+
+def conflicto(version_actual: int) -> HTTPException:
+    """412 con el ETag vigente para que el cliente recargue"""
+    return HTTPException(
+        status_code=412,
+        detail="El recurso fue modificado por otra peticion; recargue y vuelva a intentar",
+        headers={"ETag": etag(version_actual)},
+    )
+
+
+def sin_no_editables(datos: dict) -> dict:
+    return {campo: valor for campo, valor in datos.items() if campo not in NO_EDITABLES}
+
+
+async def actualizar_con_version(
+    session: AsyncSession,
+    modelo,
+    id_fila: int,
+    cambios: dict,
+    version: Optional[int],
+    no_encontrado: str,
+) -> int:
+    """UPDATE ... SET ..., version = version + 1 WHERE id = :id [AND version = :v].
+
+    Una sola sentencia, sin bloquear la fila. Si no se actualiza nada se
+    distingue entre fila inexistente (404) y version distinta (412, con el
+    ETag actual para que el cliente recargue). Devuelve la nueva version.
+    """
+    sentencia = (
+        update(modelo)
+        .where(modelo.id == id_fila)
+        .values(**cambios, version=modelo.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if version is not None:
+        sentencia = sentencia.where(modelo.version == version)
+    resultado = await session.exec(sentencia)
+    if resultado.rowcount == 1:
+        # La fila queda bloqueada hasta el commit: la version leida es la nuestra
+        return (version + 1) if version is not None else await _version_actual(session, modelo, id_fila)
+
+    await session.rollback()
+    actual = await _version_actual(session, modelo, id_fila)
+    if actual is None:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+    raise conflicto(actual)
+
+
+async def _version_actual(session: AsyncSession, modelo, id_fila: int) -> Optional[int]:
+    return (await session.exec(select(modelo.version).where(modelo.id == id_fila))).first()
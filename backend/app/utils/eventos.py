@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Iterable, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.variante import Variante
+from app.utils.tareas import encolar, tarea
+
+logger = logging.getLogger("app.inventario")
+
+# Hub de publicacion/suscripcion en proceso para los cambios de inventario.
+# Cada worker tiene el suyo (igual que cache_catalogo): un cliente recibe los
+# cambios hechos por el worker al que esta conectado.
+
+# Segundos sin cambios tras los que se manda un latido (detecta clientes caidos)
+LATIDO_S = float(os.getenv("INVENTARIO_LATIDO_S", "15"))
+MAX_SUSCRIPTORES = int(os.getenv("INVENTARIO_MAX_SUSCRIPTORES", "1000"))
+
+CAMPOS_EVENTO = ("id", "stock", "precio", "activo", "version")
+LOTE_LECTURA = 1000
+# Stock a partir del cual se registra una alerta de reposicion
+STOCK_MINIMO = int(os.getenv("STOCK_MINIMO", "5"))
+
+
+class Suscripcion:
+    """Cambios pendientes de un cliente, agrupados por variante.
+
+    Si el cliente lee mas lento de lo que se publica, los cambios de una
+    misma variante se sustituyen por el ultimo: nunca se acumula mas de un
+    evento por variante y el cliente recibe siempre el estado mas reciente.
+    """
+
+    def __init__(self, ids: Optional[set[int]] = None, umbral: Optional[int] = None):
+        self.ids = ids
+        self.umbral = umbral
+        self._pendientes: dict[int, dict] = {}
+        self._hay_cambios = asyncio.Event()
+        # Variantes que estan por debajo del umbral: se avisa tambien cuando se reponen
+        self._en_alerta: set[int] = set()
+        self.coalescidos = 0
+
+    def _acepta(self, evento: dict) -> bool:
+        if self.ids is not None and evento["id"] not in self.ids:
+            return False
+        if self.umbral is None:
+            return True
+        bajo = evento["stock"] <= self.umbral
+        if bajo:
+            self._en_alerta.add(evento["id"])
+            return True
+        if evento["id"] in self._en_alerta:
+            self._en_alerta.discard(evento["id"])
+            return True
+        return False
+
+    def poner(self, evento: dict):
+        if not self._acepta(evento):
+            return
+        if evento["id"] in self._pendientes:
+            self.coalescidos += 1
+        if self.umbral is not None:
+            evento = {**evento, "alerta": evento["stock"] <= self.umbral}
+        self._pendientes[evento["id"]] = evento
+        self._hay_cambios.set()
+
+    async def siguiente(self, espera: float = LATIDO_S) -> list[dict]:
+        """Cambios acumulados desde la ultima llamada; lista vacia si vence la espera"""
+        try:
+            await asyncio.wait_for(self._hay_cambios.wait(), espera)
+        except asyncio.TimeoutError:
+            return []
+        self._hay_cambios.clear()
+        cambios, self._pendientes = list(self._pendientes.values()), {}
+        return cambios
+
+
+class HubInventario:
+    def __init__(self, max_suscriptores: int = MAX_SUSCRIPTORES):
+        self.max_suscriptores = max_suscriptores
+        self._suscripciones: set[Suscripcion] = set()
+        self.publicados = 0
+
+    def suscribir(self, ids: Optional[set[int]] = None, umbral: Optional[int] = None) -> Optional[Suscripcion]:
+        """Nueva suscripcion, o None si se llego al maximo de suscriptores"""
+        if self.lleno:
+            return None
+        suscripcion = Suscripcion(ids, umbral)
+        self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    @property
+    def hay_suscriptores(self) -> bool:
+        return bool(self._suscripciones)
+
+    @property
+    def lleno(self) -> bool:
+        return len(self._suscripciones) >= self.max_suscriptores
+
+    def cancelar(self, suscripcion: Suscripcion):
+        self._suscripciones.discard(suscripcion)
+
+    def publicar(self, eventos: Iterable[dict]):
+        for evento in eventos:
+            self.publicados += 1
+            for suscripcion in self._suscripciones:
+                suscripcion.poner(evento)
+
+    def estadisticas(self) -> dict:
+        return {
+            "suscriptores": len(self._suscripciones),
+            "publicados": self.publicados,
+            "coalescidos": sum(s.coalescidos for s in self._suscripciones),
+        }
+
+
+hub_inventario = HubInventario()
+
+
+async def publicar_variantes(session: AsyncSession, ids: Iterable[int]):
+    """Lee el estado confirmado de las variantes y lo publica en el hub.
+
+    Se llama despues del commit. Sin suscriptores no se hace la consulta.
+    """
+    ids = list(ids)
+    if not ids or not hub_inventario.hay_suscriptores:
+        return
+    columnas = [getattr(Variante, campo) for campo in CAMPOS_EVENTO]
+    for inicio in range(0, len(ids), LOTE_LECTURA):
+        filas = (await session.exec(
+            select(*columnas).where(Variante.id.in_(ids[inicio:inicio + LOTE_LECTURA]))
+        )).all()
+        hub_inventario.publicar(dict(zip(CAMPOS_EVENTO, fila)) for fila in filas)
+
+
+def encolar_revision_stock(session: AsyncSession, ids: Iterable[int]):
+    """Revisa en segundo plano si las variantes quedaron por debajo de STOCK_MINIMO"""
+    ids = list(ids)
+    if ids:
+        encolar(session, "stock_bajo", {"ids": ids})
+
+
+@tarea("stock_bajo")
+async def _revisar_stock(session: AsyncSession, datos: dict):
+    for inicio in range(0, len(datos["ids"]), LOTE_LECTURA):
+        bajos = (await session.exec(
+            select(Variante.id, Variante.stock)
+            .where(Variante.id.in_(datos["ids"][inicio:inicio + LOTE_LECTURA]), Variante.stock <= STOCK_MINIMO)
+        )).all()
+        for id_variante, stock in bajos:
+            logger.warning(json.dumps({"evento": "stock_bajo", "id_variante": id_variante, "stock": stock}))
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Almacen de imagenes direccionado por contenido: cada archivo se guarda con
+# el SHA-256 de sus bytes como nombre, asi la misma imagen subida dos veces
+# ocupa un solo archivo y una URL nunca cambia de contenido (se puede cachear
+# para siempre).
+
+IMAGENES_DIR = Path(os.getenv("IMAGENES_DIR", "imagenes"))
+IMAGEN_MAX_BYTES = int(os.getenv("IMAGEN_MAX_BYTES", str(5 * 1024 * 1024)))
+# Lo que el multipart agrega a la imagen (boundary, cabeceras de la parte)
+MARGEN_MULTIPART = 16 * 1024
+PREFIJO_URL = "/imagenes/"
+BLOQUE = 256 * 1024
+
+# Extension -> tipo MIME de los formatos aceptados
+TIPOS_IMAGEN = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+
+_CLAVE = re.compile(r"^[0-9a-f]{64}\.(?:jpg|png|gif|webp)$")
+_RUTA_SUBIDA = re.compile(r"^/variantes/[^/]+/imagen$")
+
+
+def formato_imagen(cabecera: bytes) -> Optional[str]:
+    """Extension segun los primeros bytes (no se confia en el nombre ni en el Content-Type)"""
+    if cabecera.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if cabecera.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if cabecera[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def ruta_imagen(clave: str) -> Optional[Path]:
+    """Archivo de una clave `<sha256>.<ext>`, o None si la clave no es valida"""
+    if not _CLAVE.match(clave):
+        return None
+    # Un nivel de subdirectorios para no tener todo en una sola carpeta
+    return IMAGENES_DIR / clave[:2] / clave
+
+
+def url_imagen(clave: str) -> str:
+    return PREFIJO_URL + clave
+
+
+def guardar_imagen(origen: BinaryIO) -> str:
+    """Copia la imagen al almacen calculando su hash por bloques; devuelve la clave.
+
+    Se escribe primero a un temporal en el mismo disco y se renombra al
+    final: un archivo con nombre de hash siempre esta completo. Si ya existia
+    (misma imagen), se descarta el temporal. Es bloqueante: llamar en un hilo.
+    """
+    bloque = origen.read(BLOQUE)
+    formato = formato_imagen(bloque[:16])
+    if formato is None:
+        raise HTTPException(status_code=415, detail="Formato no soportado (jpg, png, gif o webp)")
+
+    IMAGENES_DIR.mkdir(parents=True, exist_ok=True)
+    resumen, tamano = hashlib.sha256(), 0
+    with tempfile.NamedTemporaryFile(dir=IMAGENES_DIR, suffix=".tmp", delete=False) as temporal:
+        try:
+            while bloque:
+                tamano += len(bloque)
+                if tamano > IMAGEN_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"La imagen supera {IMAGEN_MAX_BYTES} bytes")
+                resumen.update(bloque)
+                temporal.write(bloque)
+                bloque = origen.read(BLOQUE)
+        except BaseException:
+            temporal.close()
+            os.unlink(temporal.name)
+            raise
+
+    clave = f"{resumen.hexdigest()}.{formato}"
+    destino = ruta_imagen(clave)
+    if destino.exists():
+        os.unlink(temporal.name)
+    else:
+        destino.parent.mkdir(exist_ok=True)
+        os.replace(temporal.name, destino)
+    return clave
+
+
+class LimiteSubidaMiddleware:
+    """413 inmediato si el Content-Length de una subida de imagen ya supera el limite.
+
+    FastAPI lee y guarda en disco todo el formulario antes de llamar a la
+    ruta; sin esto una subida enorme se recibe entera para rechazarla despues.
+    Las subidas sin Content-Length (chunked) se siguen midiendo en guardar_imagen.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and _RUTA_SUBIDA.match(scope["path"]):
+            largo = dict(scope["headers"]).get(b"content-length", b"")
+            if largo.isdigit() and int(largo) > IMAGEN_MAX_BYTES + MARGEN_MULTIPART:
+                respuesta = JSONResponse(
+                    {"detail": f"La imagen supera {IMAGEN_MAX_BYTES} bytes"}, status_code=413,
+                    headers={"Connection": "close"},
+                )
+                await respuesta(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
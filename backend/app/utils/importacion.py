@@ -0,0 +1,162 @@
+import asyncio
+import csv
+import io
+import json
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from fastapi import HTTPException, UploadFile
+
+TAMANO_LOTE = 1000
+MAX_ERRORES = 100
+
+TIPOS_MIME = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+VERDADEROS = {"1", "true", "t", "si", "sí", "yes", "y"}
+FALSOS = {"0", "false", "f", "no", "n"}
+
+
+def formato_archivo(archivo: UploadFile, formato: Optional[str]) -> str:
+    """Formato pedido explicitamente o deducido de la extension del archivo"""
+    if formato is None and archivo.filename:
+        formato = archivo.filename.rsplit(".", 1)[-1].lower()
+        formato = {"jsonl": "ndjson", "json": "ndjson"}.get(formato, formato)
+    if formato not in TIPOS_MIME:
+        raise HTTPException(status_code=400, detail="Formato no soportado, use csv o ndjson")
+    return formato
+
+
+def _lineas_texto(binario, malas: set[int]) -> Iterator[str]:
+    """Decodifica las lineas en UTF-8; las que no lo son se anotan en `malas`"""
+    for numero, crudo in enumerate(binario, start=1):
+        try:
+            yield crudo.decode("utf-8-sig" if numero == 1 else "utf-8")
+        except UnicodeDecodeError:
+            malas.add(numero)
+            yield crudo.decode("utf-8", errors="replace")
+
+
+def leer_filas(archivo: UploadFile, formato: str) -> Iterator[tuple[int, object]]:
+    """Recorre el archivo subido fila a fila, sin cargarlo entero en memoria.
+
+    Devuelve (numero de linea, fila); si una linea no es valida (NDJSON mal
+    formado, texto que no es UTF-8), la fila es la excepcion para que quien
+    importa la reporte y siga.
+    """
+    malas: set[int] = set()
+    lineas = _lineas_texto(archivo.file, malas)
+    if formato == "csv":
+        lector = csv.DictReader(lineas)
+        anterior = lector.line_num
+        for fila in lector:
+            # Una fila CSV puede ocupar varias lineas (campos entre comillas)
+            if any(n in malas for n in range(anterior + 1, lector.line_num + 1)):
+                fila = ValueError("la linea no esta en UTF-8")
+            anterior = lector.line_num
+            yield lector.line_num, fila
+        return
+    for numero, linea in enumerate(lineas, start=1):
+        if numero in malas:
+            yield numero, ValueError("la linea no esta en UTF-8")
+            continue
+        if not linea.strip():
+            continue
+        try:
+            yield numero, json.loads(linea)
+        except ValueError as error:
+            yield numero, error
+
+
+def en_lotes(filas: Iterable, tamano: int = TAMANO_LOTE) -> Iterator[list]:
+    filas = iter(filas)
+    while lote := list(islice(filas, tamano)):
+        yield lote
+
+
+async def lotes_del_archivo(archivo: UploadFile, formato: str, tamano: int = TAMANO_LOTE) -> AsyncIterator[list]:
+    """Lotes de leer_filas, leidos en un hilo.
+
+    Un archivo subido grande ya esta en disco: leerlo en el event loop
+    bloquearia las demas peticiones mientras tanto.
+    """
+    lotes = en_lotes(leer_filas(archivo, formato), tamano)
+    while (lote := await asyncio.to_thread(next, lotes, None)) is not None:
+        yield lote
+
+
+def _a_bool(valor) -> bool:
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValueError(f"valor booleano no valido: {valor!r}")
+
+
+def convertir(fila: dict, tipos: dict) -> dict:
+    """Convierte los campos conocidos de la fila a su tipo; ignora vacios y extras"""
+    datos = {}
+    for campo, tipo in tipos.items():
+        valor = fila.get(campo)
+        if valor is None or valor == "":
+            continue
+        try:
+            datos[campo] = _a_bool(valor) if tipo is bool else tipo(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{campo}' no es un {tipo.__name__} valido: {valor!r}")
+    return datos
+
+
+class ResultadoImportacion:
+    """Contadores de una importacion y las primeras filas con error"""
+
+    def __init__(self):
+        self.insertados = 0
+        self.actualizados = 0
+        self.total_errores = 0
+        self.errores: list[dict] = []
+
+    def error(self, linea: int, mensaje: str):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"linea": linea, "error": mensaje})
+
+    def lote_fallido(self, lineas: Iterable[int], error: Exception):
+        """La BD rechazo el lote: ninguna de sus filas se guardo"""
+        mensaje = f"lote no guardado: {getattr(error, 'orig', error)}"
+        for linea in lineas:
+            self.error(linea, mensaje)
+
+    def resumen(self) -> dict:
+        return {
+            "insertados": self.insertados,
+            "actualizados": self.actualizados,
+            "total_errores": self.total_errores,
+            "errores": self.errores,
+        }
+
+
+async def exportar_filas(filas: AsyncIterator[list], columnas: list[str], formato: str) -> AsyncIterator[str]:
+    """Serializa particiones de filas a CSV o NDJSON a medida que llegan"""
+    if formato == "csv":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(columnas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        async for particion in filas:
+            escritor.writerows(particion)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        return
+    async for particion in filas:
+        yield "".join(
+            json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + "\n" for fila in particion
+        )
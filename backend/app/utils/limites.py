@@ -0,0 +1,174 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from jose import JWTError
+
+from app.auth.jwt_handler import decode_token
+from app.database import engine_para, estadisticas_pool
+
+LIMITES_ACTIVOS = os.getenv("LIMITES_ACTIVOS", "1").lower() in ("1", "true", "yes")
+# Cubetas recordadas a la vez; las de clientes inactivos se descartan primero
+LIMITES_MAX_CLAVES = int(os.getenv("LIMITES_MAX_CLAVES", "100000"))
+# Rutas que no se limitan (monitoreo: debe responder justo cuando hay carga)
+RUTAS_EXENTAS = ("/internal",)
+# Rutas que no usan la BD: no tiene sentido rechazarlas por el estado del pool
+RUTAS_SIN_BD = ("/imagenes/",)
+
+# Control de admision: se rechaza con 503 antes de tomar una conexion si ya
+# hay demasiadas peticiones esperando el pool o la espera reciente es alta
+ADMISION_MAX_ESPERANDO = int(os.getenv("ADMISION_MAX_ESPERANDO", "20"))
+ADMISION_ESPERA_MS = float(os.getenv("ADMISION_ESPERA_MS", "500"))
+ADMISION_RETRY_AFTER = os.getenv("ADMISION_RETRY_AFTER", "2")
+
+
+def _presupuesto(nombre: str, defecto: str) -> tuple[float, float]:
+    """Lee "tasa/rafaga" (peticiones por segundo / maximo acumulable)"""
+    tasa, rafaga = os.getenv(nombre, defecto).split("/")
+    return float(tasa), float(rafaga)
+
+
+# Presupuesto por clase de ruta y por cliente
+PRESUPUESTOS = {
+    "auth": _presupuesto("LIMITE_AUTH", "1/10"),
+    "lectura": _presupuesto("LIMITE_LECTURA", "50/100"),
+    "escritura": _presupuesto("LIMITE_ESCRITURA", "10/30"),
+}
+
+
+def clase_de(metodo: str, ruta: str) -> str:
+    if ruta.startswith("/auth/"):
+        return "auth"
+    return "lectura" if metodo in ("GET", "HEAD") else "escritura"
+
+
+class LimitadorTasa:
+    """Token bucket por (cliente, clase de ruta).
+
+    Cada cubeta guarda (tokens, instante); los tokens se reponen al leerla
+    segun el tiempo transcurrido, sin tareas de fondo.
+    """
+
+    def __init__(self, presupuestos: dict, max_claves: int = LIMITES_MAX_CLAVES):
+        self.presupuestos = presupuestos
+        self.max_claves = max_claves
+        self._cubetas: OrderedDict = OrderedDict()
+        self.rechazadas = 0
+
+    def consumir(self, clave: str, clase: str) -> float:
+        """0 si la peticion pasa; si no, segundos hasta que haya un token"""
+        tasa, rafaga = self.presupuestos[clase]
+        ahora = time.monotonic()
+        tokens, antes = self._cubetas.pop((clave, clase), (rafaga, ahora))
+        tokens = min(rafaga, tokens + (ahora - antes) * tasa)
+        espera = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            espera = (1 - tokens) / tasa
+            self.rechazadas += 1
+        self._cubetas[(clave, clase)] = (tokens, ahora)
+        if len(self._cubetas) > self.max_claves:
+            self._cubetas.popitem(last=False)
+        return espera
+
+    @property
+    def clientes(self) -> int:
+        return len(self._cubetas)
+
+
+limitador = LimitadorTasa(PRESUPUESTOS)
+admision = {"rechazadas": 0}
+
+
+def cliente_de(scope: dict) -> str:
+    """Usuario del token Bearer si es valido; si no, la IP del cliente.
+
+    Se usa el mismo decode_token (con cache) que get_current_user, pero sin
+    consultar la BD: basta con el `sub` firmado del token.
+    """
+    for nombre, valor in scope.get("headers", ()):
+        if nombre == b"authorization":
+            tipo, _, token = valor.decode("latin-1").partition(" ")
+            if tipo.lower() == "bearer" and token:
+                try:
+                    sub = decode_token(token).get("sub")
+                except JWTError:
+                    sub = None
+                if sub:
+                    return f"usuario:{sub}"
+            break
+    cliente = scope.get("client")
+    return f"ip:{cliente[0]}" if cliente else "ip:desconocida"
+
+
+def saturacion(metodo: str) -> bool:
+    """True si el pool al que iria la peticion ya tiene demasiada cola o espera"""
+    estadisticas = estadisticas_pool.get(engine_para(metodo))
+    if estadisticas is None:
+        return False
+    return (
+        estadisticas.esperando >= ADMISION_MAX_ESPERANDO
+        or 1000 * estadisticas.espera_reciente() >= ADMISION_ESPERA_MS
+    )
+
+
+async def _responder(send, estado: int, detalle: str, cabeceras: dict):
+    cuerpo = json.dumps({"detail": detalle}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": estado,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+            *((k.encode(), v.encode()) for k, v in cabeceras.items()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+class LimitesMiddleware:
+    """Limite de tasa por cliente y control de admision segun el pool.
+
+    Las dos comprobaciones se hacen antes de la ruta, sin tocar la BD: una
+    peticion rechazada cuesta microsegundos en vez de esperar pool_timeout.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LIMITES_ACTIVOS or scope["path"].startswith(RUTAS_EXENTAS):
+            await self.app(scope, receive, send)
+            return
+
+        clase = clase_de(scope["method"], scope["path"])
+        espera = limitador.consumir(cliente_de(scope), clase)
+        if espera:
+            await _responder(
+                send, 429, "Demasiadas peticiones; intente mas tarde",
+                {"retry-after": str(math.ceil(espera))},
+            )
+            return
+
+        if not scope["path"].startswith(RUTAS_SIN_BD) and saturacion(scope["method"]):
+            admision["rechazadas"] += 1
+            await _responder(
+                send, 503, "Servicio saturado; intente mas tarde",
+                {"retry-after": ADMISION_RETRY_AFTER},
+            )
+            return
+
+        await self.app(scope, receive, send)
+
+
+def estadisticas_limites() -> dict:
+    return {
+        "activos": LIMITES_ACTIVOS,
+        "presupuestos": {clase: {"tasa": t, "rafaga": r} for clase, (t, r) in PRESUPUESTOS.items()},
+        "rechazadas_tasa": limitador.rechazadas,
+        "rechazadas_admision": admision["rechazadas"],
+        "clientes": limitador.clientes,
+    }
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger("app.sql")
+
+# Una consulta que tarde mas que esto se registra con su SQL normalizado
+SQL_LENTA_MS = float(os.getenv("SQL_LENTA_MS", "200"))
+# Mas consultas que esto en una sola peticion suele ser un N+1
+SQL_MAX_CONSULTAS = int(os.getenv("SQL_MAX_CONSULTAS", "50"))
+SQL_LOG_PETICIONES = os.getenv("SQL_LOG_PETICIONES", "1").lower() in ("1", "true", "yes")
+
+
+class MetricasPeticion:
+    """Consultas ejecutadas durante una peticion"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.max_tiempo = 0.0
+        self.max_sql: Optional[str] = None
+
+    @property
+    def ruta(self) -> str:
+        # FastAPI deja la ruta resuelta en el scope (p.ej. /variantes/{id})
+        ruta = self.scope.get("route")
+        return getattr(ruta, "path", None) or self.scope.get("path", "")
+
+    def registrar(self, sql: str, segundos: float):
+        self.consultas += 1
+        self.tiempo += segundos
+        if segundos > self.max_tiempo:
+            self.max_tiempo = segundos
+            self.max_sql = sql
+
+
+_metricas: ContextVar[Optional[MetricasPeticion]] = ContextVar("metricas_sql", default=None)
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))+\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+def normalizar_sql(sql: str) -> str:
+    """SQL sin literales ni listas IN expandidas: consultas iguales agrupan igual"""
+    sql = _LITERALES.sub("?", sql)
+    sql = _LISTAS.sub("(...)", sql)
+    return _ESPACIOS.sub(" ", sql).strip()
+
+
+# --- Eventos del engine ---
+
+# El inicio va en el contexto de ejecucion de cada sentencia: una que falla
+# no llega a _despues y no debe dejar nada en la conexion (que vuelve al pool)
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    context._inicio_consulta = time.perf_counter()
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    segundos = time.perf_counter() - context._inicio_consulta
+    metricas = _metricas.get()
+    if metricas is not None:
+        metricas.registrar(statement, segundos)
+    if segundos * 1000 >= SQL_LENTA_MS:
+        logger.warning(json.dumps({
+            "evento": "consulta_lenta",
+            "ruta": metricas.ruta if metricas else None,
+            "ms": round(segundos * 1000, 2),
+            "sql": normalizar_sql(statement),
+        }, ensure_ascii=False))
+
+def instrumentar(engine):
+    """Mide cada consulta del engine (sincrono o asincrono)"""
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", _antes):
+        event.listen(engine, "before_cursor_execute", _antes)
+        event.listen(engine, "after_cursor_execute", _despues)
+
+
+# --- Middleware ---
+
+class MetricasSQLMiddleware:
+    """Añade Server-Timing con el tiempo de BD y registra una linea por peticion.
+
+    Es un middleware ASGI puro: las metricas viven en un ContextVar que ven
+    las consultas lanzadas desde la ruta, y la linea de log se escribe al
+    terminar el cuerpo, asi tambien cuenta las respuestas en streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metricas = MetricasPeticion(scope)
+        token = _metricas.set(metricas)
+        inicio = time.perf_counter()
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                cabecera = (
+                    f'db;dur={metricas.tiempo * 1000:.2f};desc="{metricas.consultas} consultas", '
+                    f"db-max;dur={metricas.max_tiempo * 1000:.2f}, "
+                    f"app;dur={(time.perf_counter() - inicio) * 1000:.2f}"
+                )
+                mensaje["headers"] = [*mensaje.get("headers", []), (b"server-timing", cabecera.encode())]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _metricas.reset(token)
+            self._registrar(metricas, scope, estado, time.perf_counter() - inicio)
+
+    @staticmethod
+    def _registrar(metricas: MetricasPeticion, scope: dict, estado: int, segundos: float):
+        muchas = metricas.consultas > SQL_MAX_CONSULTAS
+        if not (SQL_LOG_PETICIONES or muchas):
+            return
+        linea = {
+            "evento": "peticion",
+            "metodo": scope["method"],
+            "ruta": metricas.ruta,
+            "estado": estado,
+            "ms": round(segundos * 1000, 2),
+            "consultas": metricas.consultas,
+            "db_ms": round(metricas.tiempo * 1000, 2),
+            "max_ms": round(metricas.max_tiempo * 1000, 2),
+        }
+        if metricas.max_sql is not None:
+            linea["max_sql"] = normalizar_sql(metricas.max_sql)
+        logger.log(logging.WARNING if muchas else logging.INFO, json.dumps(linea, ensure_ascii=False))
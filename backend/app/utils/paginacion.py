@@ -0,0 +1,93 @@
+import base64
+import datetime
+import json
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+LIMITE_MAXIMO = 1000
+PAGINA_DEFECTO = min(int(os.getenv("PAGINA_DEFECTO", "100")), LIMITE_MAXIMO)
+CABECERA_CURSOR = "X-Next-Cursor"
+
+
+def codificar_cursor(valores: list) -> str:
+    """Convierte los valores de la ultima fila en un cursor opaco"""
+    datos = [v.isoformat() if isinstance(v, datetime.date) else v for v in valores]
+    crudo = json.dumps(datos, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, columnas) -> list:
+    """Recupera los valores del cursor, con el tipo de cada columna del orden"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(columnas):
+            raise ValueError
+        return [
+            datetime.date.fromisoformat(v) if col.type.python_type is datetime.date else v
+            for col, v in zip(columnas, valores)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _despues_de(columnas, valores):
+    # (c1, c2) > (v1, v2)  ->  c1 > v1 OR (c1 = v1 AND c2 > v2)
+    condiciones = []
+    for i, col in enumerate(columnas):
+        iguales = [c == v for c, v in zip(columnas[:i], valores[:i])]
+        condiciones.append(and_(*iguales, col > valores[i]))
+    return or_(*condiciones)
+
+
+class Pagina:
+    """Parametros de paginacion por cursor (keyset) comunes a los listados.
+
+    Todo listado devuelve como maximo `limit` filas (PAGINA_DEFECTO si no se
+    indica). El cursor de la pagina siguiente viaja en la cabecera
+    X-Next-Cursor en vez de en el cuerpo, para que el cuerpo siga siendo la
+    lista de siempre; en la ultima pagina la cabecera llega vacia. El volcado
+    completo de una tabla esta en las rutas /export.
+    """
+
+    def __init__(
+        self,
+        response: Response,
+        limit: int = Query(
+            PAGINA_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Filas por pagina",
+        ),
+        cursor: Optional[str] = Query(
+            None, description="Valor de la cabecera X-Next-Cursor de la pagina anterior",
+        ),
+    ):
+        self.response = response
+        self.limit = limit
+        self.cursor = cursor
+
+    def acotar(self, consulta, *columnas):
+        """Filtra desde el cursor, ordena por `columnas` y limita, sin ejecutar.
+
+        Sirve tambien para cada rama de un UNION: asi cada tabla aporta solo
+        su pagina en vez de materializarse entera antes del LIMIT de afuera.
+        """
+        if self.cursor:
+            valores = decodificar_cursor(self.cursor, columnas)
+            consulta = consulta.where(_despues_de(columnas, valores))
+        consulta = consulta.order_by(*columnas)
+        # Una fila de mas para saber si hay pagina siguiente
+        return consulta.limit(self.limit + 1)
+
+    async def aplicar(self, session: AsyncSession, consulta, *columnas):
+        """Ordena por `columnas`, filtra desde el cursor y ejecuta la consulta"""
+        filas = (await session.exec(self.acotar(consulta, *columnas))).all()
+        siguiente = ""
+        if len(filas) > self.limit:
+            filas = filas[: self.limit]
+            ultima = filas[-1]
+            siguiente = codificar_cursor([getattr(ultima, col.key) for col in columnas])
+        self.response.headers[CABECERA_CURSOR] = siguiente
+        return filas
@@ -0,0 +1,307 @@
+import cProfile
+import collections
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from typing import Optional
+
+# Perfilador bajo demanda para ver en produccion donde se va el tiempo de una
+# ruta, sin redesplegar. Solo con PERFILADOR_TOKEN configurado; cada uso lleva
+# ese token en la cabecera X-Perfil-Token.
+#
+# - muestreo: un hilo mira cada PERFIL_INTERVALO_MS la pila de los hilos y
+#   cuenta solo lo que cuelga de una peticion perfilada (marcada por el frame
+#   de _perfilar). Costo fijo y bajo; sale en formato de pilas colapsadas
+#   (flamegraph.pl, speedscope). Ve el tiempo de CPU en el event loop: la
+#   espera de E/S no aparece (para eso esta Server-Timing), ni lo que corre
+#   en otros hilos o procesos (bcrypt en su pool, asyncio.to_thread).
+# - cprofile: cada llamada a funcion, exacto pero con mas costo. cProfile es
+#   por hilo, asi que tambien cuenta lo que otras peticiones corran en el loop
+#   mientras tanto; se perfila una peticion a la vez.
+#
+# El costo se acota por sesion: numero de peticiones, porcentaje muestreado,
+# duracion maxima y maximo de muestras.
+
+PERFILADOR_TOKEN = os.getenv("PERFILADOR_TOKEN", "")
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "5"))
+PERFIL_MAX_PETICIONES = int(os.getenv("PERFIL_MAX_PETICIONES", "1000"))
+PERFIL_MAX_S = float(os.getenv("PERFIL_MAX_S", "120"))
+PERFIL_MAX_MUESTRAS = int(os.getenv("PERFIL_MAX_MUESTRAS", "200000"))
+# Sesiones terminadas que se guardan para consultar su resultado
+PERFIL_MAX_SESIONES = int(os.getenv("PERFIL_MAX_SESIONES", "10"))
+PERFIL_PSTATS_LINEAS = int(os.getenv("PERFIL_PSTATS_LINEAS", "60"))
+
+MODOS = ("muestreo", "cprofile")
+CABECERA_MODO = b"x-perfil"
+CABECERA_TOKEN = b"x-perfil-token"
+
+
+def token_valido(token: Optional[str]) -> bool:
+    # Se comparan bytes: con str, compare_digest lanza TypeError si el token
+    # recibido trae caracteres no ASCII
+    return (
+        bool(PERFILADOR_TOKEN) and token is not None
+        and hmac.compare_digest(token.encode(), PERFILADOR_TOKEN.encode())
+    )
+
+
+def _patron(ruta: str) -> re.Pattern:
+    """/variantes/{variante_id} -> ^/variantes/[^/]+$"""
+    partes = re.split(r"\{[^}]+\}", ruta)
+    return re.compile("^" + "[^/]+".join(re.escape(p) for p in partes) + "$")
+
+
+class SesionPerfil:
+    def __init__(self, id_: int, modo: str, ruta: Optional[str], peticiones: int, porcentaje: float, max_s: float):
+        self.id = id_
+        self.modo = modo
+        self.ruta = ruta
+        self.patron = _patron(ruta) if ruta else None
+        self.restantes = peticiones
+        self.porcentaje = porcentaje
+        self.inicio = time.monotonic()
+        self.hasta = self.inicio + max_s
+        self.perfiladas = 0
+        self.en_curso = 0
+        self.detenida = False
+        self.muestras = 0
+        self._pilas: collections.Counter = collections.Counter()
+        self.cprofile = cProfile.Profile() if modo == "cprofile" else None
+        self._lock = threading.Lock()
+
+    @property
+    def activa(self) -> bool:
+        return not self.detenida and self.restantes > 0 and time.monotonic() < self.hasta
+
+    def tomar(self) -> bool:
+        """Reserva una peticion de la sesion (respetando el porcentaje)"""
+        if not self.activa or random.random() * 100 >= self.porcentaje:
+            return False
+        self.restantes -= 1
+        self.perfiladas += 1
+        return True
+
+    def sumar_pila(self, pila: str):
+        with self._lock:
+            if self.muestras < PERFIL_MAX_MUESTRAS:
+                self._pilas[pila] += 1
+                self.muestras += 1
+
+    def colapsado(self) -> str:
+        """Una linea por pila: `raiz;...;hoja cuenta`"""
+        with self._lock:
+            return "".join(f"{pila} {n}\n" for pila, n in self._pilas.most_common())
+
+    # Leer el resultado de cProfile lo detiene (create_stats llama a
+    # disable): solo se hace sin peticiones en curso
+
+    def pstats_texto(self) -> str:
+        self.cprofile.create_stats()
+        if not self.cprofile.stats:
+            return ""
+        salida = io.StringIO()
+        pstats.Stats(self.cprofile, stream=salida).sort_stats("cumulative").print_stats(PERFIL_PSTATS_LINEAS)
+        return salida.getvalue()
+
+    def pstats_binario(self) -> bytes:
+        """El formato de pstats.dump_stats (para snakeviz, pstats.Stats(archivo))"""
+        self.cprofile.create_stats()
+        return marshal.dumps(self.cprofile.stats)
+
+    def resumen(self) -> dict:
+        return {
+            "id": self.id,
+            "modo": self.modo,
+            "ruta": self.ruta,
+            "activa": self.activa,
+            "perfiladas": self.perfiladas,
+            "restantes": max(self.restantes, 0),
+            "en_curso": self.en_curso,
+            "porcentaje": self.porcentaje,
+            "muestras": self.muestras,
+            "segundos": round(time.monotonic() - self.inicio, 1),
+        }
+
+
+class Muestreador:
+    """Hilo que cuenta las pilas de las peticiones perfiladas en muestreo.
+
+    Duerme (sin costo) mientras no hay ninguna peticion perfilada en curso.
+    """
+
+    def __init__(self, intervalo_s: float):
+        self.intervalo_s = intervalo_s
+        # id(frame de _perfilar) -> sesion
+        self.marcas: dict[int, SesionPerfil] = {}
+        self._despertar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        # Se arranca al crear la sesion, no dentro de una peticion perfilada
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._correr, name="perfilador", daemon=True)
+                self._hilo.start()
+
+    def registrar(self, marca, sesion: SesionPerfil):
+        self.marcas[id(marca)] = sesion
+        self._despertar.set()
+
+    def quitar(self, marca):
+        self.marcas.pop(id(marca), None)
+
+    def _correr(self):
+        propio = threading.get_ident()
+        while True:
+            if not self.marcas:
+                self._despertar.clear()
+                self._despertar.wait()
+                continue
+            for hilo, frame in sys._current_frames().items():
+                if hilo != propio:
+                    self._muestrear(frame)
+            time.sleep(self.intervalo_s)
+
+    def _muestrear(self, frame):
+        pila = []
+        while frame is not None:
+            if frame.f_code is _CODIGO_MARCA:
+                sesion = self.marcas.get(id(frame))
+                if sesion is not None and pila:
+                    sesion.sumar_pila(";".join(reversed(pila)))
+                return
+            pila.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+            frame = frame.f_back
+
+
+class Perfilador:
+    def __init__(self):
+        self.sesiones: collections.OrderedDict[int, SesionPerfil] = collections.OrderedDict()
+        self.muestreador = Muestreador(PERFIL_INTERVALO_MS / 1000)
+        self._ids = itertools.count(1)
+        # cProfile perfila todo el hilo: una peticion a la vez
+        self.cprofile_ocupado = False
+
+    def crear(self, modo: str, ruta: Optional[str] = None, peticiones: int = 1,
+              porcentaje: float = 100.0, max_s: float = PERFIL_MAX_S) -> SesionPerfil:
+        sesion = SesionPerfil(next(self._ids), modo, ruta, peticiones, porcentaje, min(max_s, PERFIL_MAX_S))
+        if modo == "muestreo":
+            self.muestreador.iniciar()
+        self.sesiones[sesion.id] = sesion
+        # Se descartan las terminadas mas antiguas
+        while len(self.sesiones) > PERFIL_MAX_SESIONES:
+            vieja = next((s for s in self.sesiones.values() if not s.activa and not s.en_curso), None)
+            if vieja is None:
+                break
+            del self.sesiones[vieja.id]
+        return sesion
+
+    def activa_para(self, ruta: str) -> Optional[SesionPerfil]:
+        for sesion in self.sesiones.values():
+            if sesion.patron is not None and sesion.patron.match(ruta) and sesion.activa:
+                return sesion
+        return None
+
+    def hay_sesiones_de_ruta(self) -> bool:
+        return any(s.patron is not None and s.activa for s in self.sesiones.values())
+
+    def estadisticas(self) -> dict:
+        return {
+            "habilitado": bool(PERFILADOR_TOKEN),
+            "intervalo_ms": PERFIL_INTERVALO_MS,
+            "sesiones": [s.resumen() for s in self.sesiones.values()],
+        }
+
+
+perfilador = Perfilador()
+
+
+async def _perfilar(app, scope, receive, send, sesion: SesionPerfil):
+    sesion.en_curso += 1
+    try:
+        if sesion.modo == "cprofile":
+            perfilador.cprofile_ocupado = True
+            sesion.cprofile.enable()
+            try:
+                await app(scope, receive, send)
+            finally:
+                sesion.cprofile.disable()
+                perfilador.cprofile_ocupado = False
+        else:
+            # El muestreador reconoce la peticion por este frame
+            marca = sys._getframe()
+            perfilador.muestreador.registrar(marca, sesion)
+            try:
+                await app(scope, receive, send)
+            finally:
+                perfilador.muestreador.quitar(marca)
+    finally:
+        sesion.en_curso -= 1
+
+_CODIGO_MARCA = _perfilar.__code__
+
+
+def _cabeceras_perfil(scope) -> tuple[Optional[str], Optional[str]]:
+    modo = token = None
+    for nombre, valor in scope["headers"]:
+        if nombre == CABECERA_MODO:
+            modo = valor.decode("latin-1").strip().lower()
+        elif nombre == CABECERA_TOKEN:
+            token = valor.decode("latin-1")
+    return modo, token
+
+
+class PerfiladorMiddleware:
+    """Perfila las peticiones de una sesion activa o las que traen X-Perfil.
+
+    Sin PERFILADOR_TOKEN no hace nada. Una peticion con `X-Perfil: muestreo`
+    (o `cprofile`) y el token valido se perfila sola; la respuesta trae
+    X-Perfil-Id para leer el resultado en /internal/perfil/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PERFILADOR_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        sesion = None
+        modo, token = _cabeceras_perfil(scope)
+        if modo in MODOS and token_valido(token):
+            if modo == "cprofile" and perfilador.cprofile_ocupado:
+                await self.app(scope, receive, send)
+                return
+            sesion = perfilador.crear(modo)
+            sesion.tomar()
+            send = _con_id_perfil(send, sesion.id)
+        elif perfilador.hay_sesiones_de_ruta():
+            sesion = perfilador.activa_para(scope["path"])
+            if sesion is not None and (
+                (sesion.modo == "cprofile" and perfilador.cprofile_ocupado) or not sesion.tomar()
+            ):
+                sesion = None
+
+        if sesion is None:
+            await self.app(scope, receive, send)
+        else:
+            await _perfilar(self.app, scope, receive, send, sesion)
+
+
+def _con_id_perfil(send, id_sesion: int):
+    async def enviar(mensaje):
+        if mensaje["type"] == "http.response.start":
+            mensaje.setdefault("headers", [])
+            mensaje["headers"] = [*mensaje["headers"], (b"x-perfil-id", str(id_sesion).encode())]
+        await send(mensaje)
+    return enviar
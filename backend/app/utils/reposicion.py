@@ -0,0 +1,122 @@
+import datetime
+import itertools
+from statistics import NormalDist
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.producto import Producto
+from app.models.resumen_venta import ResumenVentaDiaria
+from app.models.variante import Variante
+from app.utils.cache import cache_reportes
+
+# Punto de reorden y cantidad sugerida para todas las variantes activas a la vez.
+#
+# La historia sale de resumen_venta_diaria (unidades por variante y dia, ya
+# agregadas desde compras y detalles). La BD reduce la ventana a una fila por
+# variante (suma y suma de cuadrados de la demanda diaria): traer millones de
+# filas diarias a Python cuesta mas en armar las filas que todo el calculo.
+# Con esas columnas en arrays de NumPy, media, desviacion, punto de reorden y
+# cobertura se calculan para todas las variantes en operaciones vectorizadas.
+#
+# La parte cara (la consulta de historia) solo depende de las ventas y se
+# guarda en cache hasta que llega una compra; lo que depende del stock se
+# calcula en cada peticion.
+
+
+async def _demanda(session: AsyncSession, desde: datetime.date, hasta: datetime.date) -> tuple[np.ndarray, np.ndarray]:
+    """Suma y suma de cuadrados de las unidades diarias, indexadas por id de variante"""
+    # Una fila por (dia, variante): cada fila de la tabla es la demanda de un dia
+    unidades = ResumenVentaDiaria.unidades
+    filas = (await session.exec(
+        select(ResumenVentaDiaria.id_variante, func.sum(unidades), func.sum(unidades * unidades))
+        .where(ResumenVentaDiaria.fecha >= desde, ResumenVentaDiaria.fecha <= hasta)
+        .group_by(ResumenVentaDiaria.id_variante)
+    )).all()
+    columnas = np.fromiter(
+        itertools.chain.from_iterable(filas), dtype=np.float64, count=3 * len(filas),
+    ).reshape(-1, 3)
+    ids = columnas[:, 0].astype(np.int64)
+    tope = int(ids.max()) + 1 if len(ids) else 0
+    suma, cuadrados = np.zeros(tope), np.zeros(tope)
+    suma[ids], cuadrados[ids] = columnas[:, 1], columnas[:, 2]
+    return suma, cuadrados
+
+
+async def demanda_en_cache(session: AsyncSession, dias: int) -> tuple[np.ndarray, np.ndarray]:
+    hoy = datetime.date.today()
+    # La fecha va en la clave: la ventana se mueve cada dia
+    clave = ("demanda", dias, hoy)
+    datos = cache_reportes.obtener(clave, None)
+    if datos is None:
+        version = cache_reportes.version
+        datos = await _demanda(session, hoy - datetime.timedelta(days=dias - 1), hoy)
+        cache_reportes.guardar(clave, datos, {"ventas"}, version, peso=len(datos[0]))
+    return datos
+
+
+async def calcular_reposicion(
+    session: AsyncSession,
+    dias: int,
+    plazo: int,
+    revision: int,
+    nivel_servicio: float,
+    solo_reponer: bool = False,
+) -> list[dict]:
+    """Demanda, cobertura y cantidad a pedir por variante activa, las mas urgentes primero.
+
+    Con demanda diaria media d y desviacion s en los ultimos `dias`:
+    stock de seguridad = z*s*sqrt(plazo), punto de reorden = d*plazo + seguridad,
+    y si el stock llego al punto de reorden se sugiere pedir hasta cubrir
+    plazo + revision dias mas la seguridad.
+    """
+    suma, cuadrados = await demanda_en_cache(session, dias)
+
+    filas = (await session.exec(
+        select(Variante.id, Variante.id_producto, Producto.nombre, Variante.stock)
+        .outerjoin(Producto)
+        .where(Variante.activo == True)
+        .order_by(Variante.id)
+    )).all()
+    if not filas:
+        return []
+    ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+    stock = np.fromiter((f[3] for f in filas), dtype=np.int64, count=len(filas))
+
+    # Variantes sin ventas en la ventana (o creadas despues) quedan en 0
+    tope = int(ids[-1]) + 1
+    if len(suma) < tope:
+        suma, cuadrados = np.pad(suma, (0, tope - len(suma))), np.pad(cuadrados, (0, tope - len(cuadrados)))
+    total, total2 = suma[ids], cuadrados[ids]
+
+    media = total / dias
+    desviacion = np.sqrt(np.maximum(total2 / dias - media * media, 0))
+    seguridad = NormalDist().inv_cdf(nivel_servicio) * desviacion * np.sqrt(plazo)
+    punto_reorden = media * plazo + seguridad
+    con_demanda = media > 0
+    cobertura = np.divide(stock, media, out=np.full(len(ids), np.inf), where=con_demanda)
+    reponer = con_demanda & (stock <= punto_reorden)
+    sugerida = np.where(reponer, np.ceil(np.maximum(media * (plazo + revision) + seguridad - stock, 0)), 0)
+
+    # Las de menor cobertura primero; las que no venden al final
+    orden = np.argsort(cobertura, kind="stable")
+    if solo_reponer:
+        orden = orden[reponer[orden]]
+
+    indices = orden.tolist()
+    columnas = {
+        "id": ids[orden].tolist(),
+        "id_producto": [filas[i][1] for i in indices],
+        "nombre": [filas[i][2] for i in indices],
+        "stock": stock[orden].tolist(),
+        "demanda_diaria": np.round(media[orden], 3).tolist(),
+        "desviacion_diaria": np.round(desviacion[orden], 3).tolist(),
+        "dias_cobertura": np.where(con_demanda, np.round(cobertura, 1), None)[orden].tolist(),
+        "stock_seguridad": np.round(seguridad[orden], 1).tolist(),
+        "punto_reorden": np.round(punto_reorden[orden], 1).tolist(),
+        "cantidad_sugerida": sugerida[orden].astype(np.int64).tolist(),
+        "reponer": reponer[orden].tolist(),
+    }
+    return [dict(zip(columnas, valores)) for valores in zip(*columnas.values())]
@@ -0,0 +1,92 @@
+import os
+from functools import lru_cache
+from types import UnionType
+from typing import Callable, Optional, Union, get_args, get_origin
+
+from fastapi import Response
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic_core import to_json
+from sqlmodel import SQLModel
+
+# Los listados grandes se serializan directo a bytes con pydantic-core, sin
+# pasar por la validacion del response_model ni por jsonable_encoder.
+#
+# Validar cada fila hacia el esquema (crear 10k modelos con sus anidados) es
+# la mayor parte del costo, mas que escribir el JSON. Como las filas ya
+# vienen de la BD con los tipos del modelo, cada esquema se compila una vez
+# en un extractor que copia sus campos del objeto ORM a dicts, y
+# pydantic_core.to_json los escribe en Rust. El JSON es el mismo.
+
+# Respuestas mas grandes que esto se comprimen con gzip si el cliente lo acepta
+GZIP_MINIMO = int(os.getenv("GZIP_MINIMO", "1024"))
+# 1-9: a partir de ~5 apenas baja el tamaño y sube mucho la CPU
+GZIP_NIVEL = int(os.getenv("GZIP_NIVEL", "5"))
+# Rutas que sirven archivos ya comprimidos (jpg, png, webp...): gzip solo
+# gastaria CPU, y ademas romperia las respuestas Range y el envio por pathsend
+RUTAS_SIN_GZIP = ("/imagenes/",)
+
+
+def _esquema_anidado(tipo) -> Optional[type[SQLModel]]:
+    """El esquema SQLModel de un campo `Esquema` u `Optional[Esquema]`, si lo es"""
+    if get_origin(tipo) in (Union, UnionType):
+        tipos = [t for t in get_args(tipo) if t is not type(None)]
+        tipo = tipos[0] if len(tipos) == 1 else None
+    return tipo if isinstance(tipo, type) and issubclass(tipo, SQLModel) else None
+
+
+@lru_cache
+def extractor(esquema: type[SQLModel]) -> Callable[[object], Optional[dict]]:
+    """Funcion objeto ORM -> dict con los campos de `esquema` (y sus anidados)"""
+    simples, anidados = [], []
+    for nombre, info in esquema.model_fields.items():
+        anidado = _esquema_anidado(info.annotation)
+        if anidado is None:
+            simples.append(nombre)
+        else:
+            anidados.append((nombre, extractor(anidado)))
+
+    def extraer(fila) -> Optional[dict]:
+        if fila is None:
+            return None
+        # Los atributos ya cargados estan en __dict__; leerlos ahi evita el
+        # descriptor de SQLAlchemy. Lo que falte (expirado) se lee normal.
+        cargados = fila.__dict__
+        datos = {
+            nombre: cargados[nombre] if nombre in cargados else getattr(fila, nombre)
+            for nombre in simples
+        }
+        for nombre, extraer_anidado in anidados:
+            datos[nombre] = extraer_anidado(getattr(fila, nombre))
+        return datos
+
+    return extraer
+
+
+def serializar(esquema: type[SQLModel], filas) -> bytes:
+    """JSON de una lista de filas ORM con los campos de `esquema`"""
+    extraer = extractor(esquema)
+    return to_json([extraer(fila) for fila in filas])
+
+
+def respuesta_json(cuerpo: bytes, response: Optional[Response] = None) -> Response:
+    """Respuesta con el JSON ya serializado.
+
+    Al devolver una Response, FastAPI no copia las cabeceras puestas en el
+    parametro `response` de la ruta (p.ej. X-Next-Cursor): se copian aqui.
+    """
+    respuesta = Response(cuerpo, media_type="application/json")
+    if response is not None:
+        for nombre, valor in response.headers.items():
+            if nombre not in ("content-length", "content-type"):
+                respuesta.headers[nombre] = valor
+    return respuesta
+
+
+class GZipListados(GZipMiddleware):
+    """GZipMiddleware que deja pasar sin tocar las rutas de RUTAS_SIN_GZIP"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(RUTAS_SIN_GZIP):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
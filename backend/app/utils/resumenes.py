@@ -0,0 +1,161 @@
+import datetime
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.archivo import CompraArchivada, DetalleCompraArchivado
+from app.models.compra import Compra
+from app.models.detalle_compra import DetalleCompra
+from app.models.resumen_venta import ResumenCompraDiaria, ResumenVentaDiaria
+from app.utils.archivo import con_archivo
+from app.utils.cache import cache_reportes
+from app.utils.tareas import encolar, tarea
+
+def a_fecha(valor) -> Optional[datetime.date]:
+    """Normaliza la fecha de una compra (puede llegar como texto ISO)"""
+    if valor is None or isinstance(valor, datetime.date):
+        return valor
+    return datetime.date.fromisoformat(str(valor))
+
+def _marcar_ventas(session: AsyncSession):
+    # Los reportes en cache se invalidan cuando el cambio se confirma, no antes:
+    # un calculo que lea entre medias no puede guardar datos ya viejos
+    session.sync_session.info["ventas_cambiadas"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_reportes(session: Session):
+    if session.info.pop("ventas_cambiadas", False):
+        cache_reportes.invalidar("ventas")
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_marca(session: Session):
+    session.info.pop("ventas_cambiadas", None)
+
+def _upsert_suma(session: AsyncSession, modelo, claves: tuple, filas: list[dict]):
+    """INSERT ... que, si la fila ya existe, suma los valores en vez de fallar"""
+    tabla = modelo.__table__
+    sumas = [c.name for c in tabla.columns if c.name not in claves]
+    if session.bind.dialect.name == "mysql":
+        sentencia = mysql_insert(tabla)
+        sentencia = sentencia.on_duplicate_key_update(
+            {c: tabla.c[c] + sentencia.inserted[c] for c in sumas}
+        )
+    else:
+        sentencia = sqlite_insert(tabla)
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=list(claves),
+            set_={c: tabla.c[c] + sentencia.excluded[c] for c in sumas},
+        )
+    return session.exec(sentencia, params=filas)
+
+async def sumar_compra(session: AsyncSession, fecha, total: float, signo: int = 1):
+    """Suma (o resta con signo=-1) una compra al resumen diario"""
+    fecha = a_fecha(fecha)
+    if fecha is None:
+        return
+    await _upsert_suma(
+        session, ResumenCompraDiaria, ("fecha",),
+        [{"fecha": fecha, "compras": signo, "total": signo * (total or 0)}],
+    )
+
+async def sumar_detalles(session: AsyncSession, fecha, detalles: Iterable[tuple], signo: int = 1):
+    """Suma al resumen diario lineas (id_variante, cantidad, subtotal) de una fecha"""
+    fecha = a_fecha(fecha)
+    if fecha is None:
+        return
+    acumulado = defaultdict(lambda: [0, 0.0])
+    for id_variante, cantidad, subtotal in detalles:
+        if id_variante is None:
+            continue
+        acumulado[id_variante][0] += cantidad or 0
+        acumulado[id_variante][1] += subtotal or 0
+    if not acumulado:
+        return
+    _marcar_ventas(session)
+    await _upsert_suma(
+        session, ResumenVentaDiaria, ("fecha", "id_variante"),
+        [
+            {"fecha": fecha, "id_variante": id_variante, "unidades": signo * unidades, "ingresos": signo * ingresos}
+            for id_variante, (unidades, ingresos) in acumulado.items()
+        ],
+    )
+
+def _lineas(detalles: Iterable[tuple]) -> list[list]:
+    # Las filas de detalles_de_compra no son tuplas: json las volveria texto
+    return [list(detalle) for detalle in detalles]
+
+def encolar_resumen_compra(
+    session: AsyncSession, fecha, total: float, detalles: Iterable[tuple] = (), signo: int = 1,
+):
+    """Deja la suma de una compra a la cola de tareas (fuera de la peticion).
+
+    Con signo=-1 la resta: compra borrada o valores anteriores de una edicion.
+    """
+    fecha = a_fecha(fecha)
+    if fecha is None:
+        return
+    encolar(session, "resumen_compra", {
+        "fecha": fecha.isoformat(), "total": total, "detalles": _lineas(detalles), "signo": signo,
+    })
+
+def encolar_resumen_detalles(session: AsyncSession, fecha, detalles: Iterable[tuple], signo: int = 1):
+    """Como encolar_resumen_compra, pero solo lineas: no cambia el conteo de compras"""
+    fecha = a_fecha(fecha)
+    detalles = _lineas(detalles)
+    if fecha is None or not detalles:
+        return
+    encolar(session, "resumen_detalles", {"fecha": fecha.isoformat(), "detalles": detalles, "signo": signo})
+
+@tarea("resumen_compra")
+async def _resumir_compra(session: AsyncSession, datos: dict):
+    # Las tareas encoladas antes de existir "signo" siempre sumaban
+    signo = datos.get("signo", 1)
+    await sumar_compra(session, datos["fecha"], datos["total"], signo)
+    await sumar_detalles(session, datos["fecha"], datos["detalles"], signo)
+
+@tarea("resumen_detalles")
+async def _resumir_detalles(session: AsyncSession, datos: dict):
+    await sumar_detalles(session, datos["fecha"], datos["detalles"], datos["signo"])
+
+async def detalles_de_compra(session: AsyncSession, id_compra: int) -> list[tuple]:
+    """Lineas de una compra agrupadas por variante (usa el indice de id_compra)"""
+    resultado = await session.exec(
+        select(DetalleCompra.id_variante, func.sum(DetalleCompra.cantidad), func.sum(DetalleCompra.subtotal))
+        .where(DetalleCompra.id_compra == id_compra)
+        .group_by(DetalleCompra.id_variante)
+    )
+    return resultado.all()
+
+async def reconstruir_resumenes(session: AsyncSession):
+    """Recalcula ambos resumenes desde las tablas de compras, archivo incluido (carga inicial)"""
+    compras = con_archivo(Compra, CompraArchivada)
+    detalles = con_archivo(DetalleCompra, DetalleCompraArchivado)
+    _marcar_ventas(session)
+    await session.exec(delete(ResumenCompraDiaria))
+    await session.exec(delete(ResumenVentaDiaria))
+    await session.exec(
+        insert(ResumenCompraDiaria).from_select(
+            ["fecha", "compras", "total"],
+            select(compras.fecha, func.count(compras.id), func.coalesce(func.sum(compras.total), 0))
+            .group_by(compras.fecha),
+        )
+    )
+    await session.exec(
+        insert(ResumenVentaDiaria).from_select(
+            ["fecha", "id_variante", "unidades", "ingresos"],
+            select(
+                compras.fecha, detalles.id_variante,
+                func.coalesce(func.sum(detalles.cantidad), 0),
+                func.coalesce(func.sum(detalles.subtotal), 0),
+            )
+            .select_from(detalles)
+            .join(compras, detalles.id_compra == compras.id)
+            .where(detalles.id_variante.is_not(None))
+            .group_by(compras.fecha, detalles.id_variante),
+        )
+    )
@@ -1,9 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cambiar BCRYPT_ROUNDS hace que los hashes antiguos se regeneren en el
+# siguiente login correcto (ver verify_and_update_password)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt se ejecuta en un pool de procesos propio: una rafaga de logins usa
+# como mucho HASH_WORKERS nucleos y, pasado HASH_MAX_PENDIENTES trabajos en
+# cola, se responde 503 en vez de acumular peticiones
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_PENDIENTES = int(os.getenv("HASH_MAX_PENDIENTES", "32"))
+# Prioridad (nice) de los procesos de hashing: con pocos nucleos el proceso
+# web tiene preferencia sobre bcrypt y el resto de rutas no se degrada
+HASH_NICE = int(os.getenv("HASH_NICE", "10"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pendientes = 0
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
+
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """Verifica y, si el hash usa un coste distinto al actual, devuelve uno nuevo"""
+    return pwd_context.verify_and_update(plain, hashed)
+
+def _bajar_prioridad():
+    if HASH_NICE and hasattr(os, "nice"):
+        os.nice(HASH_NICE)
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: los hijos no heredan conexiones ni hilos del proceso web
+        _executor = ProcessPoolExecutor(
+            max_workers=HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_bajar_prioridad,
+        )
+    return _executor
+
+async def _en_pool(fn, *args):
+    global _pendientes
+    if _pendientes >= HASH_MAX_PENDIENTES:
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio de autenticación saturado, reintente en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+    _pendientes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pendientes -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _en_pool(hash_password, password)
+
+async def verify_and_update_password_async(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    return await _en_pool(verify_and_update_password, plain, hashed)
+
+def cerrar_pool_hash():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
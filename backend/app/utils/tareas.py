@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import delete, event, inspect, update
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.tarea import Tarea
+
+logger = logging.getLogger("app.tareas")
+
+# Cola de tareas en proceso para los efectos secundarios de una escritura
+# (resumenes, alertas de stock...). La ruta solo inserta la fila de la tarea
+# en su propia transaccion; al hacer commit se avisa a la cola y un worker la
+# ejecuta fuera de la peticion. Como la tarea esta en la BD, sobrevive a un
+# reinicio: el sondeo periodico recoge lo que quede pendiente.
+
+TAREAS_WORKERS = int(os.getenv("TAREAS_WORKERS", "2"))
+TAREAS_COLA_MAX = int(os.getenv("TAREAS_COLA_MAX", "1000"))
+TAREAS_REINTENTOS = int(os.getenv("TAREAS_REINTENTOS", "5"))
+# Espera antes del reintento n: TAREAS_BACKOFF_S * 2^(n-1)
+TAREAS_BACKOFF_S = float(os.getenv("TAREAS_BACKOFF_S", "1"))
+# Cada cuanto se buscan en la BD tareas pendientes (reinicios, reintentos, cola llena)
+TAREAS_SONDEO_S = float(os.getenv("TAREAS_SONDEO_S", "5"))
+# Plazo de un worker para terminar una tarea tomada; si se cae, otro la retoma
+TAREAS_PLAZO_S = float(os.getenv("TAREAS_PLAZO_S", "60"))
+# Tiempo maximo para vaciar la cola al apagar
+TAREAS_DRENAR_S = float(os.getenv("TAREAS_DRENAR_S", "10"))
+
+Manejador = Callable[[AsyncSession, dict], Awaitable[None]]
+_manejadores: dict[str, Manejador] = {}
+
+
+def tarea(tipo: str):
+    """Registra el manejador de un tipo de tarea.
+
+    El manejador recibe una sesion propia y los datos de la tarea; sus
+    escrituras se confirman junto con el borrado de la tarea, asi un
+    reintento nunca aplica dos veces el mismo efecto.
+    """
+    def registrar(funcion: Manejador) -> Manejador:
+        _manejadores[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(session: AsyncSession, tipo: str, datos: dict) -> Tarea:
+    """Añade la tarea a la transaccion de la sesion; se ejecuta despues del commit"""
+    if tipo not in _manejadores:
+        raise ValueError(f"tipo de tarea desconocido: {tipo}")
+    nueva = Tarea(tipo=tipo, datos=json.dumps(datos, default=str))
+    session.add(nueva)
+    session.sync_session.info.setdefault("tareas", []).append(nueva)
+    return nueva
+
+
+@event.listens_for(Session, "after_commit")
+def _avisar_tareas(session: Session):
+    # La clave primaria sale de la identidad del objeto: no hace falta
+    # recargar atributos (ya expirados) dentro del commit
+    for nueva in session.info.pop("tareas", ()):
+        identidad = inspect(nueva).identity
+        if identidad:
+            cola_tareas.avisar(identidad[0])
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tareas(session: Session):
+    session.info.pop("tareas", None)
+
+
+class ColaTareas:
+    def __init__(self):
+        self._engine = None
+        self._cola: Optional[asyncio.Queue] = None
+        self._en_cola: set[int] = set()
+        self._workers: list[asyncio.Task] = []
+        self._sondeo: Optional[asyncio.Task] = None
+        self.completadas = 0
+        self.reintentos = 0
+        self.fallidas = 0
+        # Tareas que otro worker retomo mientras este aun las ejecutaba
+        self.relevadas = 0
+
+    def iniciar(self, engine, workers: int = TAREAS_WORKERS):
+        self._engine = engine
+        self._cola = asyncio.Queue(maxsize=TAREAS_COLA_MAX)
+        self._workers = [asyncio.create_task(self._trabajar()) for _ in range(workers)]
+        if workers:
+            self._sondeo = asyncio.create_task(self._sondear())
+
+    def avisar(self, id_tarea: int):
+        """Pone la tarea en la cola; si esta llena (o parada), la recoge el sondeo"""
+        if self._cola is None or id_tarea in self._en_cola:
+            return
+        try:
+            self._cola.put_nowait(id_tarea)
+        except asyncio.QueueFull:
+            return
+        self._en_cola.add(id_tarea)
+
+    async def detener(self, espera: float = TAREAS_DRENAR_S):
+        """Deja de sondear y espera a que se vacie la cola; lo que no termine
+        queda pendiente en la BD para el proximo arranque"""
+        if self._cola is None:
+            return
+        if self._sondeo is not None:
+            self._sondeo.cancel()
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._cola.join(), espera)
+            except asyncio.TimeoutError:
+                logger.warning(json.dumps({"evento": "tareas_sin_drenar", "en_cola": self._cola.qsize()}))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._cola, self._workers, self._sondeo = None, [], None
+        self._en_cola.clear()
+
+    async def _trabajar(self):
+        while True:
+            id_tarea = await self._cola.get()
+            self._en_cola.discard(id_tarea)
+            try:
+                await self.ejecutar(id_tarea)
+            except Exception:
+                logger.exception("error ejecutando la tarea %s", id_tarea)
+            finally:
+                self._cola.task_done()
+
+    async def _sondear(self):
+        while True:
+            await asyncio.sleep(TAREAS_SONDEO_S)
+            try:
+                await self.recoger_pendientes()
+            except Exception:
+                logger.exception("error buscando tareas pendientes")
+
+    async def recoger_pendientes(self):
+        libres = self._cola.maxsize - self._cola.qsize()
+        if libres <= 0:
+            return
+        async with AsyncSession(self._engine) as session:
+            ids = (await session.exec(
+                select(Tarea.id)
+                .where(Tarea.estado != "fallida", Tarea.proximo_intento <= datetime.datetime.now())
+                .order_by(Tarea.proximo_intento)
+                .limit(libres)
+            )).all()
+        for id_tarea in ids:
+            self.avisar(id_tarea)
+
+    async def ejecutar(self, id_tarea: int):
+        ahora = datetime.datetime.now()
+        async with AsyncSession(self._engine) as session:
+            # Se toma la tarea con un UPDATE condicional: si otro worker (u otro
+            # proceso) ya la tomo, no se actualiza ninguna fila
+            tomada = await session.exec(
+                update(Tarea)
+                .where(Tarea.id == id_tarea, Tarea.estado != "fallida", Tarea.proximo_intento <= ahora)
+                .values(
+                    estado="en_curso",
+                    intentos=Tarea.intentos + 1,
+                    proximo_intento=ahora + datetime.timedelta(seconds=TAREAS_PLAZO_S),
+                )
+            )
+            if tomada.rowcount != 1:
+                await session.rollback()
+                return
+            await session.commit()
+            fila = await session.get(Tarea, id_tarea)
+            tipo, datos, intentos = fila.tipo, fila.datos, fila.intentos
+
+            try:
+                await _manejadores[tipo](session, json.loads(datos))
+                # Solo si la tarea sigue siendo de este intento: si el manejador
+                # paso de TAREAS_PLAZO_S, otro worker la retomo y sus efectos
+                # son los que valen; los de este se deshacen
+                borrada = await session.exec(
+                    delete(Tarea).where(Tarea.id == id_tarea, Tarea.intentos == intentos)
+                )
+                if borrada.rowcount == 0:
+                    await session.rollback()
+                    self.relevadas += 1
+                    logger.warning(json.dumps({
+                        "evento": "tarea_relevada", "id": id_tarea, "tipo": tipo, "intentos": intentos,
+                    }))
+                    return
+                await session.commit()
+                self.completadas += 1
+            except Exception as error:
+                await session.rollback()
+                await self._fallar(session, id_tarea, tipo, intentos, error)
+
+    async def _fallar(self, session: AsyncSession, id_tarea: int, tipo: str, intentos: int, error: Exception):
+        agotada = intentos >= TAREAS_REINTENTOS
+        espera = TAREAS_BACKOFF_S * 2 ** (intentos - 1)
+        await session.exec(
+            update(Tarea)
+            .where(Tarea.id == id_tarea, Tarea.intentos == intentos)
+            .values(
+                estado="fallida" if agotada else "pendiente",
+                proximo_intento=datetime.datetime.now() + datetime.timedelta(seconds=espera),
+                error=repr(error)[:1000],
+            )
+        )
+        await session.commit()
+        if agotada:
+            self.fallidas += 1
+        else:
+            self.reintentos += 1
+        logger.warning(json.dumps({
+            "evento": "tarea_fallida" if agotada else "tarea_reintento",
+            "id": id_tarea, "tipo": tipo, "intentos": intentos, "error": repr(error)[:200],
+        }))
+
+    def estadisticas(self) -> dict:
+        return {
+            "activa": self._cola is not None,
+            "workers": len(self._workers),
+            "en_cola": self._cola.qsize() if self._cola is not None else 0,
+            "completadas": self.completadas,
+            "reintentos": self.reintentos,
+            "fallidas": self.fallidas,
+            "relevadas": self.relevadas,
+        }
+
+
+cola_tareas = ColaTareas()
@@ -0,0 +1 @@
+# Scripts de carga y benchmarks del backend (no se importan desde la app)
@@ -0,0 +1,113 @@
+"""Compara el throughput del camino async contra el sync equivalente.
+
+Levanta la app en proceso (httpx + ASGITransport) sobre la base indicada en
+DATABASE_URL, siembra variantes y lanza muchas peticiones concurrentes a dos
+rutas con la misma consulta (la de GET /variantes, sin su cache): una async
+con AsyncSession y otra sync que usa el Session bloqueante y el threadpool
+de Starlette.
+
+Con una concurrencia mayor que el threadpool (40 hilos) el camino sync se
+queda esperando conexiones del pool: esas peticiones se cuentan como errores
+al superar TIMEOUT segundos.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.async_vs_sync --concurrencia 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_async.db")
+# Todo el trafico sale de un solo cliente: sin limite de tasa ni admision
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+
+import httpx
+from fastapi import Depends
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_engine, get_async_session, get_engine, get_session, init_db
+from app.main import app
+from app.models.categoria import Categoria
+from app.models.producto import Producto
+from app.models.variante import Variante
+from app.schemas.negocio_schema import VarianteRead
+from app.utils.carga import opciones_carga
+
+
+# Las dos rutas hacen la misma consulta en cada peticion. GET /variantes no
+# sirve de lado async: sale de cache_catalogo y mediria aciertos de cache
+# contra idas a la BD.
+
+def consulta_variantes(limit: int):
+    return (
+        select(Variante)
+        .options(*opciones_carga(Variante, VarianteRead))
+        .where(Variante.activo == True)
+        .order_by(Variante.id)
+        .limit(limit)
+    )
+
+
+@app.get("/_bench/variantes_async", response_model=list[VarianteRead], include_in_schema=False)
+async def variantes_async(limit: int = 50, session: AsyncSession = Depends(get_async_session)):
+    return (await session.exec(consulta_variantes(limit))).all()
+
+
+@app.get("/_bench/variantes_sync", response_model=list[VarianteRead], include_in_schema=False)
+def variantes_sync(limit: int = 50, session: Session = Depends(get_session)):
+    return session.exec(consulta_variantes(limit)).all()
+
+
+def sembrar(n_variantes: int):
+    init_db()
+    with Session(get_engine()) as session:
+        if session.exec(select(Variante).limit(1)).first():
+            return
+        categoria = Categoria(nombre="Bench")
+        producto = Producto(nombre="Bench", descripcion="bench", categoria=categoria)
+        session.add(producto)
+        session.flush()
+        session.add_all(
+            Variante(precio=10 + i % 50, imagen="", stock=100, cantidad=1, id_producto=producto.id)
+            for i in range(n_variantes)
+        )
+        session.commit()
+
+
+TIMEOUT = 10
+
+
+async def medir(url: str, total: int, concurrencia: int) -> tuple[float, int]:
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def una():
+            async with semaforo:
+                # ASGITransport no aplica timeouts: se acota cada peticion aqui
+                r = await asyncio.wait_for(cliente.get(url, params={"limit": 50}), TIMEOUT)
+                r.raise_for_status()
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(una() for _ in range(total)), return_exceptions=True)
+        errores = sum(isinstance(r, Exception) for r in resultados)
+        return (total - errores) / (time.perf_counter() - inicio), errores
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument("--variantes", type=int, default=1000)
+    args = parser.parse_args()
+
+    sembrar(args.variantes)
+    for nombre, url in (("async", "/_bench/variantes_async"), ("sync", "/_bench/variantes_sync")):
+        rps, errores = await medir(url, args.peticiones, args.concurrencia)
+        print(f"{nombre:>5}: {rps:8.1f} req/s  errores={errores}  (concurrencia={args.concurrencia})")
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""Latencia de /productos/search y /productos/autocomplete con muchos productos.
+
+Los nombres combinan marcas poco frecuentes (unos 50 productos por marca) con
+tipos y estilos que aparecen en mas del 10% del catalogo; la busqueda se mide
+por separado para terminos selectivos y amplios, porque el ranking por
+relevancia tiene que puntuar cada coincidencia.
+
+    DATABASE_URL=sqlite:///bench_busqueda.db python -m benchmarks.busqueda --productos 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_busqueda.db")
+# Todo el trafico sale de un solo cliente: sin limite de tasa ni admision
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+
+import httpx
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+
+from app.database import get_async_engine, get_engine, init_db
+from app.main import app
+from app.models.categoria import Categoria
+from app.models.producto import Producto
+from benchmarks.comun import percentil
+
+SILABAS = ["ca", "ta", "vi", "ro", "que", "lo", "ber", "na", "za", "pa", "chi", "bas", "ol", "mu", "ten", "gar"]
+TIPOS = ["Ron", "Whisky", "Pisco", "Vodka", "Vino", "Gin", "Tequila", "Cerveza"]
+ESTILOS = ["Black", "Etiqueta Negra", "Quebranta", "Acholado", "Reserva", "Añejo", "Blanco", "Rosé"]
+
+
+def sembrar(n_productos: int):
+    init_db()
+    with Session(get_engine()) as session:
+        existentes = session.exec(select(func.count(Producto.id))).one()
+        if existentes >= n_productos:
+            return
+        if not session.exec(select(Categoria)).first():
+            session.add_all(Categoria(nombre=t) for t in TIPOS)
+            session.flush()
+        rnd = random.Random(existentes)
+        filas = [
+            {
+                "nombre": f"{marca(i // 50).title()} {rnd.choice(ESTILOS)} {i}",
+                "descripcion": f"{rnd.choice(TIPOS).lower()} de {rnd.choice(['Perú', 'Escocia', 'México'])}",
+                "id_categoria": rnd.randint(1, len(TIPOS)),
+            }
+            for i in range(existentes, n_productos)
+        ]
+        session.exec(insert(Producto), params=filas)
+        session.commit()
+
+
+def marca(n: int) -> str:
+    """Nombre de marca sintetico y estable para el numero n"""
+    letras = []
+    for _ in range(3):
+        n, resto = divmod(n, len(SILABAS))
+        letras.append(SILABAS[resto])
+    return "".join(letras)
+
+
+async def medir(cliente: httpx.AsyncClient, ruta: str, consultas: list[dict]) -> list[float]:
+    latencias = []
+    for params in consultas:
+        inicio = time.perf_counter()
+        r = await cliente.get(ruta, params=params)
+        r.raise_for_status()
+        latencias.append(1000 * (time.perf_counter() - inicio))
+    return latencias
+
+
+async def main(args):
+    sembrar(args.productos)
+    rnd = random.Random(0)
+    selectivos = [marca(rnd.randrange(args.productos // 50)) for _ in range(50)]
+    amplios = [t.lower() for t in TIPOS] + ["negra", "quebranta"]
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        # La primera llamada carga el indice de prefijos en memoria
+        inicio = time.perf_counter()
+        await cliente.get("/productos/autocomplete", params={"prefix": "a"})
+        print(f"carga del indice de prefijos: {1000 * (time.perf_counter() - inicio):.1f} ms")
+
+        casos = {
+            "search (selectivo)": ("/productos/search", [{"q": rnd.choice(selectivos)} for _ in range(args.peticiones)]),
+            "search (amplio)": ("/productos/search", [{"q": rnd.choice(amplios)} for _ in range(args.peticiones)]),
+            "autocomplete": (
+                "/productos/autocomplete",
+                [{"prefix": rnd.choice(selectivos + amplios)[:3]} for _ in range(args.peticiones)],
+            ),
+        }
+        for nombre, (ruta, consultas) in casos.items():
+            latencias = await medir(cliente, ruta, consultas)
+            print(
+                f"{nombre:20} p50={percentil(latencias, 50):6.2f} ms  "
+                f"p95={percentil(latencias, 95):6.2f} ms  p99={percentil(latencias, 99):6.2f} ms"
+            )
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=100_000)
+    parser.add_argument("--peticiones", type=int, default=300)
+    asyncio.run(main(parser.parse_args()))
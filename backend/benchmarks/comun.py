@@ -0,0 +1,18 @@
+"""Utilidades compartidas por los benchmarks"""
+import statistics
+
+
+def percentil(muestras: list[float], p: float) -> float:
+    return statistics.quantiles(muestras, n=100)[int(p) - 1] if len(muestras) > 1 else muestras[0]
+
+
+def resumen_latencias(muestras: list[float]) -> dict:
+    """p50/p95/p99 y maximo en milisegundos"""
+    if not muestras:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(percentil(muestras, 50), 3),
+        "p95_ms": round(percentil(muestras, 95), 3),
+        "p99_ms": round(percentil(muestras, 99), 3),
+        "max_ms": round(max(muestras), 3),
+    }
@@ -0,0 +1,182 @@
+"""Generador de datos sinteticos y reproducibles para los benchmarks.
+
+Siembra categorias, productos, variantes, usuarios y compras con detalles en
+la base de DATABASE_URL (SQLite o MySQL local). La misma semilla produce
+siempre los mismos datos. Todos los usuarios tienen la contraseña
+CONTRASENA y correo usuarioN@bench.pe.
+
+    DATABASE_URL=sqlite:///bench_suite.db python -m benchmarks.datos --productos 10000
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_suite.db")
+
+from sqlalchemy import func, insert
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_engine, get_engine, init_db
+from app.models.categoria import Categoria
+from app.models.compra import Compra
+from app.models.detalle_compra import DetalleCompra
+from app.models.producto import Producto
+from app.models.usuario import Usuario
+from app.models.variante import Variante
+from app.utils.resumenes import reconstruir_resumenes
+from app.utils.security import hash_password
+
+CONTRASENA = "bench"
+LOTE = 5000
+
+VOLUMENES = {
+    "categorias": 20,
+    "productos": 2000,
+    "variantes_por_producto": 3,
+    "usuarios": 500,
+    "compras": 20000,
+    "max_items_compra": 4,
+}
+
+TIPOS = ["Ron", "Whisky", "Pisco", "Vodka", "Vino", "Gin", "Tequila", "Cerveza", "Licor", "Espumante"]
+ESTILOS = ["Black", "Etiqueta Negra", "Quebranta", "Acholado", "Reserva", "Añejo", "Blanco", "Rosé", "Gold", "Extra"]
+SILABAS = ["ca", "ta", "vi", "ro", "que", "lo", "ber", "na", "za", "pa", "chi", "bas", "ol", "mu", "ten", "gar"]
+MEDIDAS = [(375, 1), (750, 1), (1000, 1), (750, 6), (355, 12)]
+
+
+def correo(n: int) -> str:
+    return f"usuario{n}@bench.pe"
+
+
+def marca(n: int) -> str:
+    """Nombre de marca sintetico y estable para el numero n"""
+    letras = []
+    for _ in range(3):
+        n, resto = divmod(n, len(SILABAS))
+        letras.append(SILABAS[resto])
+    return "".join(letras).title()
+
+
+def variante_activa(id_variante: int) -> bool:
+    """Una de cada 20 variantes se siembra inactiva"""
+    return id_variante % 20 != 0
+
+
+def _insertar(session: Session, modelo, filas):
+    for i in range(0, len(filas), LOTE):
+        session.exec(insert(modelo), params=filas[i:i + LOTE])
+
+
+def sembrar(volumenes: dict, semilla: int = 0, recrear: bool = False) -> bool:
+    """Siembra la base; devuelve False si ya tenia datos y no se pidio recrear"""
+    if recrear:
+        SQLModel.metadata.drop_all(get_engine())
+        if get_engine().dialect.name == "sqlite":
+            # El indice FTS5 de SQLite no esta en los metadatos
+            with get_engine().begin() as conn:
+                conn.exec_driver_sql("DROP TABLE IF EXISTS producto_fts")
+    init_db()
+    rnd = random.Random(semilla)
+    with Session(get_engine()) as session:
+        if session.exec(select(func.count(Producto.id))).one():
+            return False
+
+        n_categorias = volumenes["categorias"]
+        _insertar(session, Categoria, [
+            {"id": i + 1, "nombre": f"{TIPOS[i % len(TIPOS)]} {i // len(TIPOS) or ''}".strip()}
+            for i in range(n_categorias)
+        ])
+
+        n_productos = volumenes["productos"]
+        _insertar(session, Producto, [
+            {
+                "id": i + 1,
+                "nombre": f"{marca(i // 20)} {rnd.choice(ESTILOS)} {i}",
+                "descripcion": f"{rnd.choice(TIPOS).lower()} de {rnd.choice(['Perú', 'Escocia', 'México', 'Chile'])}",
+                "id_categoria": rnd.randint(1, n_categorias),
+            }
+            for i in range(n_productos)
+        ])
+
+        variantes = []
+        for id_producto in range(1, n_productos + 1):
+            for ml, unidades in rnd.sample(MEDIDAS, volumenes["variantes_por_producto"]):
+                variantes.append({
+                    "id": len(variantes) + 1,
+                    "precio": round(rnd.uniform(8, 400) * unidades, 2),
+                    "imagen": f"/img/{id_producto}_{ml}x{unidades}.jpg",
+                    "stock": rnd.randint(500, 5000),
+                    "cantidad": unidades,
+                    "activo": variante_activa(len(variantes) + 1),
+                    "id_producto": id_producto,
+                })
+        _insertar(session, Variante, variantes)
+
+        # Un solo hash para todos: bcrypt es caro y el login lo verifica igual
+        contrasena = hash_password(CONTRASENA)
+        hoy = datetime.date.today()
+        _insertar(session, Usuario, [
+            {
+                "id": n + 1, "nombres": f"Usuario {n}", "apellidos": "Bench", "correo": correo(n),
+                "contrasena": contrasena, "dni": f"{10000000 + n}",
+                "fecha_registro": hoy - datetime.timedelta(days=rnd.randrange(730)),
+            }
+            for n in range(volumenes["usuarios"])
+        ])
+
+        compras, detalles = [], []
+        for id_compra in range(1, volumenes["compras"] + 1):
+            total = 0.0
+            for variante in rnd.sample(variantes, rnd.randint(1, volumenes["max_items_compra"])):
+                cantidad = rnd.randint(1, 3)
+                subtotal = round(variante["precio"] * cantidad, 2)
+                total += subtotal
+                detalles.append({
+                    "cantidad": cantidad, "subtotal": subtotal,
+                    "id_compra": id_compra, "id_variante": variante["id"],
+                })
+            compras.append({
+                "id": id_compra,
+                "fecha": hoy - datetime.timedelta(days=rnd.randrange(365)),
+                "total": round(total, 2),
+                "id_usuario": rnd.randint(1, volumenes["usuarios"]),
+            })
+        _insertar(session, Compra, compras)
+        _insertar(session, DetalleCompra, detalles)
+        session.commit()
+
+    asyncio.run(_reconstruir())
+    return True
+
+
+async def _reconstruir():
+    async with AsyncSession(get_async_engine()) as session:
+        await reconstruir_resumenes(session)
+        await session.commit()
+    await get_async_engine().dispose()
+
+
+def argumentos_volumen(parser: argparse.ArgumentParser):
+    for nombre, valor in VOLUMENES.items():
+        parser.add_argument(f"--{nombre.replace('_', '-')}", type=int, default=valor)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--recrear", action="store_true", help="borra las tablas y vuelve a sembrar")
+
+
+def volumenes_de(args) -> dict:
+    return {nombre: getattr(args, nombre) for nombre in VOLUMENES}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos_volumen(parser)
+    args = parser.parse_args()
+    inicio = time.perf_counter()
+    if sembrar(volumenes_de(args), args.semilla, args.recrear):
+        print(f"datos sembrados en {time.perf_counter() - inicio:.1f} s")
+    else:
+        print("la base ya tiene datos (use --recrear para sembrar de nuevo)")
@@ -0,0 +1,102 @@
+"""Latencia del catalogo durante una rafaga de logins.
+
+Mide GET /productos sin carga y luego mientras varios clientes hacen login
+en bucle. Con bcrypt en el pool de procesos el event loop sigue libre, asi
+que la latencia del catalogo deberia mantenerse; los logins que exceden la
+cola (HASH_MAX_PENDIENTES) reciben 503.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.login_flood --logins 64
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_login.db")
+# Todo el trafico sale de un solo cliente: sin limite de tasa ni admision
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+
+import httpx
+from sqlmodel import Session, select
+
+from app.database import get_async_engine, get_engine, init_db
+from app.main import app
+from app.models.categoria import Categoria
+from app.models.producto import Producto
+from app.models.usuario import Usuario
+from app.utils.security import cerrar_pool_hash, hash_password
+from benchmarks.comun import percentil
+
+CORREO = "bench@licoreria.pe"
+CONTRASENA = "bench"
+
+
+def sembrar(n_productos: int):
+    init_db()
+    with Session(get_engine()) as session:
+        if session.exec(select(Usuario).where(Usuario.correo == CORREO)).first():
+            return
+        session.add(Usuario(
+            nombres="Bench", apellidos="Bench", correo=CORREO,
+            contrasena=hash_password(CONTRASENA), dni="00000000",
+        ))
+        categoria = Categoria(nombre="Bench")
+        session.add_all(
+            Producto(nombre=f"Producto {i}", descripcion="bench", categoria=categoria)
+            for i in range(n_productos)
+        )
+        session.commit()
+
+
+async def medir_catalogo(cliente: httpx.AsyncClient, n: int) -> list[float]:
+    latencias = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        r = await cliente.get("/productos", params={"limit": 50})
+        r.raise_for_status()
+        latencias.append(1000 * (time.perf_counter() - inicio))
+    return latencias
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peticiones", type=int, default=300)
+    parser.add_argument("--logins", type=int, default=64, help="clientes haciendo login en bucle")
+    parser.add_argument("--productos", type=int, default=500)
+    args = parser.parse_args()
+
+    sembrar(args.productos)
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        base = await medir_catalogo(cliente, args.peticiones)
+
+        resultados = {"ok": 0, "503": 0}
+        parar = asyncio.Event()
+
+        async def login_en_bucle():
+            while not parar.is_set():
+                r = await cliente.post("/auth/login", json={"correo": CORREO, "contrasena": CONTRASENA})
+                clave = "503" if r.status_code == 503 else "ok"
+                resultados[clave] += 1
+                if r.status_code == 503:
+                    await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+
+        rafaga = [asyncio.create_task(login_en_bucle()) for _ in range(args.logins)]
+        await asyncio.sleep(0.5)
+        bajo_carga = await medir_catalogo(cliente, args.peticiones)
+        parar.set()
+        await asyncio.gather(*rafaga)
+
+    for nombre, muestras in (("sin carga", base), ("con logins", bajo_carga)):
+        print(
+            f"{nombre:>11}: p50={percentil(muestras, 50):7.2f} ms  "
+            f"p95={percentil(muestras, 95):7.2f} ms  p99={percentil(muestras, 99):7.2f} ms"
+        )
+    print(f"logins: {resultados['ok']} atendidos, {resultados['503']} rechazados con 503")
+
+    cerrar_pool_hash()
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+"""Tiempo de /reportes/reposicion con 10k variantes y 2 años de ventas.
+
+Siembra 10k variantes y una historia sintetica de ventas diarias en
+resumen_venta_diaria (cada variante vende en ~40% de los dias), y mide:
+
+- el reporte en frio (cache de reportes vaciado en cada repeticion),
+- el reporte en caliente (demanda en cache, solo se relee el stock),
+- la demanda agregada en la BD (lo que usa el reporte) contra traer todas
+  las filas diarias y acumularlas con un bucle de Python por fila.
+
+    DATABASE_URL=sqlite:///bench_reposicion.db python -m benchmarks.reposicion --repeticiones 5
+"""
+import argparse
+import asyncio
+import datetime
+import math
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_reposicion.db")
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+os.environ.setdefault("SQL_LOG_PETICIONES", "0")
+
+import httpx
+import numpy as np
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_engine, get_engine
+from app.main import app
+from app.models.resumen_venta import ResumenVentaDiaria
+from app.utils.cache import cache_reportes
+from app.utils.reposicion import _demanda
+from benchmarks.comun import percentil
+from benchmarks.datos import VOLUMENES, sembrar
+
+DIAS = 730
+LOTE = 50_000
+
+
+def sembrar_historia(variantes: int, dias: int, densidad: float, semilla: int = 0):
+    """Reemplaza resumen_venta_diaria por `dias` de ventas sinteticas"""
+    rnd = np.random.default_rng(semilla)
+    hoy = datetime.date.today()
+    # Demanda media distinta por variante (unas pocas venden mucho)
+    tasas = rnd.gamma(0.8, 3.0, size=variantes)
+    with Session(get_engine()) as session:
+        session.exec(ResumenVentaDiaria.__table__.delete())
+        for dia in range(dias):
+            venden = np.flatnonzero(rnd.random(variantes) < densidad)
+            unidades = rnd.poisson(tasas[venden] / densidad) + 1
+            fecha = hoy - datetime.timedelta(days=dia)
+            filas = [
+                {"fecha": fecha, "id_variante": int(i) + 1, "unidades": int(u), "ingresos": 0.0}
+                for i, u in zip(venden, unidades)
+            ]
+            for i in range(0, len(filas), LOTE):
+                session.exec(insert(ResumenVentaDiaria), params=filas[i:i + LOTE])
+        session.commit()
+
+
+async def demanda_con_bucle(dias: int) -> dict:
+    """La misma suma y suma de cuadrados, fila a fila en Python"""
+    hoy = datetime.date.today()
+    suma, cuadrados = {}, {}
+    async with AsyncSession(get_async_engine()) as session:
+        resultado = await session.stream(
+            select(ResumenVentaDiaria.id_variante, ResumenVentaDiaria.unidades)
+            .where(ResumenVentaDiaria.fecha >= hoy - datetime.timedelta(days=dias - 1))
+            .execution_options(yield_per=LOTE)
+        )
+        async for particion in resultado.partitions():
+            for id_variante, unidades in particion:
+                suma[id_variante] = suma.get(id_variante, 0) + unidades
+                cuadrados[id_variante] = cuadrados.get(id_variante, 0) + unidades * unidades
+    return {
+        i: (suma[i] / dias, math.sqrt(max(cuadrados[i] / dias - (suma[i] / dias) ** 2, 0)))
+        for i in suma
+    }
+
+
+async def demanda_agregada(dias: int):
+    hoy = datetime.date.today()
+    async with AsyncSession(get_async_engine()) as session:
+        return await _demanda(session, hoy - datetime.timedelta(days=dias - 1), hoy)
+
+
+async def medir(funcion, repeticiones: int, antes=None) -> dict:
+    latencias, cpu = [], 0.0
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        resultado = await funcion()
+        cpu += time.process_time() - inicio_cpu
+        latencias.append(1000 * (time.perf_counter() - inicio))
+    return {
+        "p50_ms": round(percentil(latencias, 50), 1),
+        "cpu_ms": round(1000 * cpu / repeticiones, 1),
+        "resultado": resultado,
+    }
+
+
+async def main(args):
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+        async def reporte():
+            r = await cliente.get("/reportes/reposicion", params={"dias": DIAS})
+            r.raise_for_status()
+            return len(r.json())
+
+        frio = await medir(reporte, args.repeticiones, antes=cache_reportes.limpiar)
+        caliente = await medir(reporte, args.repeticiones)
+    print(f"reporte en frio      variantes={frio['resultado']:6}  p50={frio['p50_ms']:8} ms  cpu={frio['cpu_ms']:8} ms")
+    print(f"reporte en caliente  variantes={caliente['resultado']:6}  p50={caliente['p50_ms']:8} ms  cpu={caliente['cpu_ms']:8} ms")
+
+    agregada = await medir(lambda: demanda_agregada(DIAS), args.repeticiones)
+    bucle = await medir(lambda: demanda_con_bucle(DIAS), args.repeticiones)
+    print(f"demanda agregada     p50={agregada['p50_ms']:8} ms  cpu={agregada['cpu_ms']:8} ms")
+    print(f"demanda con bucle    p50={bucle['p50_ms']:8} ms  cpu={bucle['cpu_ms']:8} ms")
+
+    # Los dos caminos deben dar lo mismo
+    suma, cuadrados = agregada["resultado"]
+    for id_variante, (media, desviacion) in bucle["resultado"].items():
+        assert math.isclose(suma[id_variante] / DIAS, media)
+        assert math.isclose(
+            math.sqrt(max(cuadrados[id_variante] / DIAS - media * media, 0)), desviacion, abs_tol=1e-9,
+        )
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--densidad", type=float, default=0.4, help="fraccion de dias con ventas por variante")
+    args = parser.parse_args()
+    variantes = 10_000
+    sembrar({**VOLUMENES, "productos": variantes, "variantes_por_producto": 1, "compras": 1000})
+    with Session(get_engine()) as session:
+        filas = session.exec(select(func.count()).select_from(ResumenVentaDiaria)).one()
+    if filas < variantes * DIAS * args.densidad / 2:
+        inicio = time.perf_counter()
+        sembrar_historia(variantes, DIAS, args.densidad)
+        print(f"historia sembrada en {time.perf_counter() - inicio:.1f} s")
+    asyncio.run(main(args))
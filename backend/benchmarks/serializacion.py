@@ -0,0 +1,106 @@
+"""Bytes enviados y CPU por respuesta de los listados grandes.
+
+Mide de punta a punta /variantes/all, /compras/ y /productos con la pagina
+mas grande permitida (LIMITE_MAXIMO filas), con y sin Accept-Encoding: gzip,
+y aparte compara solo la serializacion de 10k VarianteRead: el camino por
+defecto de FastAPI (serialize_response + JSONResponse) contra
+app.utils.respuestas.serializar.
+
+    DATABASE_URL=sqlite:///bench_serializacion.db python -m benchmarks.serializacion --repeticiones 10
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_serializacion.db")
+# Todo el trafico sale de un solo cliente: sin limite de tasa ni admision
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+os.environ.setdefault("SQL_LOG_PETICIONES", "0")
+
+import httpx
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_engine
+from app.main import app
+from app.models.variante import Variante
+from app.schemas.negocio_schema import VarianteRead
+from app.utils.carga import opciones_carga
+from app.utils.paginacion import LIMITE_MAXIMO
+from app.utils.respuestas import serializar
+from benchmarks.comun import percentil
+from benchmarks.datos import VOLUMENES, sembrar
+
+RUTAS = ["/variantes/all", "/compras/", "/productos"]
+
+
+async def medir_ruta(cliente: httpx.AsyncClient, ruta: str, gzip: bool, repeticiones: int) -> dict:
+    cabeceras = {"Accept-Encoding": "gzip" if gzip else "identity"}
+    params = {"limit": LIMITE_MAXIMO}
+    await cliente.get(ruta, params=params, headers=cabeceras)
+    latencias, cpu, enviados = [], 0.0, 0
+    for _ in range(repeticiones):
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        r = await cliente.get(ruta, params=params, headers=cabeceras)
+        cpu += time.process_time() - inicio_cpu
+        latencias.append(1000 * (time.perf_counter() - inicio))
+        r.raise_for_status()
+        enviados = r.num_bytes_downloaded
+    return {
+        "filas": len(r.json()),
+        "bytes": enviados,
+        "cpu_ms": round(1000 * cpu / repeticiones, 1),
+        "p50_ms": round(percentil(latencias, 50), 1),
+    }
+
+
+async def medir_serializacion(repeticiones: int) -> dict:
+    """CPU de serializar 10k variantes ya cargadas, por cada camino"""
+    async with AsyncSession(get_async_engine()) as session:
+        filas = (await session.exec(
+            select(Variante).options(*opciones_carga(Variante, VarianteRead)).limit(10_000)
+        )).all()
+    campo = next(r.response_field for r in app.routes if getattr(r, "path", None) == "/variantes/all")
+
+    async def por_defecto():
+        contenido = await serialize_response(field=campo, response_content=filas)
+        return JSONResponse(contenido).body
+
+    async def directo():
+        return serializar(VarianteRead, filas)
+
+    resultado = {"filas": len(filas)}
+    for nombre, funcion in (("fastapi", por_defecto), ("directo", directo)):
+        cuerpo = await funcion()
+        inicio = time.process_time()
+        for _ in range(repeticiones):
+            await funcion()
+        cpu_ms = 1000 * (time.process_time() - inicio) / repeticiones
+        resultado[nombre] = {"bytes": len(cuerpo), "cpu_ms": round(cpu_ms, 1)}
+    return resultado
+
+
+async def main(args):
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        for ruta in RUTAS:
+            for gzip in (False, True):
+                datos = await medir_ruta(cliente, ruta, gzip, args.repeticiones)
+                print(
+                    f"{ruta:16} {'gzip' if gzip else 'sin comprimir':14} filas={datos['filas']:6}  "
+                    f"bytes={datos['bytes']:9}  cpu={datos['cpu_ms']:7} ms  p50={datos['p50_ms']:7} ms"
+                )
+    print(await medir_serializacion(args.repeticiones))
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+    # 10k variantes, 10k productos y 10k compras
+    sembrar({**VOLUMENES, "productos": 10_000, "variantes_por_producto": 1, "compras": 10_000})
+    asyncio.run(main(args))
@@ -0,0 +1,224 @@
+"""Suite de carga reproducible sobre la app en proceso.
+
+Siembra la base con benchmarks.datos (si esta vacia), lanza cada escenario
+con httpx + ASGITransport a la concurrencia indicada y escribe un JSON con
+throughput, p50/p95/p99 y el tiempo de BD (cabecera Server-Timing) por
+escenario. Con --comparar se imprime la diferencia contra una corrida previa.
+
+    DATABASE_URL=sqlite:///bench_suite.db python -m benchmarks.suite --peticiones 500 --concurrencia 20
+    python -m benchmarks.suite --escenarios variantes,producto --comparar benchmarks/resultados/anterior.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import time
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_suite.db")
+# Sin log por peticion ni de consultas lentas: el tiempo de BD ya va en el JSON
+os.environ.setdefault("SQL_LOG_PETICIONES", "0")
+os.environ.setdefault("SQL_LENTA_MS", "inf")
+# Todo el trafico sale de un solo cliente: sin limite de tasa ni admision
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+
+import httpx
+
+from app.database import get_async_engine, get_engine
+from app.main import app
+from app.utils.security import cerrar_pool_hash
+from benchmarks.comun import resumen_latencias
+from benchmarks.datos import CONTRASENA, argumentos_volumen, correo, sembrar, variante_activa, volumenes_de
+
+TIMEOUT = 30
+RESULTADOS = Path(__file__).parent / "resultados"
+_SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+)')
+
+
+# --- Escenarios ---
+# Cada escenario recibe un Random y los volumenes sembrados y devuelve los
+# argumentos de cliente.request(metodo, url, ...)
+
+def _variantes(rnd, vol):
+    return "GET", "/variantes", {"params": {"limit": 50}}
+
+def _variantes_all(rnd, vol):
+    return "GET", "/variantes/all", {"params": {"limit": 50, "id_categoria": rnd.randint(1, vol["categorias"])}}
+
+def _producto(rnd, vol):
+    return "GET", f"/productos/{rnd.randint(1, vol['productos'])}", {}
+
+def _busqueda(rnd, vol):
+    return "GET", "/productos/search", {"params": {"q": rnd.choice(["ron", "pisco", "negra", "reserva", "caro"])}}
+
+def _compras(rnd, vol):
+    desde = datetime.date.today() - datetime.timedelta(days=rnd.randrange(365))
+    return "GET", "/compras/", {"params": {"limit": 50, "fecha_desde": desde.isoformat()}}
+
+def _login(rnd, vol):
+    return "POST", "/auth/login", {"json": {"correo": correo(rnd.randrange(vol["usuarios"])), "contrasena": CONTRASENA}}
+
+def _checkout(rnd, vol):
+    n_variantes = vol["productos"] * vol["variantes_por_producto"]
+    n_items, items = rnd.randint(1, vol["max_items_compra"]), []
+    while len(items) < n_items:
+        id_variante = rnd.randint(1, n_variantes)
+        if variante_activa(id_variante):
+            items.append({"id_variante": id_variante, "cantidad": rnd.randint(1, 2)})
+    return "POST", "/compras/checkout", {"json": {"id_usuario": rnd.randint(1, vol["usuarios"]), "items": items}}
+
+def _stock(rnd, vol):
+    n_variantes = vol["productos"] * vol["variantes_por_producto"]
+    return "PATCH", f"/variantes/stock/{rnd.randint(1, n_variantes)}", {"params": {"stock": rnd.randint(500, 5000)}}
+
+def _stock_bulk(rnd, vol):
+    n_variantes = vol["productos"] * vol["variantes_por_producto"]
+    ids = rnd.sample(range(1, n_variantes + 1), min(1000, n_variantes))
+    return "PATCH", "/variantes/bulk", {"json": {"items": [{"id": i, "stock": rnd.randint(500, 5000)} for i in ids]}}
+
+def _reporte(rnd, vol):
+    return "GET", "/reportes/top", {"params": {"nivel": rnd.choice(["producto", "categoria"])}}
+
+ESCENARIOS = {
+    "variantes": _variantes,
+    "variantes_all": _variantes_all,
+    "producto": _producto,
+    "busqueda": _busqueda,
+    "compras": _compras,
+    "login": _login,
+    "checkout": _checkout,
+    "stock": _stock,
+    "stock_bulk": _stock_bulk,
+    "reporte": _reporte,
+}
+
+
+async def correr(cliente: httpx.AsyncClient, escenario, vol: dict, args, semilla: int) -> dict:
+    rnd = random.Random(semilla)
+    peticiones = [escenario(rnd, vol) for _ in range(args.calentamiento + args.peticiones)]
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    latencias, db_ms, consultas, estados = [], [], [], {}
+
+    async def una(metodo, url, opciones, medir):
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                # ASGITransport no aplica timeouts: se acota cada peticion aqui
+                r = await asyncio.wait_for(cliente.request(metodo, url, **opciones), TIMEOUT)
+            except Exception as error:
+                if medir:
+                    clave = type(error).__name__
+                    estados[clave] = estados.get(clave, 0) + 1
+                return
+            if not medir:
+                return
+            latencias.append(1000 * (time.perf_counter() - inicio))
+            estados[str(r.status_code)] = estados.get(str(r.status_code), 0) + 1
+            if m := _SERVER_TIMING.search(r.headers.get("server-timing", "")):
+                db_ms.append(float(m.group(1)))
+                consultas.append(int(m.group(2)))
+
+    calentamiento = peticiones[:args.calentamiento]
+    await asyncio.gather(*(una(*p, medir=False) for p in calentamiento))
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(*p, medir=True) for p in peticiones[args.calentamiento:]))
+    duracion = time.perf_counter() - inicio
+
+    correctas = sum(n for estado, n in estados.items() if estado.isdigit() and int(estado) < 400)
+    return {
+        "peticiones": args.peticiones,
+        "errores": args.peticiones - correctas,
+        "estados": estados,
+        "duracion_s": round(duracion, 3),
+        "rps": round(correctas / duracion, 1),
+        **resumen_latencias(latencias),
+        "db_ms_media": round(sum(db_ms) / len(db_ms), 3) if db_ms else None,
+        "consultas_media": round(sum(consultas) / len(consultas), 2) if consultas else None,
+    }
+
+
+def _commit_git() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual: dict, anterior: dict):
+    print(f"\ncomparado con {anterior.get('fecha')} ({anterior.get('commit')}):")
+    for nombre, datos in actual["escenarios"].items():
+        previo = anterior.get("escenarios", {}).get(nombre)
+        if not previo:
+            continue
+        cambios = []
+        for campo in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if datos[campo] is None or not previo.get(campo):
+                continue
+            cambios.append(f"{campo} {100 * (datos[campo] - previo[campo]) / previo[campo]:+6.1f}%")
+        print(f"  {nombre:14} " + "  ".join(cambios))
+
+
+async def main(args):
+    vol = volumenes_de(args)
+    nombres = args.escenarios.split(",") if args.escenarios else list(ESCENARIOS)
+    desconocidos = set(nombres) - ESCENARIOS.keys()
+    if desconocidos:
+        raise SystemExit(f"escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+    resultado = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_git(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "base_datos": get_engine().dialect.name,
+        "volumenes": vol,
+        "parametros": {
+            "peticiones": args.peticiones, "concurrencia": args.concurrencia,
+            "calentamiento": args.calentamiento, "semilla": args.semilla,
+        },
+        "escenarios": {},
+    }
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        for i, nombre in enumerate(nombres):
+            datos = await correr(cliente, ESCENARIOS[nombre], vol, args, args.semilla + i)
+            resultado["escenarios"][nombre] = datos
+            print(
+                f"{nombre:14} {datos['rps']:8.1f} req/s  p50={datos['p50_ms']}  p95={datos['p95_ms']}  "
+                f"p99={datos['p99_ms']} ms  errores={datos['errores']}  consultas={datos['consultas_media']}"
+            )
+
+    salida = Path(args.salida) if args.salida else RESULTADOS / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+    print(f"\nresultados en {salida}")
+
+    if args.comparar:
+        comparar(resultado, json.loads(Path(args.comparar).read_text()))
+
+    cerrar_pool_hash()
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escenarios", help=f"lista separada por comas: {','.join(ESCENARIOS)}")
+    parser.add_argument("--peticiones", type=int, default=300, help="peticiones medidas por escenario")
+    parser.add_argument("--concurrencia", type=int, default=10)
+    parser.add_argument("--calentamiento", type=int, default=20, help="peticiones previas sin medir")
+    parser.add_argument("--salida", help="ruta del JSON (por defecto benchmarks/resultados/<fecha>.json)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    argumentos_volumen(parser)
+    args = parser.parse_args()
+    sembrar(volumenes_de(args), args.semilla, args.recrear)
+    asyncio.run(main(args))
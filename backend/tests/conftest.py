@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+# La app lee la configuracion al importarse: los tests usan una SQLite
+# temporal, sin limites de tasa ni calentamiento
+_directorio = tempfile.mkdtemp(prefix="licoreria_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'tests.db')}"
+os.environ["IMAGENES_DIR"] = os.path.join(_directorio, "imagenes")
+os.environ.setdefault("LIMITES_ACTIVOS", "0")
+os.environ.setdefault("ARRANQUE_CALENTAR", "0")
+os.environ.setdefault("SQL_LOG_PETICIONES", "0")
+
+import pytest
+from sqlalchemy import delete
+from sqlmodel import SQLModel
+
+
+@pytest.fixture(scope="module")
+def base_vacia():
+    """Esquema al dia y todas las tablas vacias al empezar cada modulo de tests"""
+    from app.database import get_engine, init_db
+    from app.utils.cache import cache_catalogo, cache_reportes
+
+    SQLModel.metadata.create_all(get_engine())
+    with get_engine().begin() as conn:
+        for tabla in reversed(SQLModel.metadata.sorted_tables):
+            conn.execute(delete(tabla))
+    init_db(forzar=True)
+    cache_catalogo.limpiar()
+    cache_reportes.limpiar()
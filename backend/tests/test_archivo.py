@@ -0,0 +1,101 @@
+"""Archivado de compras antiguas: listados que unen caliente y archivo, y el
+POST manual protegido por token."""
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_engine, get_engine
+from app.models.compra import Compra
+from app.models.detalle_compra import DetalleCompra
+from app.routes import internal_routes
+from app.utils.archivo import ARCHIVO_HORIZONTE_MIN_DIAS, archivar_lote
+from tests.test_compras import pedir
+
+HOY = datetime.date.today()
+ANTIGUAS = [100 + i for i in range(6)]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def datos(base_vacia):
+    with Session(get_engine()) as session:
+        session.exec(insert(Compra), params=[
+            {"id": id_compra, "fecha": HOY - datetime.timedelta(days=700 + i), "total": 1.0}
+            for i, id_compra in enumerate(ANTIGUAS)
+        ] + [{"id": 200, "fecha": HOY, "total": 1.0}])
+        session.exec(insert(DetalleCompra), params=[
+            {"id": id_compra, "cantidad": 1, "subtotal": 1.0, "id_compra": id_compra}
+            for id_compra in ANTIGUAS + [200]
+        ])
+        session.commit()
+
+    async def archivar():
+        try:
+            async with AsyncSession(get_async_engine()) as session:
+                movidas = await archivar_lote(session, HOY - datetime.timedelta(days=365), 100)
+                await session.commit()
+        finally:
+            await get_async_engine().dispose()
+        return movidas
+
+    assert asyncio.run(archivar()) == len(ANTIGUAS)
+
+
+def recorrer(ruta: str, limit: int, **params) -> list[int]:
+    """Ids de todas las paginas siguiendo X-Next-Cursor"""
+    ids, cursor = [], ""
+    while True:
+        consulta = "&".join(f"{k}={v}" for k, v in {**params, "limit": limit, "cursor": cursor}.items() if v != "")
+        respuesta, = pedir(("GET", f"{ruta}?{consulta}", None))
+        assert respuesta.status_code == 200, respuesta.text
+        ids += [fila["id"] for fila in respuesta.json()]
+        cursor = respuesta.headers["X-Next-Cursor"]
+        if not cursor:
+            return ids
+
+
+def test_por_defecto_solo_caliente():
+    assert recorrer("/compras/", 10) == [200]
+    assert recorrer("/detalle_compras", 10) == [200]
+
+
+def test_paginas_sobre_la_union():
+    # Orden (fecha, id): la mas antigua primero, sin repetir ni saltar filas
+    # en los bordes de pagina
+    assert recorrer("/compras/", 3, incluir_archivo="true") == ANTIGUAS[::-1] + [200]
+    assert recorrer("/detalle_compras", 4, incluir_archivo="true") == ANTIGUAS + [200]
+
+
+def test_rango_y_compra_archivada():
+    desde = HOY - datetime.timedelta(days=702)
+    assert recorrer("/compras/", 2, fecha_desde=desde.isoformat()) == [102, 101, 100, 200]
+    assert recorrer("/detalle_compras", 10, id_compra=102) == [102]
+
+
+def test_post_archivo_requiere_token(monkeypatch):
+    ruta = f"/internal/archivo?horizonte_dias={ARCHIVO_HORIZONTE_MIN_DIAS}"
+    deshabilitado, = pedir(("POST", ruta, None))
+    assert deshabilitado.status_code == 404
+
+    monkeypatch.setattr(internal_routes, "ARCHIVO_TOKEN", "secreto")
+    sin_token, incorrecto, no_ascii, correcto = pedir(
+        ("POST", ruta, None),
+        ("POST", ruta, None, {"X-Archivo-Token": "otro"}),
+        ("POST", ruta, None, {"X-Archivo-Token": "contraseña".encode()}),
+        ("POST", ruta, None, {"X-Archivo-Token": "secreto"}),
+    )
+    assert [r.status_code for r in (sin_token, incorrecto, no_ascii)] == [403, 403, 403]
+    assert correcto.status_code == 200
+    assert correcto.json()["corte"] == (HOY - datetime.timedelta(days=ARCHIVO_HORIZONTE_MIN_DIAS)).isoformat()
+
+
+def test_post_archivo_horizonte_minimo(monkeypatch):
+    monkeypatch.setattr(internal_routes, "ARCHIVO_TOKEN", "secreto")
+    respuesta, = pedir((
+        "POST", f"/internal/archivo?horizonte_dias={ARCHIVO_HORIZONTE_MIN_DIAS - 1}", None,
+        {"X-Archivo-Token": "secreto"},
+    ))
+    assert respuesta.status_code == 422
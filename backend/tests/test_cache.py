@@ -0,0 +1,65 @@
+"""La cache del catalogo nunca sirve datos anteriores a una escritura confirmada.
+
+Cada prueba lee primero (llenando la cache), escribe por la API y vuelve a
+leer: la segunda lectura debe ver el cambio.
+"""
+import pytest
+
+from app.utils.cache import cache_catalogo
+from tests.test_compras import pedir
+from tests.test_consultas import sembrar
+
+
+@pytest.fixture(scope="module", autouse=True)
+def datos(base_vacia):
+    sembrar(0, 3)
+
+
+def ids(respuesta) -> list[int]:
+    return [v["id"] for v in respuesta.json()]
+
+
+def test_detalle_tras_put():
+    antes, _, despues = pedir(
+        ("GET", "/variantes/2", None),
+        ("PUT", "/variantes/2", {"precio": 15.0}),
+        ("GET", "/variantes/2", None),
+    )
+    assert antes.json()["precio"] == 10.0
+    assert despues.json()["precio"] == 15.0
+
+
+def test_listado_tras_bulk():
+    aciertos = cache_catalogo.hits
+    antes, repetida, _, despues = pedir(
+        ("GET", "/variantes", None),
+        ("GET", "/variantes", None),
+        ("PATCH", "/variantes/bulk", {"items": [{"id": 4, "stock": 42}]}),
+        ("GET", "/variantes", None),
+    )
+    # La lectura repetida sale de la cache; la posterior al PATCH no
+    assert cache_catalogo.hits == aciertos + 1
+    assert repetida.content == antes.content
+    assert {v["id"]: v["stock"] for v in antes.json()}[4] == 5
+    assert {v["id"]: v["stock"] for v in despues.json()}[4] == 42
+
+
+def test_listado_por_categoria_tras_mover_producto():
+    origen, destino, _, origen_despues, destino_despues = pedir(
+        ("GET", "/variantes?id_categoria=3", None),
+        ("GET", "/variantes?id_categoria=1", None),
+        ("PUT", "/productos/3", {"id_categoria": 1}),
+        ("GET", "/variantes?id_categoria=3", None),
+        ("GET", "/variantes?id_categoria=1", None),
+    )
+    assert (ids(origen), ids(destino)) == ([6], [2])
+    assert (ids(origen_despues), ids(destino_despues)) == ([], [2, 6])
+
+
+def test_variante_tras_renombrar_categoria():
+    _, _, despues = pedir(
+        ("GET", "/variantes/2", None),
+        ("PUT", "/categorias/1", {"nombre": "Destilados"}),
+        ("GET", "/variantes/2", None),
+    )
+    assert despues.json()["producto"]["categoria"]["nombre"] == "Destilados"
@@ -0,0 +1,159 @@
+"""Alta de compras y checkout: fechas, stock y resumenes diarios.
+
+El checkout descuenta stock con un UPDATE condicional por variante; si una
+falla se revierte todo. Los resumenes los suma la cola de tareas despues del
+commit, aqui se ejecutan a mano con una cola sin workers.
+"""
+import asyncio
+import datetime
+
+import httpx
+import pytest
+from sqlmodel import Session, func, select
+
+from app.database import get_async_engine, get_engine
+from app.main import app
+from app.models.compra import Compra
+from app.models.detalle_compra import DetalleCompra
+from app.models.resumen_venta import ResumenCompraDiaria, ResumenVentaDiaria
+from app.models.tarea import Tarea
+from app.models.variante import Variante
+from app.utils.tareas import ColaTareas
+from tests.test_consultas import sembrar
+
+# sembrar(): variantes pares activas con stock 5 y precio 10
+ACTIVA, OTRA_ACTIVA, INACTIVA = 2, 4, 1
+
+
+@pytest.fixture(scope="module", autouse=True)
+def datos(base_vacia):
+    sembrar(0, 3)
+
+
+def pedir(*peticiones: tuple) -> list[httpx.Response]:
+    """Ejecuta (metodo, ruta, json[, cabeceras]) en orden contra la app"""
+    async def ejecutar():
+        transporte = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+                return [
+                    await cliente.request(metodo, ruta, json=cuerpo, headers=dict(*cabeceras))
+                    for metodo, ruta, cuerpo, *cabeceras in peticiones
+                ]
+        finally:
+            await get_async_engine().dispose()
+    return asyncio.run(ejecutar())
+
+
+async def procesar_tareas() -> ColaTareas:
+    """Ejecuta las tareas pendientes como lo haria un worker"""
+    cola = ColaTareas()
+    cola.iniciar(get_async_engine(), workers=0)
+    with Session(get_engine()) as session:
+        ids = session.exec(select(Tarea.id).order_by(Tarea.id)).all()
+    try:
+        for id_tarea in ids:
+            await cola.ejecutar(id_tarea)
+        await cola.detener()
+    finally:
+        await get_async_engine().dispose()
+    return cola
+
+
+def stock(id_variante: int) -> int:
+    with Session(get_engine()) as session:
+        return session.get(Variante, id_variante).stock
+
+
+def contar(modelo) -> int:
+    with Session(get_engine()) as session:
+        return session.exec(select(func.count()).select_from(modelo)).one()
+
+
+def test_alta_con_fecha_en_texto():
+    creada, = pedir(("POST", "/compras/", {"fecha": "2024-03-01", "total": 15.5}))
+    assert creada.status_code == 201, creada.text
+    assert creada.json()["fecha"] == "2024-03-01"
+
+    asyncio.run(procesar_tareas())
+    with Session(get_engine()) as session:
+        resumen = session.get(ResumenCompraDiaria, datetime.date(2024, 3, 1))
+    assert (resumen.compras, resumen.total) == (1, 15.5)
+
+
+def test_alta_con_fecha_invalida():
+    respuesta, = pedir(("POST", "/compras/", {"fecha": "ayer", "total": 1}))
+    assert respuesta.status_code == 422
+
+
+def test_checkout_sin_stock_no_descuenta_nada():
+    compras = contar(Compra)
+    respuesta, = pedir(("POST", "/compras/checkout", {"items": [
+        {"id_variante": ACTIVA, "cantidad": 2},
+        {"id_variante": OTRA_ACTIVA, "cantidad": 99},
+    ]}))
+    assert respuesta.status_code == 409
+    assert (stock(ACTIVA), stock(OTRA_ACTIVA)) == (5, 5)
+    assert contar(Compra) == compras
+
+
+def test_checkout_variante_inactiva():
+    respuesta, = pedir(("POST", "/compras/checkout", {"items": [{"id_variante": INACTIVA, "cantidad": 1}]}))
+    assert respuesta.status_code == 404
+    assert stock(INACTIVA) == 5
+
+
+def test_checkout_agrupa_lineas_y_resume():
+    respuesta, = pedir(("POST", "/compras/checkout", {"items": [
+        {"id_variante": OTRA_ACTIVA, "cantidad": 1},
+        {"id_variante": ACTIVA, "cantidad": 2},
+        {"id_variante": OTRA_ACTIVA, "cantidad": 1},
+    ]}))
+    assert respuesta.status_code == 201, respuesta.text
+    compra = respuesta.json()
+    assert compra["total"] == 40.0
+    assert (stock(ACTIVA), stock(OTRA_ACTIVA)) == (3, 3)
+    with Session(get_engine()) as session:
+        lineas = session.exec(
+            select(DetalleCompra.id_variante, DetalleCompra.cantidad, DetalleCompra.subtotal)
+            .where(DetalleCompra.id_compra == compra["id"])
+            .order_by(DetalleCompra.id_variante)
+        ).all()
+    assert lineas == [(ACTIVA, 2, 20.0), (OTRA_ACTIVA, 2, 20.0)]
+
+    cola = asyncio.run(procesar_tareas())
+    assert cola.fallidas == cola.reintentos == 0
+    with Session(get_engine()) as session:
+        vendidas = session.get(ResumenVentaDiaria, (datetime.date.today(), ACTIVA))
+    # Lo sembrado va directo a las tablas: solo cuenta este checkout
+    assert (vendidas.unidades, vendidas.ingresos) == (2, 20.0)
+
+
+def test_checkouts_simultaneos_no_sobrevenden():
+    async def comprar(cliente):
+        return await cliente.post("/compras/checkout", json={"items": [{"id_variante": 6, "cantidad": 2}]})
+
+    async def ejecutar():
+        transporte = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+                return await asyncio.gather(*(comprar(cliente) for _ in range(4)))
+        finally:
+            await get_async_engine().dispose()
+
+    codigos = sorted(r.status_code for r in asyncio.run(ejecutar()))
+    assert codigos == [201, 201, 409, 409]
+    assert stock(6) == 1
+
+
+def test_compra_con_version_vieja_da_412():
+    creada, = pedir(("POST", "/compras/", {"fecha": "2024-05-01", "total": 10.0}))
+    ruta = f"/compras/{creada.json()['id']}"
+    leida, = pedir(("GET", ruta, None))
+    primera, segunda = pedir(
+        ("PUT", ruta, {"total": 12.0}, {"If-Match": leida.headers["ETag"]}),
+        ("PUT", ruta, {"total": 14.0}, {"If-Match": leida.headers["ETag"]}),
+    )
+    assert primera.status_code == 200, primera.text
+    assert segunda.status_code == 412
+    assert pedir(("GET", ruta, None))[0].json()["total"] == 12.0
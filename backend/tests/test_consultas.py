@@ -0,0 +1,101 @@
+"""Los listados hacen un numero fijo de consultas, sin importar cuantas filas devuelvan.
+
+Se siembran N filas, se cuentan las sentencias SQL de cada listado, se
+siembran N mas y se vuelve a contar: si alguna relacion se carga fila a fila
+(N+1), el conteo con 2N filas es mayor.
+"""
+import asyncio
+import datetime
+
+import httpx
+import pytest
+from sqlalchemy import event, insert
+from sqlmodel import Session
+
+from app.database import get_async_engine, get_engine
+from app.main import app
+from app.models.categoria import Categoria
+from app.models.compra import Compra
+from app.models.detalle_compra import DetalleCompra
+from app.models.producto import Producto
+from app.models.variante import Variante
+from app.utils.cache import cache_catalogo
+
+N = 20
+
+LISTADOS = [
+    "/variantes",
+    "/variantes/all",
+    "/variantes/inactivas",
+    "/productos",
+    "/compras/",
+    "/detalle_compras",
+]
+
+
+def sembrar(desde: int, n: int):
+    """Agrega n filas de cada tabla con ids desde+1 .. desde+n"""
+    ids = range(desde + 1, desde + n + 1)
+    hoy = datetime.date.today()
+    with Session(get_engine()) as session:
+        session.exec(insert(Categoria), params=[{"id": i, "nombre": f"Categoria {i}"} for i in ids])
+        session.exec(insert(Producto), params=[
+            {"id": i, "nombre": f"Producto {i}", "descripcion": "", "id_categoria": i} for i in ids
+        ])
+        # Dos variantes por producto, una activa y otra inactiva
+        session.exec(insert(Variante), params=[
+            {"id": 2 * i - 1 + activa, "precio": 10.0, "imagen": "", "stock": 5, "cantidad": 1,
+             "activo": bool(activa), "id_producto": i}
+            for i in ids for activa in (0, 1)
+        ])
+        session.exec(insert(Compra), params=[{"id": i, "fecha": hoy, "total": 20.0} for i in ids])
+        session.exec(insert(DetalleCompra), params=[
+            {"id": i, "cantidad": 2, "subtotal": 20.0, "id_compra": i, "id_variante": 2 * i} for i in ids
+        ])
+        session.commit()
+
+
+async def contar_consultas() -> dict[str, tuple[int, int]]:
+    """Por listado: (sentencias ejecutadas, filas devueltas)"""
+    sentencias = 0
+
+    def contar(*_):
+        nonlocal sentencias
+        sentencias += 1
+
+    engine = get_async_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", contar)
+    conteos = {}
+    try:
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+            for ruta in LISTADOS:
+                # Sin cache: se mide la consulta, no el acierto
+                cache_catalogo.limpiar()
+                sentencias = 0
+                respuesta = await cliente.get(ruta)
+                assert respuesta.status_code == 200, (ruta, respuesta.text)
+                conteos[ruta] = (sentencias, len(respuesta.json()))
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+        await get_async_engine().dispose()
+    return conteos
+
+
+@pytest.fixture(scope="module")
+def conteos(base_vacia):
+    sembrar(0, N)
+    con_n = asyncio.run(contar_consultas())
+    sembrar(N, N)
+    con_2n = asyncio.run(contar_consultas())
+    return con_n, con_2n
+
+
+@pytest.mark.parametrize("ruta", LISTADOS)
+def test_consultas_no_crecen_con_las_filas(conteos, ruta):
+    con_n, con_2n = conteos
+    (sentencias_n, filas_n), (sentencias_2n, filas_2n) = con_n[ruta], con_2n[ruta]
+    assert filas_2n == 2 * filas_n > 0
+    assert sentencias_2n == sentencias_n, (
+        f"{ruta}: {sentencias_n} consultas con {filas_n} filas, {sentencias_2n} con {filas_2n}"
+    )
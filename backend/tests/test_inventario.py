@@ -0,0 +1,50 @@
+"""Suscripciones SSE al flujo de inventario: nunca quedan colas huerfanas en el hub."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.routes.inventario_routes import sse_inventario
+from app.utils.eventos import hub_inventario
+
+
+def peticion() -> Request:
+    async def recibir():
+        # Cliente conectado que no envia nada
+        await asyncio.sleep(3600)
+    return Request({"type": "http", "method": "GET", "path": "/inventario/eventos", "headers": []}, recibir)
+
+
+def test_respuesta_sin_consumir_no_suscribe():
+    async def ejecutar():
+        # El cliente se desconecta antes de que empiece la transmision
+        respuesta = await sse_inventario(peticion(), ids=None, umbral=None)
+        assert hub_inventario.estadisticas()["suscriptores"] == 0
+        await respuesta.body_iterator.aclose()
+        assert hub_inventario.estadisticas()["suscriptores"] == 0
+    asyncio.run(ejecutar())
+
+
+def test_transmision_suscribe_y_cancela_al_cerrar():
+    async def ejecutar():
+        respuesta = await sse_inventario(peticion(), ids="7", umbral=None)
+        eventos = respuesta.body_iterator
+        siguiente = asyncio.ensure_future(eventos.__anext__())
+        await asyncio.sleep(0)
+        assert hub_inventario.estadisticas()["suscriptores"] == 1
+        hub_inventario.publicar([{"id": 7, "stock": 3, "precio": 10.0, "activo": True, "version": 2}])
+        assert (await siguiente).startswith("event: variantes\n")
+        await eventos.aclose()
+        assert hub_inventario.estadisticas()["suscriptores"] == 0
+    asyncio.run(ejecutar())
+
+
+def test_hub_lleno_da_503(monkeypatch):
+    monkeypatch.setattr(hub_inventario, "max_suscriptores", 0)
+
+    async def ejecutar():
+        with pytest.raises(HTTPException) as error:
+            await sse_inventario(peticion(), ids=None, umbral=None)
+        assert error.value.status_code == 503
+    asyncio.run(ejecutar())
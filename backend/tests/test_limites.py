@@ -0,0 +1,67 @@
+"""Limite de tasa por cliente y control de admision segun el pool.
+
+Los tests corren con LIMITES_ACTIVOS=0; aqui se activan con un limitador
+propio de presupuesto chico para no depender de los valores por defecto.
+"""
+import pytest
+
+from app.auth.jwt_handler import create_access_token
+from app.utils import limites
+from app.utils.limites import LimitadorTasa
+from tests.test_compras import pedir
+from tests.test_consultas import sembrar
+
+
+@pytest.fixture(scope="module", autouse=True)
+def datos(base_vacia):
+    sembrar(0, 1)
+
+
+@pytest.fixture
+def limitador(monkeypatch):
+    nuevo = LimitadorTasa({"auth": (0.001, 1), "lectura": (0.001, 2), "escritura": (0.001, 1)})
+    monkeypatch.setattr(limites, "LIMITES_ACTIVOS", True)
+    monkeypatch.setattr(limites, "limitador", nuevo)
+    return nuevo
+
+
+def bearer(usuario: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': usuario})}"}
+
+
+def test_rafaga_agotada_da_429(limitador):
+    respuestas = pedir(*[("GET", "/categorias", None)] * 3)
+    assert [r.status_code for r in respuestas] == [200, 200, 429]
+    assert int(respuestas[2].headers["Retry-After"]) >= 1
+    assert limitador.rechazadas == 1
+
+
+def test_cubetas_por_cliente_y_clase(limitador):
+    respuestas = pedir(
+        ("GET", "/categorias", None),
+        ("GET", "/categorias", None),
+        # Otro cliente (por el sub del token) tiene su propia cubeta
+        ("GET", "/categorias", None, bearer("ana@example.com")),
+        # Y las escrituras otra, aparte de las lecturas
+        ("PUT", "/categorias/1", {"nombre": "Renombrada"}),
+        ("PUT", "/categorias/1", {"nombre": "Otra vez"}),
+        ("GET", "/categorias", None),
+    )
+    assert [r.status_code for r in respuestas] == [200, 200, 200, 200, 429, 429]
+
+
+def test_rutas_internas_exentas(limitador):
+    respuestas = pedir(*[("GET", "/internal/pool", None)] * 3)
+    assert all(r.status_code != 429 for r in respuestas)
+    assert limitador.rechazadas == 0
+
+
+def test_pool_saturado_da_503(limitador, monkeypatch):
+    pedir(("GET", "/categorias", None))
+    # Con umbral 0 cualquier estado del pool cuenta como saturado
+    monkeypatch.setattr(limites, "ADMISION_MAX_ESPERANDO", 0)
+    rechazadas = limites.admision["rechazadas"]
+    respuesta, = pedir(("GET", "/categorias", None))
+    assert respuesta.status_code == 503
+    assert respuesta.headers["Retry-After"] == limites.ADMISION_RETRY_AFTER
+    assert limites.admision["rechazadas"] == rechazadas + 1
@@ -0,0 +1,40 @@
+"""Acceso al perfilador: solo con PERFILADOR_TOKEN y la cabecera X-Perfil-Token."""
+import pytest
+
+from app.routes import internal_routes
+from app.utils import perfilador
+from app.utils.perfilador import token_valido
+from tests.test_compras import pedir
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(perfilador, "PERFILADOR_TOKEN", "secreto")
+    monkeypatch.setattr(internal_routes, "PERFILADOR_TOKEN", "secreto")
+
+
+def test_token_valido(token):
+    assert token_valido("secreto")
+    assert not token_valido("otro")
+    assert not token_valido(None)
+    # Una cabecera no ASCII llega decodificada como latin-1: no debe lanzar
+    assert not token_valido("contraseña")
+    assert not token_valido("contraseña".encode().decode("latin-1"))
+
+
+def test_sin_token_configurado(monkeypatch):
+    monkeypatch.setattr(perfilador, "PERFILADOR_TOKEN", "")
+    monkeypatch.setattr(internal_routes, "PERFILADOR_TOKEN", "")
+    assert not token_valido("")
+    respuesta, = pedir(("GET", "/internal/perfil", None, {"X-Perfil-Token": ""}))
+    assert respuesta.status_code == 404
+
+
+def test_rutas_del_perfilador(token):
+    sin_token, no_ascii, correcto = pedir(
+        ("GET", "/internal/perfil", None),
+        ("GET", "/internal/perfil", None, {"X-Perfil-Token": "contraseña".encode()}),
+        ("GET", "/internal/perfil", None, {"X-Perfil-Token": "secreto"}),
+    )
+    assert (sin_token.status_code, no_ascii.status_code) == (403, 403)
+    assert correcto.status_code == 200
@@ -0,0 +1,107 @@
+"""Cola de tareas: efectos que se aplican una sola vez y resumenes al dia.
+
+Las rutas que editan o borran compras y lineas solo encolan el ajuste del
+resumen (con signo); la cola lo aplica despues del commit.
+"""
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_engine, get_engine
+from app.models.categoria import Categoria
+from app.models.resumen_venta import ResumenCompraDiaria, ResumenVentaDiaria
+from app.models.tarea import Tarea
+from app.utils.tareas import ColaTareas, encolar, tarea
+from tests.test_compras import pedir, procesar_tareas
+from tests.test_consultas import sembrar
+
+AYER, HOY = datetime.date(2024, 6, 1), datetime.date(2024, 6, 2)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def datos(base_vacia):
+    sembrar(0, 1)
+
+
+@tarea("prueba_relevo")
+async def _prueba_relevo(session: AsyncSession, datos: dict):
+    if datos["relevar"]:
+        # Otro worker retoma la tarea mientras esta sigue en curso
+        async with AsyncSession(get_async_engine()) as otra:
+            await otra.exec(
+                update(Tarea)
+                .where(Tarea.tipo == "prueba_relevo", Tarea.estado == "en_curso")
+                .values(intentos=Tarea.intentos + 1)
+            )
+            await otra.commit()
+    session.add(Categoria(nombre=datos["efecto"]))
+
+
+def test_tarea_relevada_deshace_sus_efectos():
+    async def ejecutar():
+        cola = ColaTareas()
+        cola.iniciar(get_async_engine(), workers=0)
+        ids = {}
+        try:
+            for relevar in (True, False):
+                async with AsyncSession(get_async_engine()) as session:
+                    nueva = encolar(session, "prueba_relevo", {"relevar": relevar, "efecto": f"efecto {relevar}"})
+                    await session.flush()
+                    ids[relevar] = nueva.id
+                    await session.commit()
+                await cola.ejecutar(ids[relevar])
+            await cola.detener()
+        finally:
+            await get_async_engine().dispose()
+        return cola, ids
+
+    cola, ids = asyncio.run(ejecutar())
+    assert (cola.relevadas, cola.completadas) == (1, 1)
+    with Session(get_engine()) as session:
+        efectos = set(session.exec(select(Categoria.nombre).where(Categoria.nombre.startswith("efecto"))).all())
+        pendientes = session.exec(select(Tarea.id).where(Tarea.tipo == "prueba_relevo")).all()
+    # Solo vale el efecto de la tarea no relevada; la relevada sigue en la BD
+    # para quien la retomo
+    assert efectos == {"efecto False"}
+    assert pendientes == [ids[True]]
+    with get_engine().begin() as conn:
+        conn.execute(update(Tarea).where(Tarea.id == ids[True]).values(estado="fallida"))
+
+
+def resumen(fecha: datetime.date) -> tuple:
+    """(compras, total) del dia y (unidades, ingresos) de la variante 2"""
+    with Session(get_engine()) as session:
+        compras = session.get(ResumenCompraDiaria, fecha)
+        ventas = session.get(ResumenVentaDiaria, (fecha, 2))
+    return (
+        (compras.compras, compras.total) if compras else (0, 0),
+        (ventas.unidades, ventas.ingresos) if ventas else (0, 0),
+    )
+
+
+def test_resumenes_siguen_ediciones_por_la_cola():
+    creada, = pedir(("POST", "/compras/", {"fecha": AYER.isoformat(), "total": 10.0}))
+    id_compra = creada.json()["id"]
+    linea, = pedir(("POST", "/detalle_compras", {
+        "id_compra": id_compra, "id_variante": 2, "cantidad": 1, "subtotal": 10.0,
+    }))
+    # Nada se aplica dentro de la peticion
+    assert resumen(AYER) == ((0, 0), (0, 0))
+    asyncio.run(procesar_tareas())
+    assert resumen(AYER) == ((1, 10.0), (1, 10.0))
+
+    # Cambio de fecha y total: la compra y sus lineas se mueven de dia
+    pedir(("PUT", f"/compras/{id_compra}", {"fecha": HOY.isoformat(), "total": 30.0}))
+    pedir(("PUT", f"/detalle_compras/{linea.json()['id']}", {"cantidad": 3, "subtotal": 30.0}))
+    asyncio.run(procesar_tareas())
+    assert resumen(AYER) == ((0, 0), (0, 0))
+    assert resumen(HOY) == ((1, 30.0), (3, 30.0))
+
+    pedir(("DELETE", f"/compras/{id_compra}", None))
+    cola = asyncio.run(procesar_tareas())
+    assert cola.fallidas == cola.reintentos == 0
+    assert resumen(HOY) == ((0, 0), (0, 0))
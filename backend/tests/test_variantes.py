@@ -0,0 +1,82 @@
+"""Escrituras sobre variantes: PATCH masivo con su estado por item y control
+de version con If-Match (412 si otra peticion cambio la fila antes)."""
+import pytest
+from sqlmodel import Session
+
+from app.database import get_engine
+from app.models.variante import Variante
+from tests.test_compras import pedir
+from tests.test_consultas import sembrar
+
+
+@pytest.fixture(scope="module", autouse=True)
+def datos(base_vacia):
+    sembrar(0, 3)
+
+
+def variante(id_variante: int) -> Variante:
+    with Session(get_engine()) as session:
+        return session.get(Variante, id_variante)
+
+
+def test_bulk_estado_por_item():
+    respuesta, = pedir(("PATCH", "/variantes/bulk", {"items": [
+        {"id": 2, "stock": 9},
+        {"id": 4, "precio": 12.0, "version": 999},
+        {"id": 99, "stock": 1},
+        {"id": 2, "stock": 0},
+        {"id": 6},
+    ]}))
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert [item["estado"] for item in cuerpo["items"]] == [
+        "actualizada", "conflicto", "no_encontrada", "duplicada", "sin_cambios",
+    ]
+    assert (cuerpo["actualizadas"], cuerpo["fallidas"]) == (1, 3)
+    # El conflicto informa la version vigente para reintentar
+    assert cuerpo["items"][1]["version"] == 1
+
+    actualizada, intacta = variante(2), variante(4)
+    assert (actualizada.stock, actualizada.version) == (9, 2)
+    assert (intacta.precio, intacta.version) == (10.0, 1)
+
+
+def test_bulk_con_version_correcta():
+    respuesta, = pedir(("PATCH", "/variantes/bulk", {"items": [
+        {"id": 4, "precio": 12.0, "activo": False, "version": 1},
+    ]}))
+    assert respuesta.json()["items"] == [{"id": 4, "estado": "actualizada", "version": 2}]
+    cambiada = variante(4)
+    assert (cambiada.precio, cambiada.activo) == (12.0, False)
+
+
+def test_bulk_atomico_revierte_todo():
+    respuesta, = pedir(("PATCH", "/variantes/bulk?atomico=true", {"items": [
+        {"id": 2, "stock": 1},
+        {"id": 99, "stock": 1},
+    ]}))
+    assert respuesta.status_code == 409
+    assert respuesta.json()["detail"]["fallidas"] == 1
+    assert (variante(2).stock, variante(2).version) == (9, 2)
+
+
+
+def test_if_match_con_version_vieja_da_412():
+    leida, = pedir(("GET", "/variantes/6", None))
+    etag_leido = leida.headers["ETag"]
+    primera, segunda = pedir(
+        ("PUT", "/variantes/6", {"precio": 11.0}, {"If-Match": etag_leido}),
+        ("PUT", "/variantes/6", {"precio": 13.0}, {"If-Match": etag_leido}),
+    )
+    assert primera.status_code == 200, primera.text
+    assert primera.headers["ETag"] != etag_leido
+    # El segundo cliente leyo la misma version: no pisa el cambio del primero
+    assert segunda.status_code == 412
+    assert segunda.headers["ETag"] == primera.headers["ETag"]
+    assert (variante(6).precio, variante(6).version) == (11.0, 2)
+
+
+def test_if_match_mal_formado_da_412():
+    respuesta, = pedir(("PUT", "/variantes/6", {"precio": 1.0}, {"If-Match": "no-es-un-etag"}))
+    assert respuesta.status_code == 412
+    assert variante(6).precio == 11.0